@@ -0,0 +1,4 @@
+"""
+离线基准测试模块
+在本地启动模拟的Bilibili API，运行真实的提取流程并统计吞吐量
+"""
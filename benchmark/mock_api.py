@@ -0,0 +1,232 @@
+"""
+模拟Bilibili API服务
+提供视频列表、合集、pagelist、videoshot 接口和瓦片图CDN，
+支持配置延迟与错误注入，所有数据均由随机种子确定性生成；
+列表接口返回 ETag 并支持 If-None-Match，可用 add_video() 模拟新投稿
+"""
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from io import BytesIO
+
+from aiohttp import web
+from PIL import Image, ImageDraw
+
+# videoshot 元数据中声明的单格逻辑尺寸与网格
+CELL_W = 160
+CELL_H = 90
+GRID_X = 10
+GRID_Y = 10
+
+
+class MockBilibiliAPI:
+    """模拟API：生成合成视频数据，并统计各接口请求次数"""
+
+    def __init__(self, video_count=100, latency=0.0, jitter=0.0, error_rate=0.0,
+                 risk_rate=0.0, sheet_scale=1, seed=42):
+        """
+        :param video_count: 合成视频数量
+        :param latency: 每个请求的基础延迟（秒）
+        :param jitter: 延迟的随机抖动上限（秒）
+        :param error_rate: 返回HTTP 500的概率
+        :param risk_rate: 列表接口返回 -352 风控错误的概率
+        :param sheet_scale: 瓦片图物理像素相对声明尺寸的倍数，模拟高清WEBP瓦片
+        :param seed: 随机种子
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.risk_rate = risk_rate
+        self.sheet_scale = sheet_scale
+        self.random = random.Random(seed)
+        self.request_counts = Counter()
+        self.base_url = None
+        self._sheet_bytes = None
+
+        now = int(time.time())
+        self.videos = []
+        for i in range(video_count):
+            duration = self.random.choice([45, 300, 1800, 3 * 3600, 5 * 3600])
+            self.videos.append({
+                'bvid': f'BV1mock{i:05d}',
+                'title': f'模拟视频 {i}',
+                'created': now - i * 3600 * 12,  # 按发布时间倒序，间隔12小时
+                'duration': duration,
+                'play': self.random.randint(0, 100000),
+                'cid': 100000 + i,
+            })
+        self._by_bvid = {v['bvid']: v for v in self.videos}
+
+    def add_video(self, duration=1800, play=0):
+        """模拟一个新投稿（发布时间为当前时间，排在列表最前面）"""
+        index = len(self.videos)
+        video = {
+            'bvid': f'BV1mock{index:05d}',
+            'title': f'模拟视频 {index}',
+            'created': int(time.time()),
+            'duration': duration,
+            'play': play,
+            'cid': 100000 + index,
+        }
+        self.videos.insert(0, video)
+        self._by_bvid[video['bvid']] = video
+        return video
+
+    def _list_response(self, request, payload):
+        """按内容计算 ETag，客户端携带相同的 If-None-Match 时返回304"""
+        etag = '"' + hashlib.md5(json.dumps(payload, sort_keys=True).encode()).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            self.request_counts['not_modified'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.json_response(payload, headers={'ETag': etag})
+
+    def create_app(self):
+        app = web.Application(middlewares=[self._inject_faults])
+        app.router.add_get('/x/web-interface/nav', self.nav)
+        app.router.add_get('/x/space/wbi/arc/search', self.arc_search)
+        app.router.add_get('/x/series/archives', self.series_archives)
+        app.router.add_get('/x/player/pagelist', self.pagelist)
+        app.router.add_get('/x/player/videoshot', self.videoshot)
+        app.router.add_get('/bfs/videoshot/{name}', self.tile)
+        return app
+
+    @web.middleware
+    async def _inject_faults(self, request, handler):
+        endpoint = '/bfs/videoshot' if request.path.startswith('/bfs/') else request.path
+        self.request_counts[endpoint] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.request_counts['injected_errors'] += 1
+            return web.Response(status=500, text='injected error')
+        response = await handler(request)
+        if response.content_type == 'application/json':
+            # 与线上一致：JSON按客户端的 Accept-Encoding 压缩
+            response.enable_compression()
+        return response
+
+    def _risk_control(self):
+        if self.risk_rate and self.random.random() < self.risk_rate:
+            self.request_counts['injected_risk'] += 1
+            return web.json_response({'code': -352, 'message': '风控校验失败'})
+        return None
+
+    @staticmethod
+    def _page_args(request):
+        pn = int(request.query.get('pn', 1))
+        ps = int(request.query.get('ps', 30))
+        return pn, ps
+
+    async def nav(self, request):
+        return web.json_response({
+            'code': 0,
+            'data': {'wbi_img': {
+                'img_url': 'https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png',
+                'sub_url': 'https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png',
+            }}
+        })
+
+    async def arc_search(self, request):
+        risk = self._risk_control()
+        if risk:
+            return risk
+        pn, ps = self._page_args(request)
+        page = self.videos[(pn - 1) * ps:pn * ps]
+        vlist = [{
+            'bvid': v['bvid'],
+            'title': v['title'],
+            'length': f"{v['duration'] // 60}:{v['duration'] % 60:02d}",
+            'created': v['created'],
+            'play': v['play'],
+        } for v in page]
+        return self._list_response(request, {
+            'code': 0,
+            'data': {'list': {'vlist': vlist}, 'page': {'pn': pn, 'ps': ps, 'count': len(self.videos)}}
+        })
+
+    async def series_archives(self, request):
+        risk = self._risk_control()
+        if risk:
+            return risk
+        pn, ps = self._page_args(request)
+        page = self.videos[(pn - 1) * ps:pn * ps]
+        archives = [{
+            'bvid': v['bvid'],
+            'title': v['title'],
+            'duration': v['duration'],
+            'pubdate': v['created'],
+            'stat': {'view': v['play']},
+        } for v in page]
+        return self._list_response(request, {
+            'code': 0,
+            'data': {'archives': archives, 'page': {'num': pn, 'size': ps, 'total': len(self.videos)}}
+        })
+
+    async def pagelist(self, request):
+        video = self._by_bvid.get(request.query.get('bvid'))
+        if not video:
+            return web.json_response({'code': -404, 'message': '啥都木有'})
+        return web.json_response({'code': 0, 'data': [{'cid': video['cid'], 'page': 1}]})
+
+    async def videoshot(self, request):
+        video = self._by_bvid.get(request.query.get('bvid'))
+        if not video:
+            return web.json_response({'code': -404, 'message': '啥都木有'})
+
+        # 每10秒一帧，最多3个瓦片图
+        per_sheet = GRID_X * GRID_Y
+        frames = max(1, min(video['duration'] // 10, per_sheet * 3))
+        step = video['duration'] / frames
+        sheets = (frames + per_sheet - 1) // per_sheet
+        images = [f"{self.base_url}/bfs/videoshot/{video['cid']}-{i}.jpg" for i in range(sheets)]
+        return web.json_response({
+            'code': 0,
+            'data': {
+                'img_x_len': CELL_W,
+                'img_y_len': CELL_H,
+                'img_x_count': GRID_X,
+                'img_y_count': GRID_Y,
+                'image': images,
+                'index': [int(i * step) for i in range(frames)],
+            }
+        })
+
+    async def tile(self, request):
+        return web.Response(body=self.sprite_sheet(), content_type='image/jpeg')
+
+    def sprite_sheet(self):
+        """生成（并缓存）一张合成瓦片图：每格不同底色并叠加噪声，使编码体积接近真实画面"""
+        if self._sheet_bytes is None:
+            w, h = CELL_W * self.sheet_scale, CELL_H * self.sheet_scale
+            size = (w * GRID_X, h * GRID_Y)
+            cells = Image.new('RGB', size)
+            draw = ImageDraw.Draw(cells)
+            for n in range(GRID_X * GRID_Y):
+                x, y = (n % GRID_X) * w, (n // GRID_X) * h
+                color = ((n * 37) % 256, (n * 67) % 256, (n * 97) % 256)
+                draw.rectangle((x, y, x + w - 1, y + h - 1), fill=color)
+                draw.text((x + 8, y + 8), str(n), fill=(255, 255, 255))
+            noise = Image.effect_noise(size, 64).convert('RGB')
+            img = Image.blend(cells, noise, 0.4)
+            buffer = BytesIO()
+            img.save(buffer, format='JPEG', quality=85)
+            self._sheet_bytes = buffer.getvalue()
+        return self._sheet_bytes
+
+
+async def start_mock_server(api, host='127.0.0.1', port=0):
+    """
+    启动模拟服务
+
+    :return: (AppRunner, 根地址)，结束时调用 runner.cleanup()
+    """
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    api.base_url = f'http://{host}:{bound_port}'
+    return runner, api.base_url
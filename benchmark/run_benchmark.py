@@ -0,0 +1,158 @@
+"""
+离线端到端基准测试
+
+在本地启动模拟API，运行真实的 CaptureRunner（VideoIndexer + ThumbnailExtractor），
+输出 视频/秒、缩略图/秒、峰值内存与各接口请求数，便于做回归对比。
+
+用法::
+
+    python -m benchmark.run_benchmark --videos 200 --latency 0.02 --error-rate 0.01 --report bench.json
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmark.mock_api import MockBilibiliAPI, start_mock_server
+from core.capture import CaptureRunner, create_session
+from core.metrics import MetricsRegistry
+from core.profiling import RunProfiler
+from core.scheduler import SCHEDULE_ORDERS
+
+
+def peak_rss_mb():
+    """返回进程峰值内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 单位为字节
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+async def run_benchmark(args):
+    api = MockBilibiliAPI(
+        video_count=args.videos,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        risk_rate=args.risk_rate,
+        sheet_scale=args.sheet_scale,
+        seed=args.seed,
+    )
+    server, base_url = await start_mock_server(api)
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix='bb_bench_')
+    metrics = MetricsRegistry()
+    try:
+        async with create_session('SESSDATA=benchmark') as session:
+            runner = CaptureRunner(
+                session=session,
+                up_id='1',
+                list_id='1' if args.mode == 'collection' else None,
+                start_time=datetime(2000, 1, 1),
+                end_time=datetime(2100, 1, 1),
+                cookie='SESSDATA=benchmark',
+                qps=args.qps,
+                output_dir=output_dir,
+                image_format=args.image_format,
+                metrics=metrics,
+                api_base=base_url,
+                page_delay=args.page_delay,
+                catalog_path=args.catalog,
+                concurrency=args.concurrency,
+                memory_mb=args.memory_mb,
+                archive=args.archive,
+                order=args.order,
+                manifest_formats=[fmt for fmt in args.manifest.split(',') if fmt],
+            )
+            profiler = None
+            if args.profile is not None:
+                profiler = RunProfiler(output_dir, trace_memory='tracemalloc' in args.profile,
+                                       slow_callbacks='slow' in args.profile).start()
+            started = time.perf_counter()
+            try:
+                completed = await runner.run()
+            finally:
+                elapsed = time.perf_counter() - started
+                if profiler is not None:
+                    profiler.stop()
+    finally:
+        await server.cleanup()
+        if not args.output_dir:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    snapshot = metrics.snapshot()
+    thumbnails = snapshot['counters'].get('thumbnails', 0)
+    return {
+        'mode': args.mode,
+        'completed': completed,
+        'videos': runner.video_count,
+        'elapsed_seconds': elapsed,
+        'videos_per_sec': runner.video_count / elapsed if elapsed else 0.0,
+        'thumbnails': thumbnails,
+        'thumbnails_per_sec': thumbnails / elapsed if elapsed else 0.0,
+        'thumbnail_failures': snapshot['counters'].get('thumbnail_failures', 0),
+        'peak_rss_mb': peak_rss_mb(),
+        'server_requests': dict(api.request_counts),
+        'client_requests': snapshot['counters'].get('requests', 0),
+        'stages': snapshot['stages'],
+        'bytes': snapshot['bytes'],
+        'pipeline': runner.pipeline.stats(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Bilibili缩略图提取离线基准测试')
+    parser.add_argument('--mode', choices=['up', 'collection'], default='up', help='列表接口：UP主投稿或合集')
+    parser.add_argument('--videos', type=int, default=50, help='合成视频数量')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的基础延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟的随机抖动上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='HTTP 500 注入概率')
+    parser.add_argument('--risk-rate', type=float, default=0.0, help='列表接口 -352 注入概率')
+    parser.add_argument('--sheet-scale', type=int, default=1, help='瓦片图物理像素倍数')
+    parser.add_argument('--qps', type=int, default=50, help='列表接口QPS限制')
+    parser.add_argument('--page-delay', type=float, default=0.0, help='列表翻页间隔（秒）')
+    parser.add_argument('--image-format', default='webp', help='输出图片格式')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--output-dir', default=None, help='缩略图输出目录，默认使用临时目录并在结束后删除')
+    parser.add_argument('--concurrency', type=int, default=4, help='同时下载瓦片图的数量')
+    parser.add_argument('--memory-mb', type=int, default=256, help='在途瓦片图的内存上限（MB）')
+    parser.add_argument('--catalog', default=None, help='本地视频目录路径，默认不使用目录')
+    parser.add_argument('--archive', action='store_true', help='归档模式：原样保存瓦片图，不裁剪缩略图')
+    parser.add_argument('--order', default='api', choices=list(SCHEDULE_ORDERS), help='视频处理顺序')
+    parser.add_argument('--manifest', default='jsonl', help='元数据清单格式，逗号分隔（jsonl,csv,parquet），为空时不输出')
+    parser.add_argument('--profile', nargs='*', default=None, choices=['tracemalloc', 'slow'],
+                        help='用 cProfile 分析运行，可附加 tracemalloc / slow（慢回调），报告写到输出目录下的 profiles/')
+    parser.add_argument('--report', default=None, help='把结果写入JSON文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(run_benchmark(args))
+
+    print(f"模式: {result['mode']}  完成: {result['completed']}")
+    print(f"视频: {result['videos']}  耗时: {result['elapsed_seconds']:.2f}s  视频/秒: {result['videos_per_sec']:.2f}")
+    print(f"缩略图: {result['thumbnails']}  失败: {result['thumbnail_failures']}  缩略图/秒: {result['thumbnails_per_sec']:.2f}")
+    if result['peak_rss_mb'] is not None:
+        print(f"峰值内存: {result['peak_rss_mb']:.1f} MB")
+    print(f"请求数: {json.dumps(result['server_requests'], ensure_ascii=False)}")
+    print("流水线占用率: " + ', '.join(f"{name} {stats['utilization']:.0%}"
+                                    for name, stats in result['pipeline'].items()))
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.report}")
+
+
+if __name__ == '__main__':
+    main()
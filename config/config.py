@@ -2,6 +2,7 @@
 
 # Bilibili API相关配置
 BILIBILI_COOKIE = ""  # 用户的Cookie，用于访问需要登录的接口
+API_BASE_URL = "https://api.bilibili.com"  # API根地址，基准测试时可指向本地模拟服务
 
 # 时间范围过滤
 START_YEAR = "2026"  # 开始年份
@@ -15,6 +16,13 @@ END_DAY = "31"       # 结束日期
 MAX_QPS = 4  # 最大QPS（每秒查询率），建议设置为3-5
 CONCURRENT_LIMIT = 5  # 并发请求限制
 
+# 重试与熔断配置
+RETRY_MAX_ATTEMPTS = 3  # 单个请求最多尝试次数（含首次）
+RETRY_BASE_DELAY = 1.0  # 指数退避的基础等待时间（秒）
+RETRY_MAX_DELAY = 30.0  # 单次退避的最长等待时间（秒）
+CIRCUIT_FAILURE_THRESHOLD = 5  # 同一接口连续失败多少次后熔断
+CIRCUIT_RESET_TIMEOUT = 60.0  # 熔断后多久放行一个探测请求（秒）
+
 # 采样策略配置
 MIN_VIDEO_DURATION = 10  # 最小视频时长（秒），低于此值的视频不处理
 
@@ -22,5 +30,87 @@ MIN_VIDEO_DURATION = 10  # 最小视频时长（秒），低于此值的视频
 OUTPUT_DIR = "./output/"  # 输出目录
 IMAGE_FORMAT = "webp"  # 输出图片格式，当前支持webp
 
+# 提取流水线配置
+PIPELINE_QUEUE_SIZE = 16  # 各阶段之间的队列容量，队列满时上游等待
+PIPELINE_METADATA_WORKERS = 2  # 同时获取元数据（pagelist / videoshot）的数量
+PIPELINE_DOWNLOAD_WORKERS = 4  # 同时下载瓦片图的数量（界面中的“并发限制”）
+PIPELINE_PROCESS_WORKERS = 2  # 解码/裁剪/编码线程数
+PIPELINE_WRITE_WORKERS = 1  # 写盘线程数
+
+# 调度配置
+SCHEDULE_ORDER = "api"  # 视频处理顺序：api（接口顺序）、created（最新优先）、play（播放最多优先）、duration（最短优先）、cost（预估请求数最少优先）
+
+# 请求合并配置
+SINGLEFLIGHT_TTL = 30.0  # 相同的 pagelist / videoshot 请求完成后继续共享结果的秒数
+
+# 后台运行时配置（图形界面）
+EVENT_LOOP_UVLOOP = True  # 安装了 uvloop 时使用它作为事件循环
+METADATA_CACHE_TTL = 600.0  # 界面中多次运行之间共享 pagelist / videoshot 结果的秒数
+WBI_KEY_TTL = 3600.0  # WBI密钥的缓存秒数
+
+# 写盘配置
+WRITER_FSYNC = True  # 重命名为正式文件名前是否 fsync
+WRITER_FSYNC_BATCH = 32  # 每批 fsync/重命名的文件数
+WRITER_FSYNC_INTERVAL = 1.0  # 距上次提交超过该秒数时即使未攒满也提交
+WRITER_STALE_TEMP_AGE = 3600  # 写入进程仍存活时，临时文件超过该秒数未修改才视为遗留文件清理
+
+# 内存预算配置
+MEMORY_BUDGET_MB = 256  # 在途瓦片图（原始字节 + 解码后图像）的内存上限（MB），与并发数无关
+MEMORY_RESERVE_ESTIMATE_MB = 32  # 下载前预约的初始估算值（MB），之后按实际大小自动调整
+
+# 归档模式配置
+ARCHIVE_MODE = False  # 为True时原样保存瓦片图与 videoshot.json，不裁剪缩略图（之后可用 core.archive.SheetArchive 按需裁剪）
+ARCHIVE_DIR_NAME = "archive"  # 归档子目录名（位于输出目录下）
+
+# 元数据清单配置
+MANIFEST_FORMATS = ()  # 每张缩略图一行的清单格式，可选 "jsonl"、"csv"、"parquet"（需安装pyarrow），为空时不输出
+MANIFEST_PARQUET_ROW_GROUP = 1000  # Parquet 清单每个行组的行数
+
+# 预览画廊配置
+GALLERY_ENABLED = False  # 为True时提取过程中在输出目录下生成 gallery/index.html
+GALLERY_PAGE_SIZE = 50  # 每个索引分片包含的视频数
+GALLERY_FLUSH_INTERVAL = 5.0  # 提取过程中画廊的更新间隔（秒）
+
+# 本地视频目录配置
+CATALOG_ENABLED = False  # 为True时把列表结果保存到本地目录，修改日期范围后可直接从目录查询
+CATALOG_PATH = "catalog.db"  # 目录数据库（SQLite）路径
+
+# 运行预估配置（python main.py plan），有实际文件时改用实测平均值
+PLAN_SHEET_BYTES = 200 * 1024  # 每张瓦片图的估算字节数
+PLAN_THUMBNAIL_BYTES = 12 * 1024  # 每张缩略图的估算字节数
+PLAN_API_RESPONSE_BYTES = 2 * 1024  # 每个元数据接口响应的估算字节数
+
+# 监视模式配置（python main.py watch）
+WATCH_CHANNELS = ()  # 监视的UP主空间或合集链接，例如 ("https://space.bilibili.com/123",)
+WATCH_STATE_PATH = "watch_state.json"  # 监视状态（发布时间水位、轮询间隔、待重试视频）文件路径
+WATCH_MIN_INTERVAL = 300.0  # 最小轮询间隔（秒），发现新投稿后恢复为该值
+WATCH_MAX_INTERVAL = 3600.0  # 不活跃频道的最大轮询间隔（秒）
+WATCH_BACKOFF = 2.0  # 没有新投稿时轮询间隔的增长倍数
+WATCH_PAGE_SIZE = 10  # 轮询时只请求第1页的前N个视频
+WATCH_MAX_RETRIES = 5  # 新投稿提取失败（例如瓦片图尚未生成）时最多尝试的次数
+
+# 分布式任务队列配置
+JOB_QUEUE_PATH = "jobs.db"  # 任务队列数据库（SQLite）路径
+JOB_QUEUE_SHARED_STORAGE = False  # 队列文件是否放在多台机器共享的网络存储上（改用回滚日志，WAL 只能在同一台机器上使用）
+JOB_LEASE_SECONDS = 300  # 任务租约（可见性超时）秒数，超时未完成的任务自动重新入队
+JOB_MAX_ATTEMPTS = 3  # 单个任务最多尝试次数
+JOB_RETRY_BACKOFF = 30  # 失败任务重新入队后至少等待的秒数，之后每次失败翻倍
+
+# 界面配置
+UI_REFRESH_INTERVAL_MS = 100  # 日志与进度的刷新间隔（毫秒），即每秒最多刷新10次
+LOG_VIEW_MAX_LINES = 2000  # 日志窗口最多保留的行数，超出后删除最早的行
+GRID_CELL_WIDTH = 160  # 结果预览网格中缩略图的显示宽度（像素）
+GRID_CACHE_SIZE = 256  # 预览网格 PhotoImage LRU 缓存的最大张数
+GRID_DECODE_WORKERS = 2  # 预览网格的后台解码线程数
+
 # 调试配置
-LOG_LEVEL = "INFO"  # 日志级别：DEBUG, INFO, WARNING, ERROR
\ No newline at end of file
+PROFILE_ENABLED = False  # 为True时用 cProfile 分析每次运行，报告写到输出目录下的 profiles/
+PROFILE_TRACEMALLOC = False  # 分析时同时用 tracemalloc 统计内存分配（明显拖慢运行）
+PROFILE_SLOW_CALLBACKS = False  # 分析时启用 asyncio 调试模式，记录阻塞事件循环的慢回调
+PROFILE_SLOW_CALLBACK_MS = 100  # 慢回调阈值（毫秒）
+PROFILE_TOP_N = 30  # 分析报告中列出的条目数
+PROFILE_DIR_NAME = "profiles"  # 分析报告子目录名（位于输出目录下）
+LOG_LEVEL = "INFO"  # 日志级别：DEBUG, INFO, WARNING, ERROR
+LOG_FILE = "bb_capture.log"  # 日志文件路径
+LOG_STRUCTURED = False  # 是否输出结构化（JSON行）日志
+LOG_SAMPLE_EVERY = 100  # 逐条目日志（逐个视频/缩略图）每N条输出1条
\ No newline at end of file
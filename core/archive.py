@@ -0,0 +1,158 @@
+"""
+瓦片图归档模块
+归档模式下不裁剪、不重新编码：每个视频的瓦片图按下载到的字节原样保存，
+并附带一个 videoshot.json 记录 videoshot 的 index 列表、网格尺寸与每张瓦片图的物理缩放比例。
+之后可用 SheetArchive 按任意时间点即时裁剪出缩略图，没有二次压缩损失。
+
+目录结构::
+
+    <归档目录>/<BV号>/sheet-000.jpg
+    <归档目录>/<BV号>/sheet-001.jpg
+    <归档目录>/<BV号>/videoshot.json   # 最后写入，存在即表示该视频归档完整
+"""
+import json
+import logging
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from core.utils import locate_frame, physical_box
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_NAME = 'videoshot.json'
+SIDECAR_VERSION = 1
+
+
+def sheet_filename(sheet_index, url):
+    """瓦片图文件名，扩展名沿用URL中的扩展名"""
+    ext = os.path.splitext(url.split('?', 1)[0])[1].lower() or '.jpg'
+    return f'sheet-{sheet_index:03d}{ext}'
+
+
+def image_size(source):
+    """只解析图片头获取 (宽, 高)，source 为文件路径或图片字节，失败时返回None"""
+    try:
+        with Image.open(source if isinstance(source, str) else BytesIO(source)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+def build_sidecar(bvid, shot, sheets):
+    """
+    生成 videoshot.json 内容
+
+    :param shot: ThumbnailExtractor.get_videoshot 返回的元数据
+    :param sheets: [(文件名, 宽, 高)]，与 shot['images'] 一一对应
+    """
+    grid_w = shot['img_w'] * shot['img_x_cnt']
+    grid_h = shot['img_h'] * shot['img_y_cnt']
+    return {
+        'version': SIDECAR_VERSION,
+        'bvid': bvid,
+        'img_w': shot['img_w'],
+        'img_h': shot['img_h'],
+        'img_x_cnt': shot['img_x_cnt'],
+        'img_y_cnt': shot['img_y_cnt'],
+        'index': shot['index'],
+        'sheets': [{
+            'file': name,
+            'url': url,
+            'width': width,
+            'height': height,
+            # 物理像素相对于API声明的逻辑尺寸的倍数
+            'scale_x': round(width / grid_w, 4),
+            'scale_y': round(height / grid_h, 4),
+        } for (name, width, height), url in zip(sheets, shot['images'])],
+    }
+
+
+def list_archived(archive_dir):
+    """列出归档目录中已完整归档的BV号"""
+    try:
+        names = os.listdir(archive_dir)
+    except OSError:
+        return []
+    return sorted(name for name in names if os.path.exists(os.path.join(archive_dir, name, SIDECAR_NAME)))
+
+
+class SheetArchive:
+    """
+    读取一个视频的瓦片图归档，按时间点裁剪缩略图
+
+    用法::
+
+        archive = SheetArchive.open('output/archive', 'BV1xx411c7mD')
+        archive.save_frame(125.0, 'frame.webp')
+    """
+
+    def __init__(self, video_dir):
+        """
+        :param video_dir: 单个视频的归档目录（包含 videoshot.json）
+        :raises FileNotFoundError: 归档不存在或不完整
+        """
+        self.video_dir = video_dir
+        with open(os.path.join(video_dir, SIDECAR_NAME), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self._sheet_index = None
+        self._sheet = None  # 最近使用的瓦片图，连续读取同一张瓦片图上的帧时不重复解码
+
+    @classmethod
+    def open(cls, archive_dir, bvid):
+        return cls(os.path.join(archive_dir, bvid))
+
+    @property
+    def bvid(self):
+        return self.meta['bvid']
+
+    @property
+    def times(self):
+        """每一格对应的时间点（秒）"""
+        return self.meta['index']
+
+    def locate(self, time_in_seconds):
+        """
+        :return: (瓦片图序号, 物理裁剪框)
+        """
+        meta = self.meta
+        sheets = meta['sheets']
+        sheet_index, logic_x, logic_y = locate_frame(meta['index'], time_in_seconds, meta['img_w'], meta['img_h'],
+                                                     meta['img_x_cnt'], meta['img_y_cnt'], len(sheets))
+        sheet = sheets[sheet_index]
+        box = physical_box(logic_x, logic_y, meta['img_w'], meta['img_h'], meta['img_x_cnt'], meta['img_y_cnt'],
+                           sheet['width'], sheet['height'])
+        return sheet_index, box
+
+    def frame_at(self, time_in_seconds):
+        """裁剪出指定时间点的缩略图（RGB图像）"""
+        sheet_index, box = self.locate(time_in_seconds)
+        return self._load_sheet(sheet_index).crop(box).convert('RGB')
+
+    def save_frame(self, time_in_seconds, output_path, quality=95):
+        """裁剪并保存指定时间点的缩略图，按扩展名选择格式"""
+        fmt = 'WEBP' if output_path.lower().endswith('.webp') else 'JPEG'
+        self.frame_at(time_in_seconds).save(output_path, format=fmt, quality=quality)
+        return output_path
+
+    def close(self):
+        if self._sheet is not None:
+            self._sheet.close()
+            self._sheet = None
+            self._sheet_index = None
+
+    def _load_sheet(self, sheet_index):
+        if self._sheet_index != sheet_index:
+            self.close()
+            path = os.path.join(self.video_dir, self.meta['sheets'][sheet_index]['file'])
+            sheet = Image.open(path)
+            sheet.load()
+            self._sheet, self._sheet_index = sheet, sheet_index
+        return self._sheet
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
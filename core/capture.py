@@ -0,0 +1,407 @@
+"""
+提取流程模块
+把“获取视频列表 -> 计算采样点 -> 提取缩略图”的完整流程从界面中剥离出来，
+供图形界面、基准测试等不同入口复用
+"""
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+
+from config import (API_BASE_URL, CATALOG_ENABLED, CATALOG_PATH, PIPELINE_DOWNLOAD_WORKERS, MEMORY_BUDGET_MB,
+                    GALLERY_ENABLED, GALLERY_FLUSH_INTERVAL, MANIFEST_FORMATS, ARCHIVE_MODE, ARCHIVE_DIR_NAME,
+                    SCHEDULE_ORDER)
+from core.catalog import VideoCatalog
+from core.decoding import ACCEPT_ENCODING
+from core.gallery import GalleryBuilder
+from core.manifest import ManifestWriter, manifest_row
+from core.indexer import VideoIndexer
+from core.sampler import SamplingEngine
+from core.scheduler import PriorityScheduler, SCHEDULE_ORDERS
+from core.extractor import ThumbnailExtractor
+from core.memory import MemoryBudget, MB
+from core.metrics import MetricsRegistry
+from core.pipeline import ExtractionPipeline
+from core.planner import build_plan
+from core.retry import RetryEngine, RequestError
+from core.utils import thumbnail_filename
+from core.writer import AtomicWriter, remove_stale_temp_files
+
+logger = logging.getLogger(__name__)
+
+
+def create_session(cookie=""):
+    """创建提取流程使用的全局会话"""
+    connector = aiohttp.TCPConnector(
+        limit=10,
+        ttl_dns_cache=300,
+        use_dns_cache=True,
+        force_close=False
+    )
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Referer': 'https://space.bilibili.com/',
+        'Cookie': cookie,
+        'Accept': 'application/json, text/plain, */*',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Accept-Encoding': ACCEPT_ENCODING,
+        'Connection': 'keep-alive',
+        'Sec-Fetch-Dest': 'empty',
+        'Sec-Fetch-Mode': 'cors',
+        'Sec-Fetch-Site': 'same-site'
+    }
+    # 关闭自动解压，由 core.decoding 负责解压以统计传输字节数
+    return aiohttp.ClientSession(headers=headers, connector=connector, auto_decompress=False)
+
+
+class CaptureRunner:
+    """提取流程执行器，不依赖任何界面组件"""
+
+    def __init__(self, session, up_id, list_id=None, start_time=None, end_time=None,
+                 cookie="", qps=4, output_dir="./output/", image_format="webp",
+                 metrics=None, stop_flag=None, on_log=None, on_progress=None,
+                 api_base=API_BASE_URL, page_delay=3.0, catalog_path=CATALOG_PATH if CATALOG_ENABLED else None,
+                 concurrency=PIPELINE_DOWNLOAD_WORKERS, memory_mb=MEMORY_BUDGET_MB, gallery=GALLERY_ENABLED,
+                 on_result=None, metadata=None, manifest_formats=MANIFEST_FORMATS, archive=ARCHIVE_MODE,
+                 order=SCHEDULE_ORDER, limiter=None, writer=None):
+        """
+        :param session: aiohttp会话
+        :param up_id: UP主ID
+        :param list_id: 合集ID，为空时获取UP主的全部投稿
+        :param start_time: 开始时间（datetime）
+        :param end_time: 结束时间（datetime）
+        :param metrics: 指标注册表
+        :param stop_flag: threading.Event，置位后尽快停止
+        :param on_log: 日志回调，接收一条消息字符串
+        :param on_progress: 进度回调，关键字参数与 BilibiliCaptureUI.update_progress 一致
+        :param api_base: API根地址，基准测试时指向本地模拟服务
+        :param page_delay: 列表翻页间隔（秒）
+        :param catalog_path: 本地视频目录路径，为None时不使用目录
+        :param concurrency: 同时下载瓦片图的数量
+        :param memory_mb: 在途瓦片图的内存上限（MB）
+        :param gallery: 是否在输出目录下增量生成预览画廊
+        :param on_result: 回调，每个视频结束后接收 (视频, 已写出的缩略图路径列表)
+        :param metadata: 跨运行共享的元数据缓存（core.runtime.MetadataCache），为None时只在本次运行内共享
+        :param manifest_formats: 元数据清单格式（jsonl / csv / parquet），为空时不输出清单
+        :param archive: 归档模式：原样保存瓦片图与 videoshot.json 到 <输出目录>/archive，不裁剪缩略图
+        :param order: 视频处理顺序，见 core.scheduler.SCHEDULE_ORDERS
+        :param limiter: 可选的共享请求限制器（需提供 acquire()）；传入时列表、元数据与瓦片图请求都计入同一预算，
+                        否则只有列表请求受 qps 限制
+        :param writer: 可选的共享 AtomicWriter，由调用方负责关闭；为None时每次运行自建一个并在 run() 结束时关闭
+        """
+        self.session = session
+        self.up_id = up_id
+        self.list_id = list_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.output_dir = output_dir
+        self.image_format = image_format
+        self.metrics = metrics or MetricsRegistry()
+        self.stop_flag = stop_flag
+        self.on_log = on_log
+        self.on_progress = on_progress
+        self.on_result = on_result
+
+        # 列表与提取共用一个重试引擎，熔断状态按接口共享
+        self.retry = RetryEngine(metrics=self.metrics)
+        self.catalog = VideoCatalog(catalog_path) if catalog_path else None
+        self.indexer = VideoIndexer(session=session, cookie=cookie, qps=qps, metrics=self.metrics,
+                                    api_base=api_base, page_delay=page_delay, retry=self.retry,
+                                    catalog=self.catalog, metadata=metadata, limiter=limiter)
+        self.sampler = SamplingEngine()
+        self._owns_writer = writer is None
+        self.extractor = ThumbnailExtractor(session=session, cookie=cookie, metrics=self.metrics,
+                                            api_base=api_base, retry=self.retry, limiter=limiter,
+                                            memory=MemoryBudget(memory_mb * MB, metrics=self.metrics),
+                                            writer=writer or AtomicWriter(metrics=self.metrics),
+                                            json_flight=metadata.api if metadata is not None else None)
+        self.pipeline = ExtractionPipeline(self.extractor, self.metrics, download_workers=concurrency)
+
+        self.qps = qps
+        self.concurrency = max(1, concurrency)
+        self.order = order
+        self.archive = archive
+        self.archive_dir = os.path.join(output_dir, ARCHIVE_DIR_NAME)
+        self.manifest_formats = manifest_formats
+        self.manifest = None
+        self.gallery = GalleryBuilder(output_dir) if gallery else None
+        self._gallery_flushing = False
+        self._gallery_flushed_at = 0.0
+        self._video_paths = {}  # bvid -> 计划输出的缩略图路径
+        self._written_paths = {}  # bvid -> 已提交落盘的缩略图路径
+
+        self.video_count = 0
+        self.success_count = 0
+        self.fail_count = 0
+        self.failed_videos = []  # 部分缩略图提取失败的视频
+
+    def log(self, message):
+        if self.on_log:
+            self.on_log(message)
+        else:
+            logger.debug(message)
+
+    def progress(self, **kwargs):
+        if self.on_progress:
+            self.on_progress(**kwargs)
+
+    def stopped(self):
+        return self.stop_flag is not None and self.stop_flag.is_set()
+
+    async def fetch_video_list(self):
+        """获取视频列表，失败时返回None（请求级重试由 RetryEngine 完成）"""
+        # 根据是否有合集ID使用不同的API
+        if self.list_id:
+            video_list = await self.indexer.get_videos_by_collection(
+                up_id=self.up_id,
+                collection_id=self.list_id,
+                start_time=self.start_time,
+                end_time=self.end_time
+            )
+        else:
+            video_list = await self.indexer.get_videos_by_up_id(
+                up_id=self.up_id,
+                start_time=self.start_time,
+                end_time=self.end_time
+            )
+
+        if video_list is None:
+            self.log("获取视频列表失败，请检查Cookie或提交反馈")
+        return video_list
+
+    async def run(self, videos=None):
+        """
+        执行完整提取流程，返回是否正常完成
+
+        外部取消（task.cancel）时会中断正在进行的请求与等待，记录已完成的进度后继续抛出 CancelledError
+
+        :param videos: 已知的视频列表（例如轮询发现的新投稿），传入时跳过列表阶段
+        """
+        try:
+            return await self._run(videos)
+        except asyncio.CancelledError:
+            self.log(f"任务已取消，已处理 {self.success_count + self.fail_count}/{self.video_count} 个视频")
+            self.progress(success=self.success_count, fail=self.fail_count,
+                          current=self.success_count + self.fail_count)
+            raise
+        finally:
+            if self.catalog:
+                self.catalog.close()
+            if self._owns_writer:
+                # 提交剩余文件并结束写盘线程池，否则轮询模式每次运行都会遗留一个线程池
+                await asyncio.get_running_loop().run_in_executor(None, self.extractor.writer.close)
+
+    async def _run(self, video_list=None):
+        os.makedirs(self.output_dir, exist_ok=True)
+        remove_stale_temp_files(self.output_dir)
+
+        if video_list is not None:
+            self.video_count = len(video_list)
+            self.progress(total=len(video_list))
+            return await self._extract(video_list)
+
+        if self.list_id:
+            self.log(f"开始获取UP主 {self.up_id} 的合集 {self.list_id} 的视频列表...")
+        else:
+            self.log(f"开始获取UP主 {self.up_id} 的投稿视频列表...")
+
+        # 检查停止标志
+        if self.stopped():
+            self.log("任务已取消，停止获取视频列表")
+            return False
+
+        video_list = await self.fetch_video_list()
+        if video_list is None:
+            return False
+
+        self.video_count = len(video_list)
+        self.log(f"获取到 {len(video_list)} 个视频")
+
+        # 更新视频总数
+        self.progress(total=len(video_list))
+        return await self._extract(video_list)
+
+    async def _extract(self, video_list):
+        if self.archive:
+            return await self._run_archive(video_list)
+
+        if self.manifest_formats:
+            self.manifest = ManifestWriter(self.output_dir, self.manifest_formats)
+
+        # 元数据、瓦片图下载、图像处理、写盘分阶段并行
+        try:
+            completed = await self.pipeline.run(self._plan(video_list), self._on_video_done, self.stopped,
+                                                on_thumbnail=self._on_thumbnail)
+        finally:
+            if self.manifest:
+                manifest_paths = self.manifest.paths
+                self.manifest.close()
+                self.log(f"元数据清单已写入 {self.manifest.rows} 行: {', '.join(manifest_paths)}")
+            if self.gallery and self.gallery.pending():
+                await asyncio.get_running_loop().run_in_executor(None, self.gallery.flush)
+                self.log(f"预览画廊已更新: {os.path.join(self.gallery.gallery_dir, 'index.html')}")
+        if not completed:
+            self.log("任务已取消，停止处理视频")
+            return False
+
+        self.log("提取任务完成！")
+        return True
+
+    async def _run_archive(self, video_list):
+        """归档模式：每个视频只下载瓦片图并原样保存，同时归档的视频数不超过 concurrency"""
+        self.log(f"归档模式：瓦片图保存到 {self.archive_dir}")
+        videos = iter(self._schedule(video_list))
+        completed = True
+
+        async def worker():
+            nonlocal completed
+            for video in videos:
+                if self.stopped():
+                    completed = False
+                    return
+                # 与提取模式一致，跳过过短的视频
+                if not self.sampler.calculate_sample_points(video['duration']):
+                    continue
+                try:
+                    success = await self.extractor.archive_video(
+                        video['bvid'], os.path.join(self.archive_dir, video['bvid']))
+                except RequestError as e:
+                    self.extractor.log_request_error(video['bvid'], e)
+                    success = False
+                except Exception as e:
+                    logger.error("归档 %s 异常: %s", video['bvid'], e, exc_info=True)
+                    success = False
+                self._on_video_done(video, success)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        await self.extractor.writer.flush()
+        if not completed:
+            self.log("任务已取消，停止处理视频")
+            return False
+        self.log("归档任务完成！")
+        return True
+
+    async def enqueue(self, queue):
+        """
+        只执行列表阶段：获取视频列表并计算采样计划，把每个视频作为一个任务写入任务队列，由 worker 进程提取
+
+        :param queue: core.job_queue.JobQueue
+        :return: 新增的任务数，获取列表失败时返回None
+        """
+        try:
+            video_list = await self.fetch_video_list()
+        finally:
+            if self.catalog:
+                self.catalog.close()
+        if video_list is None:
+            return None
+
+        # 任务队列按写入顺序领取，按优先级写入即可让 worker 先处理优先级高的视频
+        jobs = []
+        for video in self._schedule(video_list):
+            sample_times = self.sampler.calculate_sample_points(video['duration'])
+            if not sample_times:
+                continue
+            jobs.append((video['bvid'], {
+                'video': video.to_dict(),
+                'sample_times': sample_times,
+                'output_dir': self.output_dir,
+                'image_format': self.image_format,
+            }))
+        # 队列写事务可能等待其他 worker 释放写锁，放到线程池中执行
+        added = await asyncio.get_running_loop().run_in_executor(None, queue.enqueue, jobs)
+        self.video_count = len(video_list)
+        self.log(f"获取到 {len(video_list)} 个视频，新增 {added} 个任务")
+        return added
+
+    async def plan(self):
+        """
+        只执行列表阶段并估算提取成本，不下载任何瓦片图
+
+        :return: core.planner.RunPlan，获取列表失败时返回None
+        """
+        requests_before = self.metrics.counter('requests')
+        try:
+            video_list = await self.fetch_video_list()
+        finally:
+            if self.catalog:
+                self.catalog.close()
+        if video_list is None:
+            return None
+
+        self.video_count = len(video_list)
+        # 只有传入共享限制器时元数据与瓦片图请求才受 qps 限制
+        plan = build_plan(video_list, self.sampler, self.qps, archive_dir=self.archive_dir, output_dir=self.output_dir,
+                          rate_limited=self.extractor.limiter is not None)
+        plan.listing_requests = self.metrics.counter('requests') - requests_before
+        return plan
+
+    def _schedule(self, video_list):
+        """按配置的优先级排列视频"""
+        scheduler = PriorityScheduler(self.order, self.sampler)
+        scheduler.extend(video_list)
+        if scheduler.order != 'api':
+            self.log(f"处理顺序: {SCHEDULE_ORDERS[scheduler.order]}")
+        return scheduler
+
+    def _plan(self, video_list):
+        """按优先级逐个生成 (视频, [(采样时间, 输出路径), ...])，由流水线按需拉取"""
+        for video in self._schedule(video_list):
+            self.log(f"处理视频: {video['bvid']} - {video['title']}")
+
+            # 计算采样点
+            sample_times = self.sampler.calculate_sample_points(video['duration'])
+            self.log(f"计算出 {len(sample_times)} 个采样点: {sample_times}")
+
+            # 生成文件名：格式为 "发布时间_BV(索引).格式"
+            paths = [os.path.join(self.output_dir, thumbnail_filename(video, sample_idx, self.image_format))
+                     for sample_idx in range(len(sample_times))]
+            self._video_paths[video['bvid']] = paths
+            yield video, list(zip(sample_times, paths))
+
+    def _on_thumbnail(self, item):
+        """一张缩略图提交落盘后记录其路径，并追加一行清单"""
+        self._written_paths.setdefault(item.video['bvid'], set()).add(item.output_path)
+        if self.manifest:
+            self.manifest.write(manifest_row(item.video, item.time_in_seconds, item.crop, item.output_path))
+
+    def _on_video_done(self, video, success):
+        """流水线中某个视频的全部采样点结束"""
+        if success:
+            self.success_count += 1
+            self.progress(success=self.success_count)
+        else:
+            self.fail_count += 1
+            self.failed_videos.append(video)
+            self.progress(fail=self.fail_count)
+            self.log(f"视频 {video['bvid']} 部分缩略图提取失败")
+
+        # 更新当前进度
+        self.progress(current=self.success_count + self.fail_count)
+
+        # 只交出已确认提交落盘的缩略图（流水线在该视频的全部批次提交后才调用本方法）
+        written = self._written_paths.pop(video['bvid'], set())
+        paths = [path for path in self._video_paths.pop(video['bvid'], []) if path in written]
+        if paths and self.on_result:
+            self.on_result(video, paths)
+        if self.gallery and paths:
+            self.gallery.add_video(video, paths)
+            self._schedule_gallery_flush()
+
+    def _schedule_gallery_flush(self):
+        """按间隔在线程池中更新画廊（占位图生成与分片写入不占用事件循环）"""
+        now = time.monotonic()
+        if self._gallery_flushing or now - self._gallery_flushed_at < GALLERY_FLUSH_INTERVAL:
+            return
+        self._gallery_flushing = True
+        self._gallery_flushed_at = now
+        future = asyncio.get_running_loop().run_in_executor(None, self.gallery.flush)
+
+        def done(fut):
+            self._gallery_flushing = False
+            if not fut.cancelled() and fut.exception() is not None:
+                logger.warning("更新预览画廊失败: %s", fut.exception())
+
+        future.add_done_callback(done)
@@ -0,0 +1,178 @@
+"""
+本地视频目录模块
+用SQLite保存列表接口见过的每个视频，并记录每个来源（UP主投稿 / 合集）已完整覆盖的时间区间，
+使修改日期范围后的再次运行可以直接从本地查询，只需向API做一次廉价的新鲜度检查
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+from core.utils import convert_duration_to_seconds
+from core.video import VideoRecord
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    bvid TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    duration INTEGER NOT NULL,
+    created INTEGER NOT NULL,
+    play INTEGER NOT NULL DEFAULT 0,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_videos (
+    source TEXT NOT NULL,
+    bvid TEXT NOT NULL,
+    created INTEGER NOT NULL,
+    PRIMARY KEY (source, bvid)
+);
+CREATE INDEX IF NOT EXISTS idx_source_videos_created ON source_videos (source, created);
+CREATE TABLE IF NOT EXISTS coverage (
+    source TEXT PRIMARY KEY,
+    covered_from INTEGER NOT NULL,
+    covered_to INTEGER NOT NULL,
+    total INTEGER,
+    updated_at INTEGER NOT NULL
+);
+"""
+
+
+def up_source(up_id):
+    """UP主投稿列表的来源标识"""
+    return f'up:{up_id}'
+
+
+def series_source(series_id):
+    """合集的来源标识"""
+    return f'series:{series_id}'
+
+
+class Coverage:
+    """来源的覆盖区间：目录中包含该来源发布时间在 [covered_from, covered_to] 内的全部视频"""
+
+    __slots__ = ('covered_from', 'covered_to', 'total')
+
+    def __init__(self, covered_from, covered_to, total=None):
+        self.covered_from = covered_from
+        self.covered_to = covered_to
+        self.total = total
+
+    def covers(self, start_ts, end_ts):
+        return self.covered_from <= start_ts and end_ts <= self.covered_to
+
+
+class VideoCatalog:
+    """视频目录（SQLite），按 bvid 去重，按 (来源, 发布时间) 建索引"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def upsert_videos(self, source, videos):
+        """
+        写入一页列表数据
+
+        :param source: 来源标识，见 up_source / series_source
+        :param videos: 视频字典列表，需包含 bvid、title、duration（秒数或 'MM:SS' 字符串）、created、play
+        """
+        now = int(time.time())
+        rows = []
+        for video in videos:
+            duration = video['duration']
+            if isinstance(duration, str):
+                duration = convert_duration_to_seconds(duration)
+            rows.append((video['bvid'], video['title'], int(duration), int(video['created']),
+                         int(video.get('play') or 0), now))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO videos (bvid, title, duration, created, play, updated_at) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(bvid) DO UPDATE SET title=excluded.title, duration=excluded.duration, '
+                'created=excluded.created, play=excluded.play, updated_at=excluded.updated_at',
+                rows)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO source_videos (source, bvid, created) VALUES (?, ?, ?)',
+                [(source, row[0], row[3]) for row in rows])
+
+    def contains(self, source, bvids):
+        """返回 bvids 中已在该来源下登记的集合"""
+        bvids = list(bvids)
+        if not bvids:
+            return set()
+        placeholders = ','.join('?' * len(bvids))
+        with self._lock:
+            cursor = self.conn.execute(
+                f'SELECT bvid FROM source_videos WHERE source = ? AND bvid IN ({placeholders})',
+                [source, *bvids])
+            return {row[0] for row in cursor}
+
+    def count(self, source):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM source_videos WHERE source = ?', (source,)).fetchone()[0]
+
+    def get_coverage(self, source):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT covered_from, covered_to, total FROM coverage WHERE source = ?', (source,)).fetchone()
+        return Coverage(*row) if row else None
+
+    def set_coverage(self, source, covered_from, covered_to, total=None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO coverage (source, covered_from, covered_to, total, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (source, int(covered_from), int(covered_to), total, int(time.time())))
+
+    def replace_source(self, source, bvids, covered_from, covered_to, total=None, newer_than=None):
+        """
+        一次连续翻页结束后，在同一个事务中删除该来源下本次没有出现的视频（已删除或移出合集）并更新覆盖区间
+
+        :param bvids: 本次翻页见到的全部BV号（各页已通过 upsert_videos 写入）
+        :param newer_than: 只处理发布时间晚于该值的登记（翻页未到底时，更早的视频本次没有翻到）；None 表示整个来源
+        """
+        with self._lock, self.conn:
+            self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS walk_seen (bvid TEXT PRIMARY KEY)')
+            self.conn.execute('DELETE FROM walk_seen')
+            self.conn.executemany('INSERT OR IGNORE INTO walk_seen (bvid) VALUES (?)', [(bvid,) for bvid in bvids])
+            sql = 'DELETE FROM source_videos WHERE source = ? AND bvid NOT IN (SELECT bvid FROM walk_seen)'
+            params = [source]
+            if newer_than is not None:
+                sql += ' AND created > ?'
+                params.append(int(newer_than))
+            removed = self.conn.execute(sql, params).rowcount
+            self.conn.execute('DELETE FROM walk_seen')
+            self.conn.execute(
+                'INSERT OR REPLACE INTO coverage (source, covered_from, covered_to, total, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (source, int(covered_from), int(covered_to), total, int(time.time())))
+        if removed:
+            logger.info("目录中移除了 %s 个已不在 %s 中的视频", removed, source)
+        return removed
+
+    def query(self, source, start_ts=None, end_ts=None):
+        """
+        按发布时间范围查询，结果按发布时间倒序，与 VideoIndexer 一样返回 VideoRecord 列表
+        """
+        sql = ('SELECT v.bvid, v.title, v.duration, v.created, v.play FROM source_videos s '
+               'JOIN videos v ON v.bvid = s.bvid WHERE s.source = ?')
+        params = [source]
+        if start_ts is not None:
+            sql += ' AND s.created >= ?'
+            params.append(int(start_ts))
+        if end_ts is not None:
+            sql += ' AND s.created <= ?'
+            params.append(int(end_ts))
+        sql += ' ORDER BY s.created DESC'
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [VideoRecord(bvid, title, duration, created, play) for bvid, title, duration, created, play in rows]
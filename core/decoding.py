@@ -0,0 +1,137 @@
+"""
+响应解码模块
+- 根据已安装的解压库协商 Accept-Encoding（brotli / zstd / gzip / deflate）
+- 自行解压响应体，从而能同时统计线上传输字节数与解压后字节数
+- 安装了 orjson 时使用其解析JSON，否则回退到标准库 json
+"""
+import json
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class CorruptBodyError(ValueError):
+    """响应体无法解压（通常是传输中被截断），重新请求一般可以恢复"""
+
+
+def _decompress_errors():
+    errors = [zlib.error]
+    if brotli is not None:
+        errors.append(brotli.error)
+    if zstandard is not None:
+        errors.append(zstandard.ZstdError)
+    return tuple(errors)
+
+
+# 各解压库在数据损坏或不完整时抛出的异常
+DECOMPRESS_ERRORS = _decompress_errors()
+
+
+def _supported_encodings():
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    if zstandard is not None:
+        encodings.append('zstd')
+    encodings.extend(['gzip', 'deflate'])
+    return encodings
+
+
+SUPPORTED_ENCODINGS = _supported_encodings()
+# 按压缩率从高到低排列，服务端会选择它支持的第一个
+ACCEPT_ENCODING = ', '.join(SUPPORTED_ENCODINGS)
+
+
+def json_loads(data):
+    """解析JSON，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode_body(raw, content_encoding):
+    """
+    按 Content-Encoding 解压响应体
+
+    :param raw: 线上传输的原始字节
+    :param content_encoding: 响应头中的 Content-Encoding，可能为多层逗号分隔
+    :return: 解压后的字节
+    :raises CorruptBodyError: 压缩数据损坏或不完整
+    :raises ValueError: 不支持的编码，或未安装对应的解压库
+    """
+    if not content_encoding:
+        return raw
+    try:
+        return _decode_body(raw, content_encoding)
+    except DECOMPRESS_ERRORS as e:
+        raise CorruptBodyError(f"解压响应失败（Content-Encoding: {content_encoding}）: {e}") from e
+
+
+def _decode_body(raw, content_encoding):
+    data = raw
+    # 多层编码按应用顺序的逆序解开
+    for encoding in reversed([e.strip().lower() for e in content_encoding.split(',') if e.strip()]):
+        if encoding in ('identity', ''):
+            continue
+        if encoding == 'br':
+            if brotli is None:
+                raise ValueError("响应使用了brotli压缩，但未安装brotli")
+            data = brotli.decompress(data)
+        elif encoding == 'zstd':
+            if zstandard is None:
+                raise ValueError("响应使用了zstd压缩，但未安装zstandard")
+            data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        elif encoding in ('gzip', 'x-gzip'):
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            try:
+                data = zlib.decompress(data)
+            except zlib.error:
+                # 部分服务端发送不带zlib头的原始deflate流
+                data = zlib.decompress(data, -zlib.MAX_WBITS)
+        else:
+            raise ValueError(f"不支持的Content-Encoding: {encoding}")
+    return data
+
+
+async def read_body(resp, metrics=None, stage=None, decompress=True):
+    """
+    读取并解压响应体，同时记录传输字节数（{stage}_wire）与解压后字节数（{stage}）
+
+    :param resp: aiohttp响应
+    :param decompress: 会话关闭了 auto_decompress 时为True，由这里负责解压
+    :return: 解压后的字节
+    """
+    raw = await resp.read()
+    if decompress:
+        body = decode_body(raw, resp.headers.get('Content-Encoding', ''))
+        wire = len(raw)
+    else:
+        # aiohttp已自动解压，只能从Content-Length估算传输字节数
+        body = raw
+        wire = int(resp.headers.get('Content-Length') or len(raw))
+    if metrics is not None and stage:
+        metrics.add_bytes(f'{stage}_wire', wire)
+        metrics.add_bytes(stage, len(body))
+    return body
+
+
+async def read_json(resp, metrics=None, stage=None, decompress=True):
+    """读取响应并解析JSON，参数同 read_body"""
+    return json_loads(await read_body(resp, metrics, stage, decompress))
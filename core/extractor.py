@@ -1,38 +1,111 @@
 import asyncio
 import aiohttp
 import logging
-import bisect
 import json
 import os
 from PIL import Image
 from io import BytesIO
 
+from config import API_BASE_URL, LOG_SAMPLE_EVERY, SINGLEFLIGHT_TTL
+from core.archive import SIDECAR_NAME, build_sidecar, image_size, sheet_filename
+from core.logging_utils import SampledLogger
+from core.decoding import read_body, read_json
+from core.memory import MemoryBudget
+from core.metrics import MetricsRegistry
+from core.retry import RetryEngine, RequestError, classify_status, check_api_code
+from core.singleflight import SingleFlight
+from core.utils import locate_frame, physical_box
+from core.writer import AtomicWriter, remove_stale_temp_files
+
 logger = logging.getLogger(__name__)
+# 逐张缩略图的成功日志只按比例输出
+sampled_logger = SampledLogger(logger, every=LOG_SAMPLE_EVERY)
+
+class TileCrop:
+    """一张缩略图在瓦片图中的位置（逻辑坐标，下载瓦片图后再按实际像素校准）"""
+
+    __slots__ = ('bvid', 'tile_url', 'logic_x', 'logic_y', 'img_w', 'img_h', 'img_x_cnt', 'img_y_cnt',
+                 'sheet_index', 'box')
+
+    def __init__(self, bvid, tile_url, logic_x, logic_y, img_w, img_h, img_x_cnt, img_y_cnt, sheet_index=0):
+        self.bvid = bvid
+        self.tile_url = tile_url
+        self.logic_x = logic_x
+        self.logic_y = logic_y
+        self.img_w = img_w
+        self.img_h = img_h
+        self.img_x_cnt = img_x_cnt
+        self.img_y_cnt = img_y_cnt
+        self.sheet_index = sheet_index  # 瓦片图在 videoshot image 列表中的序号
+        self.box = None  # 裁剪后记录的物理像素裁剪框 (left, top, right, bottom)
+
 
 class ThumbnailExtractor:
     """缩略图提取器：具备物理像素自动校准与高保真裁剪功能"""
     
-    def __init__(self, session, cookie=""):
+    def __init__(self, session, cookie="", metrics=None, api_base=API_BASE_URL, retry=None, limiter=None,
+                 memory=None, writer=None, json_flight=None):
         self.session = session
+        self.limiter = limiter  # 可选的请求限制器（例如多个 worker 共享的全局预算），需提供 acquire()
+        self.api_base = api_base
+        self.metrics = metrics or MetricsRegistry()
+        self.retry = retry or RetryEngine(metrics=self.metrics)
+        # 在途瓦片图的内存预算：下载前预约，解码后释放原始字节，编码完成后全部归还
+        self.memory = memory or MemoryBudget(metrics=self.metrics)
+        # 写盘线程池：临时文件 + 重命名，批量 fsync
+        self.writer = writer or AtomicWriter(metrics=self.metrics)
+        # 合并相同的在途请求：同一视频的多个采样点共享 pagelist / videoshot，同一瓦片图只下载一次
+        # json_flight 可由外部传入，使元数据结果在多次运行之间共享
+        self.json_flight = json_flight or SingleFlight(ttl=SINGLEFLIGHT_TTL, metrics=self.metrics, name='api')
+        self.tile_flight = SingleFlight(metrics=self.metrics, name='tile')
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://www.bilibili.com/',
             'Cookie': cookie
         }
         
-    async def fetch_json(self, url, params):
-        try:
-            async with self.session.get(url, params=params, headers=self.headers, timeout=10) as resp:
-                if resp.status != 200:
-                    return None
-                return await resp.json()
-        except Exception as e:
-            logger.error(f"网络请求异常: {e}")
-            return None
+    async def fetch_json(self, url, params, stage='api'):
+        """
+        请求API并返回业务码为0的JSON，经过统一的重试与熔断
+
+        :raises RequestError: 分类后的请求错误，可区分404与超时等情况
+        """
+        async def attempt():
+            if self.limiter:
+                await self.limiter.acquire()
+            self.metrics.inc('requests')
+            with self.metrics.timer(stage):
+                async with self.session.get(url, params=params, headers=self.headers, timeout=10) as resp:
+                    if resp.status != 200:
+                        self.metrics.inc('request_errors')
+                        raise classify_status(resp.status, url)
+                    data = await read_json(resp, self.metrics, stage, decompress=not self.session.auto_decompress)
+            return check_api_code(data)
+
+        # 元数据结果可能跨运行共享，不同Cookie（账号）看到的结果可能不同，不能互相复用
+        key = (self.headers['Cookie'], url, tuple(sorted((params or {}).items())))
+        return await self.json_flight.do(key, lambda: self.retry.call(stage, attempt))
+
+    async def fetch_tile(self, tile_url):
+        """下载瓦片图原始字节，经过统一的重试与熔断"""
+        async def attempt():
+            if self.limiter:
+                await self.limiter.acquire()
+            self.metrics.inc('requests')
+            with self.metrics.timer('tile_download'):
+                async with self.session.get(tile_url, headers=self.headers) as tile_resp:
+                    if tile_resp.status != 200:
+                        self.metrics.inc('request_errors')
+                        raise classify_status(tile_resp.status, tile_url)
+                    img_data = await read_body(tile_resp, self.metrics, 'tile_download',
+                                               decompress=not self.session.auto_decompress)
+            return img_data
+
+        return await self.tile_flight.do(tile_url, lambda: self.retry.call('tile_download', attempt))
 
     async def get_cid_by_bvid(self, bvid):
-        data = await self.fetch_json('https://api.bilibili.com/x/player/pagelist', {'bvid': bvid})
-        if data and data.get('code') == 0 and data.get('data'):
+        data = await self.fetch_json(f'{self.api_base}/x/player/pagelist', {'bvid': bvid}, stage='pagelist')
+        if data.get('data'):
             return data['data'][0]['cid']
         return None
 
@@ -46,17 +119,89 @@ class ThumbnailExtractor:
         return pv if isinstance(pv, dict) else data
 
     async def extract_thumbnail_at_time(self, bvid, time_in_seconds, output_path):
+        """
+        提取单个采样点并交给写盘线程池
+
+        :return: 写盘批次提交结果的 Future（结果为是否成功落盘，需要 writer.flush() 触发提交）；提取失败时返回None
+        """
+        try:
+            commit = await self._extract_thumbnail_at_time(bvid, time_in_seconds, output_path)
+        except RequestError as e:
+            self.log_request_error(bvid, e)
+            commit = None
+        except Exception as e:
+            logger.error("处理 %s 异常: %s", bvid, e, exc_info=True)
+            commit = None
+        if commit is None:
+            self.metrics.inc('thumbnail_failures')
+        else:
+            commit.add_done_callback(self._count_commit)
+        return commit
+
+    def _count_commit(self, commit):
+        success = not commit.cancelled() and commit.result()
+        self.metrics.inc('thumbnails' if success else 'thumbnail_failures')
+
+    def log_request_error(self, bvid, error):
+        # 重试已在请求层完成，这里只区分记录
+        kind = "临时错误，重试后仍失败" if error.retryable else "不可重试"
+        logger.error("提取 %s 失败（%s）: %s", bvid, kind, error)
+
+    async def _extract_thumbnail_at_time(self, bvid, time_in_seconds, output_path):
+        crop = await self.locate_thumbnail(bvid, time_in_seconds)
+        if crop is None:
+            return None
+
+        # 4. 下载瓦片图（先按估算值预约内存）
+        reservation = await self.memory.acquire()
+        try:
+            img_data = await self.fetch_tile(crop.tile_url)
+            decoded_size = self.estimate_decoded_size(img_data)
+            await reservation.grow(len(img_data) + decoded_size)
+
+            tile_img = self.decode_tile(crop, img_data)
+            # 解码完成后立即释放原始字节
+            del img_data
+            reservation.resize(decoded_size)
+            if tile_img is None:
+                return None
+
+            encoded = self.crop_and_encode(crop, tile_img, output_path)
+        finally:
+            reservation.release()
+        if encoded is None:
+            return None
+        return await self.write_thumbnail(output_path, encoded)
+
+    def estimate_decoded_size(self, img_data):
+        """
+        只解析图片头，估算解码后占用的字节数（宽 × 高 × 通道数），并更新内存预约的估算值
+        """
+        try:
+            with Image.open(BytesIO(img_data)) as img:
+                size = img.width * img.height * len(img.getbands())
+        except Exception:
+            # 无法解析时按常见压缩比粗略估算，真正的错误留给解码阶段报告
+            size = len(img_data) * 10
+        self.memory.observe(len(img_data) + size)
+        return size
+
+    async def get_videoshot(self, bvid):
+        """
+        获取并校验 videoshot 元数据
+
+        :return: 字典 img_w、img_h（单格逻辑尺寸）、img_x_cnt、img_y_cnt、images（完整URL列表）、index；
+                 元数据不完整时返回None
+        :raises RequestError: 请求失败
+        """
         cid = await self.get_cid_by_bvid(bvid)
         if not cid:
-            return False
-            
-        try:
-            params = {'bvid': bvid, 'cid': cid, 'index': 1}
-            resp_data = await self.fetch_json('https://api.bilibili.com/x/player/videoshot', params)
-            
-            if not resp_data or resp_data.get('code') != 0:
-                return False
+            return None
 
+        params = {'bvid': bvid, 'cid': cid, 'index': 1}
+        resp_data = await self.fetch_json(f'{self.api_base}/x/player/videoshot', params, stage='videoshot')
+
+        try:
             root_data = resp_data.get('data', {})
             pv = self._parse_pv_data(root_data)
 
@@ -67,68 +212,176 @@ class ThumbnailExtractor:
             img_y_cnt = int(pv.get('img_y_count') or 10)
             images = pv.get('image') or pv.get('images')
             index_list = pv.get('index')
+        except Exception as e:
+            logger.error("处理 %s 异常: %s", bvid, e, exc_info=True)
+            return None
 
-            if not (img_w and img_h and images and index_list):
-                logger.error(f"视频 {bvid} 元数据校验失败")
-                return False
-
-            # 2. 定位索引
-            target_idx = bisect.bisect_right(index_list, time_in_seconds) - 1
-            target_idx = max(0, target_idx)
-
-            # 3. 计算逻辑坐标
-            pics_per_sheet = img_x_cnt * img_y_cnt
-            sheet_index = min(target_idx // pics_per_sheet, len(images) - 1)
-            inner_index = target_idx % pics_per_sheet
-            
-            logic_x = (inner_index % img_x_cnt) * img_w
-            logic_y = (inner_index // img_x_cnt) * img_h
-
-            # 4. 下载瓦片图并自动校准像素
-            tile_url = images[sheet_index]
-            if not tile_url.startswith('http'): 
-                tile_url = 'https:' + tile_url
-            
-            async with self.session.get(tile_url, headers=self.headers) as tile_resp:
-                if tile_resp.status != 200:
-                    return False
-                img_data = await tile_resp.read()
-                
-                with Image.open(BytesIO(img_data)) as tile_img:
-                    real_w, real_h = tile_img.size
-                    
-                    # 校准系数：部分高清 WebP 瓦片图的物理像素是 API 声明的 2 倍或更多
-                    # 我们通过总宽度除以列数，重新计算实际每一格的物理像素宽度
-                    scale_w = real_w / (img_w * img_x_cnt)
-                    scale_h = real_h / (img_h * img_y_cnt)
-                    
-                    # 计算物理裁剪坐标
-                    phys_x = int(logic_x * scale_w)
-                    phys_y = int(logic_y * scale_h)
-                    phys_w = int(img_w * scale_w)
-                    phys_h = int(img_h * scale_h)
-
-                    # 裁剪并安全转换
-                    crop_box = (phys_x, phys_y, phys_x + phys_w, phys_y + phys_h)
+        if not (img_w and img_h and images and index_list):
+            logger.error("视频 %s 元数据校验失败", bvid)
+            return None
+
+        return {
+            'img_w': img_w,
+            'img_h': img_h,
+            'img_x_cnt': img_x_cnt,
+            'img_y_cnt': img_y_cnt,
+            'images': [url if url.startswith('http') else 'https:' + url for url in images],
+            'index': index_list,
+        }
+
+    async def locate_thumbnail(self, bvid, time_in_seconds):
+        """
+        元数据阶段：获取CID与videoshot元数据，计算目标缩略图所在的瓦片图及逻辑坐标
+
+        :return: TileCrop，元数据不完整时返回None
+        :raises RequestError: 请求失败
+        """
+        shot = await self.get_videoshot(bvid)
+        if shot is None:
+            return None
+
+        # 定位索引并计算逻辑坐标
+        sheet_index, logic_x, logic_y = locate_frame(
+            shot['index'], time_in_seconds, shot['img_w'], shot['img_h'],
+            shot['img_x_cnt'], shot['img_y_cnt'], len(shot['images']))
+
+        return TileCrop(bvid, shot['images'][sheet_index], logic_x, logic_y, shot['img_w'], shot['img_h'],
+                        shot['img_x_cnt'], shot['img_y_cnt'], sheet_index)
+
+    def render_thumbnail(self, crop, img_data, output_path):
+        """
+        图像处理（CPU密集，可在线程池中执行）：解码瓦片图、自动校准像素、裁剪并编码
+
+        :param crop: locate_thumbnail 返回的 TileCrop
+        :param img_data: 瓦片图原始字节
+        :param output_path: 输出路径，按扩展名选择编码格式
+        :return: 编码后的字节，失败或图片异常时返回None
+        """
+        tile_img = self.decode_tile(crop, img_data)
+        if tile_img is None:
+            return None
+        return self.crop_and_encode(crop, tile_img, output_path)
+
+    def decode_tile(self, crop, img_data):
+        """解码瓦片图，返回已加载的图像；失败时返回None"""
+        try:
+            with self.metrics.timer('decode'):
+                tile_img = Image.open(BytesIO(img_data))
+                tile_img.load()
+            return tile_img
+        except Exception as e:
+            logger.error("处理 %s 异常: %s", crop.bvid, e, exc_info=True)
+            return None
+
+    def crop_and_encode(self, crop, tile_img, output_path):
+        """
+        按实际像素校准坐标后裁剪并编码，完成后关闭 tile_img
+
+        :return: 编码后的字节，失败或图片异常时返回None
+        """
+        try:
+            with tile_img:
+                real_w, real_h = tile_img.size
+
+                # 按实际像素校准后计算物理裁剪坐标
+                crop_box = physical_box(crop.logic_x, crop.logic_y, crop.img_w, crop.img_h,
+                                        crop.img_x_cnt, crop.img_y_cnt, real_w, real_h)
+                crop.box = crop_box
+
+                # 裁剪并安全转换
+                with self.metrics.timer('crop'):
                     thumbnail = tile_img.crop(crop_box)
-                    
+
                     if thumbnail.mode != "RGB":
                         thumbnail = thumbnail.convert("RGB")
-                    
-                    # 5. 保存并质量审计
-                    save_ext = os.path.splitext(output_path)[1].lower()
-                    save_fmt = 'WEBP' if save_ext == '.webp' else 'JPEG'
-                    
-                    thumbnail.save(output_path, format=save_fmt, quality=95)
-                    
-                    size = os.path.getsize(output_path)
-                    if size < 500:
-                        logger.error(f"异常：{bvid} 裁剪出的图片过小({size}B)，坐标: {crop_box}, 大图尺寸: {tile_img.size}")
-                        return False
-                    
-                    logger.info(f"成功保存: {output_path} ({size} 字节)")
-                    return True
 
+                # 5. 编码并质量审计
+                save_ext = os.path.splitext(output_path)[1].lower()
+                save_fmt = 'WEBP' if save_ext == '.webp' else 'JPEG'
+
+                with self.metrics.timer('encode'):
+                    buffer = BytesIO()
+                    thumbnail.save(buffer, format=save_fmt, quality=95)
+                    encoded = buffer.getvalue()
+
+                # 写盘前在内存中校验：过小或无法解码的图片不落盘
+                if len(encoded) < 500:
+                    logger.error("异常：%s 裁剪出的图片过小(%sB)，坐标: %s, 大图尺寸: %s",
+                                 crop.bvid, len(encoded), crop_box, tile_img.size)
+                    return None
+                with self.metrics.timer('validate'):
+                    with Image.open(BytesIO(encoded)) as check:
+                        check.verify()
+                return encoded
         except Exception as e:
-            logger.error(f"处理 {bvid} 异常: {e}", exc_info=True)
-            return False
\ No newline at end of file
+            logger.error("处理 %s 异常: %s", crop.bvid, e, exc_info=True)
+            return None
+
+    async def archive_video(self, bvid, video_dir):
+        """
+        归档模式：原样保存该视频的全部瓦片图，最后写入 videoshot.json（不裁剪、不编码）
+
+        已存在的瓦片图不会重复下载，因此中断后重新运行可以续传
+        :param video_dir: 该视频的归档目录
+        :return: 是否归档完整
+        :raises RequestError: 请求失败
+        """
+        shot = await self.get_videoshot(bvid)
+        if shot is None:
+            return False
+        os.makedirs(video_dir, exist_ok=True)
+        # 清理上次中断时该视频遗留的临时文件（输出目录的清理不覆盖归档子目录）
+        remove_stale_temp_files(video_dir)
+
+        sheets = []
+        commits = []
+        for sheet_index, url in enumerate(shot['images']):
+            name = sheet_filename(sheet_index, url)
+            path = os.path.join(video_dir, name)
+            size = image_size(path) if os.path.exists(path) else None
+            if size is None:
+                # 原始字节同样计入内存预算，从下载持有到写出临时文件
+                reservation = await self.memory.acquire()
+                try:
+                    data = await self.fetch_tile(url)
+                    await reservation.grow(len(data))
+                    size = image_size(data)
+                    if size is None:
+                        logger.error("视频 %s 的瓦片图 %s 无法识别", bvid, url)
+                        return False
+                    commit = await self.write_thumbnail(path, data)
+                finally:
+                    reservation.release()
+                if commit is None:
+                    return False
+                commits.append(commit)
+            sheets.append((name, size[0], size[1]))
+
+        # 先提交瓦片图，保证 videoshot.json 出现时瓦片图都已以正式文件名落盘
+        await self.writer.flush()
+        if not all(await asyncio.gather(*commits)):
+            logger.error("视频 %s 的瓦片图未能全部落盘，不写入 videoshot.json", bvid)
+            return False
+        sidecar = build_sidecar(bvid, shot, sheets)
+        commit = await self.write_thumbnail(os.path.join(video_dir, SIDECAR_NAME),
+                                            json.dumps(sidecar, ensure_ascii=False).encode('utf-8'))
+        if commit is None:
+            return False
+        await self.writer.flush()
+        return await commit
+
+    async def write_thumbnail(self, output_path, encoded):
+        """
+        写盘阶段：交给写盘线程池原子写入
+
+        :return: 批次提交结果的 Future（结果为是否成功重命名为正式文件名）；临时文件写入失败时返回None
+        """
+        try:
+            with self.metrics.timer('disk_write'):
+                commit = await self.writer.write(output_path, encoded)
+        except OSError as e:
+            logger.error("保存 %s 失败: %s", output_path, e)
+            return None
+        self.metrics.add_bytes('disk_write', len(encoded))
+        sampled_logger.info('saved', "成功保存: %s (%s 字节)", output_path, len(encoded))
+        return commit
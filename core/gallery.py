@@ -0,0 +1,368 @@
+"""
+静态预览画廊模块
+在输出目录下生成 gallery/index.html：按视频分组、按月份分片的分页索引，
+每张缩略图附带内联的极小占位图，原图使用浏览器原生懒加载。
+新缩略图落盘后只重写所在月份的分片与清单，上万张缩略图的合集也能立即打开。
+
+分片以 .js 文件保存（一次函数调用包裹JSON），这样直接双击打开 index.html（file://）也能加载；
+同时输出 manifest.json 供其他工具读取。
+"""
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from config import GALLERY_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+GALLERY_DIR = 'gallery'
+SHARD_DIR = 'shards'
+SHARD_CALLBACK = 'galleryShard'
+MANIFEST_CALLBACK = 'galleryManifest'
+
+# 缩略图文件名：发布日期_BV号(序号).格式
+THUMBNAIL_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})_(BV\w+)\((\d+)\)\.(webp|jpe?g|png)$', re.IGNORECASE)
+
+# 占位图尺寸（像素）与JPEG质量，编码后约200-400字节
+PLACEHOLDER_SIZE = (16, 9)
+PLACEHOLDER_QUALITY = 40
+
+
+def make_placeholder(path):
+    """
+    生成内联的极小占位图（data URI）
+
+    :return: 文件尚不存在（例如还未提交落盘）时返回None，下次 flush 重试；图片无法解析时返回空字符串
+    """
+    try:
+        with Image.open(path) as img:
+            img.draft('RGB', PLACEHOLDER_SIZE)
+            small = img.convert('RGB').resize(PLACEHOLDER_SIZE)
+        buffer = BytesIO()
+        small.save(buffer, format='JPEG', quality=PLACEHOLDER_QUALITY)
+        return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+    except FileNotFoundError:
+        logger.debug("占位图对应的文件尚不存在: %s", path)
+        return None
+    except Exception as e:
+        logger.debug("生成占位图失败 %s: %s", path, e)
+        return ''
+
+
+class GalleryBuilder:
+    """
+    增量画廊生成器
+
+    add_video / scan 只登记条目，flush 时生成占位图并重写有变化的分片；flush 可在线程池中调用
+    """
+
+    def __init__(self, output_dir, page_size=GALLERY_PAGE_SIZE):
+        """
+        :param output_dir: 缩略图所在目录，画廊写入其中的 gallery/ 子目录
+        :param page_size: 每个分片包含的视频数
+        """
+        self.output_dir = output_dir
+        self.gallery_dir = os.path.join(output_dir, GALLERY_DIR)
+        self.page_size = max(1, page_size)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._videos = {}  # bvid -> {'bvid', 'title', 'date', 'created', 'thumbs': {文件名: 占位图}}
+        self._dirty_months = set()
+        self._shard_files = {}  # 月份 -> [(分片文件名, 视频数)]，按页码排列
+        self._load()
+
+    def _load(self):
+        """读取已有分片，恢复索引（增量更新的基础）"""
+        shard_root = os.path.join(self.gallery_dir, SHARD_DIR)
+        if not os.path.isdir(shard_root):
+            return
+        prefix = f'{SHARD_CALLBACK}('
+        for name in os.listdir(shard_root):
+            if not name.endswith('.js'):
+                continue
+            try:
+                with open(os.path.join(shard_root, name), 'r', encoding='utf-8') as f:
+                    text = f.read().strip()
+                shard = json.loads(text[len(prefix):-2])
+            except (OSError, ValueError) as e:
+                logger.warning("画廊分片 %s 无法读取，将重新生成: %s", name, e)
+                continue
+            for video in shard['videos']:
+                self._videos[video['bvid']] = {
+                    'bvid': video['bvid'],
+                    'title': video.get('title', ''),
+                    'date': video['date'],
+                    'created': video.get('created', 0),
+                    # 空占位图视为尚未生成，所在月份下次重写时重试
+                    'thumbs': {thumb['file']: thumb.get('placeholder') or None for thumb in video['thumbs']},
+                }
+            self._shard_files.setdefault(shard['month'], []).append((shard['page'], name, len(shard['videos'])))
+        for month, shards in self._shard_files.items():
+            self._shard_files[month] = [(name, count) for _, name, count in sorted(shards)]
+
+    def add_video(self, video, paths):
+        """
+        登记一个视频的缩略图
+
+        :param video: VideoRecord（或包含 bvid、title、created、created_str 的字典）
+        :param paths: 该视频已写出的缩略图路径
+        """
+        files = [os.path.basename(path) for path in paths]
+        with self._lock:
+            entry = self._videos.get(video['bvid'])
+            if entry is None:
+                entry = self._videos[video['bvid']] = {
+                    'bvid': video['bvid'],
+                    'title': video.get('title', ''),
+                    'date': video['created_str'].split(' ')[0],
+                    'created': video.get('created', 0),
+                    'thumbs': {},
+                }
+            else:
+                entry['title'] = video.get('title') or entry['title']
+            for name in files:
+                entry['thumbs'].setdefault(name, None)
+            self._dirty_months.add(entry['date'][:7])
+
+    def scan(self):
+        """扫描输出目录，登记画廊中还没有的缩略图，返回新增的文件数"""
+        added = 0
+        try:
+            names = os.listdir(self.output_dir)
+        except OSError:
+            return 0
+        with self._lock:
+            for name in names:
+                match = THUMBNAIL_PATTERN.match(name)
+                if not match:
+                    continue
+                date, bvid = match.group(1), match.group(2)
+                entry = self._videos.get(bvid)
+                if entry is None:
+                    entry = self._videos[bvid] = {'bvid': bvid, 'title': '', 'date': date, 'created': 0,
+                                                  'thumbs': {}}
+                if name not in entry['thumbs']:
+                    entry['thumbs'][name] = None
+                    self._dirty_months.add(date[:7])
+                    added += 1
+        return added
+
+    def pending(self):
+        """是否有尚未写出的变化"""
+        with self._lock:
+            return bool(self._dirty_months)
+
+    def flush(self):
+        """
+        生成新条目的占位图，重写有变化的月份分片以及清单和首页
+
+        :return: 本次重写的分片数
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        # 在锁内复制有变化月份的条目，之后的占位图生成与写盘都只读写副本，
+        # 提取线程此时调用 add_video 不会与遍历冲突
+        with self._lock:
+            months = self._dirty_months
+            self._dirty_months = set()
+            groups = {}
+            for entry in self._videos.values():
+                month = entry['date'][:7]
+                if month in months:
+                    groups.setdefault(month, []).append({**entry, 'thumbs': dict(entry['thumbs'])})
+        if not months:
+            return 0
+
+        started = time.perf_counter()
+        shard_root = os.path.join(self.gallery_dir, SHARD_DIR)
+        os.makedirs(shard_root, exist_ok=True)
+
+        written = 0
+        for month, entries in groups.items():
+            # 占位图在锁外生成，只处理新登记的文件，结果在锁内写回
+            generated = []
+            for entry in entries:
+                for name, placeholder in entry['thumbs'].items():
+                    if placeholder is None:
+                        placeholder = make_placeholder(os.path.join(self.output_dir, name))
+                        entry['thumbs'][name] = placeholder
+                        generated.append((entry['bvid'], name, placeholder))
+            if generated:
+                with self._lock:
+                    for bvid, name, placeholder in generated:
+                        thumbs = self._videos[bvid]['thumbs']
+                        if thumbs.get(name) is None:
+                            thumbs[name] = placeholder
+
+            entries.sort(key=lambda e: (e['date'], e['created'], e['bvid']), reverse=True)
+            files = []
+            for page, start in enumerate(range(0, len(entries), self.page_size), start=1):
+                name = f'{month}-{page}.js'
+                chunk = entries[start:start + self.page_size]
+                self._write_shard(os.path.join(shard_root, name), month, page, chunk)
+                files.append((name, len(chunk)))
+                written += 1
+            with self._lock:
+                stale = {name for name, _ in self._shard_files.get(month, [])} - {name for name, _ in files}
+                self._shard_files[month] = files
+            for name in stale:
+                try:
+                    os.remove(os.path.join(shard_root, name))
+                except OSError:
+                    pass
+
+        self._write_manifest()
+        self._write_index()
+        logger.debug("画廊已更新 %s 个分片，用时 %.3fs", written, time.perf_counter() - started)
+        return written
+
+    def _write_shard(self, path, month, page, entries):
+        """写出一个分片，entries 为 _flush 在锁内复制的条目"""
+        shard = {
+            'month': month,
+            'page': page,
+            'videos': [{
+                'bvid': entry['bvid'],
+                'title': entry['title'],
+                'date': entry['date'],
+                'created': entry['created'],
+                'thumbs': [{'file': name, 'placeholder': entry['thumbs'][name] or ''}
+                           for name in sorted(entry['thumbs'], key=_thumb_order)],
+            } for entry in entries],
+        }
+        payload = json.dumps(shard, ensure_ascii=False, separators=(',', ':'))
+        _write_atomic(path, f'{SHARD_CALLBACK}({payload});\n')
+
+    def _manifest(self):
+        with self._lock:
+            shards = [{
+                'file': f'{SHARD_DIR}/{name}',
+                'month': month,
+                'videos': count,
+            } for month in sorted(self._shard_files, reverse=True) for name, count in self._shard_files[month]]
+            return {
+                'version': 1,
+                'updated': int(time.time()),
+                'page_size': self.page_size,
+                'total_videos': len(self._videos),
+                'total_thumbnails': sum(len(e['thumbs']) for e in self._videos.values()),
+                'shards': shards,
+            }
+
+    def _write_manifest(self):
+        manifest = self._manifest()
+        payload = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'))
+        _write_atomic(os.path.join(self.gallery_dir, 'manifest.json'), payload)
+        _write_atomic(os.path.join(self.gallery_dir, 'manifest.js'), f'{MANIFEST_CALLBACK}({payload});\n')
+
+    def _write_index(self):
+        path = os.path.join(self.gallery_dir, 'index.html')
+        if not os.path.exists(path):
+            _write_atomic(path, INDEX_HTML)
+
+
+def _thumb_order(name):
+    match = THUMBNAIL_PATTERN.match(name)
+    return int(match.group(3)) if match else 0
+
+
+def _write_atomic(path, text):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>缩略图预览</title>
+<style>
+body { margin: 0; font-family: system-ui, sans-serif; background: #111; color: #ddd; }
+header { position: sticky; top: 0; z-index: 1; padding: 8px 16px; background: #1b1b1b; }
+.shard { min-height: 240px; }
+h2 { margin: 16px; font-size: 16px; color: #aaa; }
+.video { margin: 0 16px 12px; }
+.video .meta { font-size: 13px; margin-bottom: 4px; }
+.video .meta a { color: #6cf; text-decoration: none; }
+.thumbs { display: flex; flex-wrap: wrap; gap: 4px; }
+.thumbs img { width: 240px; height: 135px; object-fit: cover; background-size: cover; background-color: #222; }
+</style>
+</head>
+<body>
+<header id="summary">加载中…</header>
+<main id="gallery"></main>
+<script>
+var pending = {};
+function galleryManifest(manifest) {
+  document.getElementById('summary').textContent =
+    manifest.total_videos + ' 个视频，' + manifest.total_thumbnails + ' 张缩略图';
+  var root = document.getElementById('gallery');
+  var observer = new IntersectionObserver(function (items) {
+    items.forEach(function (item) {
+      if (!item.isIntersecting) return;
+      observer.unobserve(item.target);
+      load(item.target);
+    });
+  }, {rootMargin: '1200px 0px'});
+  var lastMonth = null;
+  manifest.shards.forEach(function (shard) {
+    if (shard.month !== lastMonth) {
+      var title = document.createElement('h2');
+      title.textContent = shard.month;
+      root.appendChild(title);
+      lastMonth = shard.month;
+    }
+    var section = document.createElement('section');
+    section.className = 'shard';
+    section.dataset.file = shard.file;
+    section.style.minHeight = (shard.videos * 170) + 'px';
+    root.appendChild(section);
+    observer.observe(section);
+  });
+}
+function load(section) {
+  pending[section.dataset.file] = section;
+  var script = document.createElement('script');
+  script.src = section.dataset.file + '?v=' + Date.now();
+  document.body.appendChild(script);
+}
+function galleryShard(shard) {
+  var file = 'shards/' + shard.month + '-' + shard.page + '.js';
+  var section = pending[file];
+  if (!section) return;
+  delete pending[file];
+  var html = [];
+  shard.videos.forEach(function (video) {
+    html.push('<div class="video"><div class="meta">' + video.date + ' <a href="https://www.bilibili.com/video/' +
+      video.bvid + '" target="_blank">' + video.bvid + '</a> ' + escapeHtml(video.title) + '</div><div class="thumbs">');
+    video.thumbs.forEach(function (thumb) {
+      html.push('<img loading="lazy" decoding="async" src="../' + encodeURI(thumb.file) +
+        '" style="background-image:url(' + thumb.placeholder + ')" alt="">');
+    });
+    html.push('</div></div>');
+  });
+  section.innerHTML = html.join('');
+  section.style.minHeight = '';
+}
+function escapeHtml(text) {
+  return String(text || '').replace(/[&<>"']/g, function (c) {
+    return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+  });
+}
+</script>
+<script src="manifest.js"></script>
+</body>
+</html>
+"""
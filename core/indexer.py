@@ -1,5 +1,6 @@
 import asyncio
 import aiohttp
+import contextlib
 import time
 import hashlib
 import urllib.parse
@@ -8,38 +9,75 @@ import json
 import logging
 import re
 
+from config import API_BASE_URL
+from core.catalog import up_source, series_source
+from core.decoding import ACCEPT_ENCODING, read_json
+from core.metrics import MetricsRegistry
+from core.retry import RetryEngine, RequestError, classify_status, check_api_code
+from core.video import VideoRecord
+
 logger = logging.getLogger(__name__)
 
 
 class RequestLimiter:
-    """请求限制器，控制QPS"""
+    """
+    请求限制器，控制QPS；并发调用时按到达顺序依次分配发送时间
+
+    等待中被取消的调用归还其时间槽（例如合集某一页失败后取消其余页），
+    限制器被多个频道/运行共享时，不会因为未发出的请求推迟之后的所有请求
+    """
     def __init__(self, qps=4):
         self.qps = qps
         self.interval = 1.0 / qps
-        self.last_request_time = 0
-        
+        self.next_request_time = 0
+        self._last_sent = None  # 最近一个已放行请求的时间槽
+        self._waiting = []  # 已预约、尚未放行的时间槽
+
     async def acquire(self):
+        # 先预约时间槽再等待，读写之间没有await，多个协程并发调用也不会同时放行
         now = time.time()
-        time_passed = now - self.last_request_time
-        if time_passed < self.interval:
-            await asyncio.sleep(self.interval - time_passed)
-        self.last_request_time = time.time()
+        slot = max(now, self.next_request_time)
+        self.next_request_time = slot + self.interval
+        if slot <= now:
+            self._last_sent = slot
+            return
+        self._waiting.append(slot)
+        try:
+            await asyncio.sleep(slot - now)
+        except BaseException:
+            self._waiting.remove(slot)
+            self._release()
+            raise
+        self._waiting.remove(slot)
+        self._last_sent = slot if self._last_sent is None else max(self._last_sent, slot)
+
+    def _release(self):
+        """按仍在等待的时间槽重新计算下一个可用时间槽"""
+        last = max(self._waiting) if self._waiting else self._last_sent
+        self.next_request_time = last + self.interval if last is not None else 0
 
 
 class VideoIndexer:
     """视频索引器，负责获取UP主的视频列表"""
     
-    def __init__(self, session=None, cookie="", qps=4):
+    def __init__(self, session=None, cookie="", qps=4, metrics=None, api_base=API_BASE_URL, page_delay=3.0,
+                 retry=None, catalog=None, metadata=None, limiter=None):
         self.session = session
+        self.catalog = catalog  # 本地视频目录（VideoCatalog），为None时每次都完整翻页
+        self.metadata = metadata  # 跨运行共享的元数据缓存（MetadataCache），用于复用WBI密钥
+        self.api_base = api_base
+        self.page_delay = page_delay  # 翻页间隔（秒），用于避免触发风控
         self.own_session = session is None  # 标记是否拥有自己的session
-        self.limiter = RequestLimiter(qps)
+        self.limiter = limiter or RequestLimiter(qps)  # 可由外部传入，与提取共享同一请求预算
+        self.metrics = metrics or MetricsRegistry()
+        self.retry = retry or RetryEngine(metrics=self.metrics)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://space.bilibili.com/',
             'Cookie': cookie,
             'Accept': 'application/json, text/plain, */*',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
+            'Accept-Encoding': ACCEPT_ENCODING,
             'Connection': 'keep-alive',
             'Sec-Fetch-Dest': 'empty',
             'Sec-Fetch-Mode': 'cors',
@@ -55,52 +93,53 @@ class VideoIndexer:
                 use_dns_cache=True,
                 force_close=False     # 强制保持长连接 (Keep-Alive)
             )
-            self.session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+            self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, auto_decompress=False)
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.own_session and self.session:
             await self.session.close()
 
+    @contextlib.asynccontextmanager
+    async def _listing_session(self):
+        """
+        列表阶段使用的会话：有注入（或 __aenter__ 创建）的会话时直接复用其连接池、DNS缓存与TLS会话，
+        否则临时创建一个，用完关闭
+        """
+        if self.session is not None and not self.session.closed:
+            yield self.session
+            return
+        async with aiohttp.ClientSession(headers=self.headers, auto_decompress=False) as session:
+            yield session
+
     async def get_mixin_key(self, session):
         """获取mix密钥用于WBI签名"""
+        if self.metadata is not None:
+            cached = self.metadata.get_wbi_key()
+            if cached:
+                logger.debug("使用缓存的WBI密钥")
+                return cached
         try:
-            # 设置Accept-Encoding为gzip, deflate以避免Brotli编码
-            headers = self.headers.copy()
-            headers['Accept-Encoding'] = 'gzip, deflate'
-            
             logger.info("正在获取WBI密钥...")
-            resp = await session.get('https://api.bilibili.com/x/web-interface/nav', headers=headers)
-            logger.info(f"获取WBI密钥响应状态: {resp.status}")
-            
-            # 尝试解析响应
-            content = await resp.json()
-            logger.debug(f"WBI密钥响应数据: {content}")
-            
-            if content['code'] == -101:  # 账号未登录
-                logger.error("Cookie无效或已过期，请更新Cookie")
-                raise Exception("Cookie无效或已过期，请更新Cookie")
-            
-            if content['code'] != 0:
-                logger.error(f"获取WBI密钥失败: {content['message']}")
-                raise Exception(f"获取WBI密钥失败: {content['message']}")
+            content = await self._get_json(session, 'wbi_key', f'{self.api_base}/x/web-interface/nav')
+            logger.debug("WBI密钥响应数据: %s", content)
             
             img_url = content['data']['wbi_img']['img_url']
             sub_url = content['data']['wbi_img']['sub_url']
             
-            logger.info(f"原始img_url: {img_url}")
-            logger.info(f"原始sub_url: {sub_url}")
+            logger.debug("原始img_url: %s", img_url)
+            logger.debug("原始sub_url: %s", sub_url)
             
             # 提取URL中的参数部分
             img_key = img_url.rsplit('/', 1)[1].split('.')[0]
             sub_key = sub_url.rsplit('/', 1)[1].split('.')[0]
             
-            logger.info(f"img_key: {img_key}")
-            logger.info(f"sub_key: {sub_key}")
+            logger.debug("img_key: %s", img_key)
+            logger.debug("sub_key: %s", sub_key)
             
             # 生成mix_key - 按照B站实际算法
             mixin_key = img_key + sub_key
-            logger.info(f"混合mixin_key: {mixin_key}")
+            logger.debug("混合mixin_key: %s", mixin_key)
             
             # 根据BAC Document给出的64位偏移量序列
             # [46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49, 33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40, 61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11, 36, 20, 34, 44, 52]
@@ -111,17 +150,59 @@ class VideoIndexer:
                     filtered_chars.append(mixin_key[i])
             
             result_key = ''.join(filtered_chars)[:32]
-            logger.info(f"最终mixin_key: {result_key}")
+            logger.debug("最终mixin_key: %s", result_key)
+            if self.metadata is not None:
+                self.metadata.set_wbi_key(result_key)
             
             return result_key
         except Exception as e:
-            logger.error(f"获取mix密钥失败: {e}")
+            logger.error("获取mix密钥失败: %s", e)
             raise
 
+    async def _get_json(self, session, stage, url, params=None, headers=None, limited=False, validators=None):
+        """
+        发起GET请求并解析JSON，经过统一的重试与熔断，同时记录阶段耗时、请求数与响应字节数
+
+        :param stage: 指标与熔断使用的接口名
+        :param limited: 为True时每次尝试前都经过QPS限制器
+        :param validators: 条件请求的校验值字典（etag / last_modified），有值时发送 If-None-Match / If-Modified-Since，
+                           响应成功后原地更新为新的校验值
+        :return: 业务码为0的响应数据；条件请求命中（304）时返回None
+        :raises RequestError: 分类后的请求错误（已按策略重试）
+        """
+        # 注入的会话可能由其他组件创建，每次请求都带上本索引器的请求头（Cookie、Referer 等）
+        headers = {**self.headers, **(headers or {})}
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        async def attempt():
+            if limited:
+                await self.limiter.acquire()
+            self.metrics.inc('requests')
+            with self.metrics.timer(stage):
+                async with session.get(url, params=params, headers=headers) as resp:
+                    logger.debug("API响应状态: %s", resp.status)
+                    if resp.status == 304 and validators:
+                        self.metrics.inc('not_modified')
+                        return None
+                    if resp.status != 200:
+                        self.metrics.inc('request_errors')
+                        raise classify_status(resp.status, url)
+                    data = await read_json(resp, self.metrics, stage, decompress=not session.auto_decompress)
+                    if validators is not None:
+                        validators['etag'] = resp.headers.get('ETag')
+                        validators['last_modified'] = resp.headers.get('Last-Modified')
+            return check_api_code(data)
+
+        return await self.retry.call(stage, attempt)
+
     def calculate_sign(self, params, mixin_key):
         """计算WBI签名"""
-        logger.info(f"计算WBI签名，原始参数: {params}")
-        logger.info(f"mixin_key: {mixin_key}")
+        logger.debug("计算WBI签名，原始参数: %s", params)
+        logger.debug("mixin_key: %s", mixin_key)
         
         # 参数注入：wts应该已经在params中
         
@@ -136,11 +217,11 @@ class VideoIndexer:
             cleaned_v = re.sub(special_chars_pattern, '', str_v)
             cleaned_params[k] = cleaned_v
         
-        logger.info(f"清洗后的参数: {cleaned_params}")
+        logger.debug("清洗后的参数: %s", cleaned_params)
         
         # 排序编码：对字典按Key升序排列，并使用urllib.parse.quote对Value进行编码
         ordered_params = dict(sorted(cleaned_params.items()))
-        logger.info(f"排序后参数: {ordered_params}")
+        logger.debug("排序后参数: %s", ordered_params)
         
         # 字符串拼接：形成k1=v1&k2=v2...&wts=xxx的字符串
         query_parts = []
@@ -150,21 +231,24 @@ class VideoIndexer:
             query_parts.append(f'{k}={encoded_v}')
         
         query_str = '&'.join(query_parts)
-        logger.info(f"URL编码后的查询字符串: {query_str}")
+        logger.debug("URL编码后的查询字符串: %s", query_str)
         
         # 加盐MD5：在字符串尾部直接追加打乱后的mixin_key，最后生成MD5
         sign_str = query_str + mixin_key
-        logger.info(f"签名字符串: {sign_str}")
+        logger.debug("签名字符串: %s", sign_str)
         
         # 计算MD5
         sign = hashlib.md5(sign_str.encode()).hexdigest()
-        logger.info(f"签名结果: {sign}")
+        logger.debug("签名结果: %s", sign)
         
         return sign
 
     async def get_videos_by_up_id(self, up_id, start_time=None, end_time=None, max_pages=None, qps=4):
         """
         根据UP主ID获取视频列表
+
+        列表按发布时间倒序。若第1页的视频全部晚于结束时间，先按发布时间二分查找第一个包含结束时间的页，
+        再从该页向后翻到开始时间，回溯多年前的日期范围时只需 O(log 页数 + 范围页数) 次请求
         
         :param up_id: UP主ID
         :param start_time: 开始时间过滤
@@ -176,8 +260,8 @@ class VideoIndexer:
         if not up_id:
             raise ValueError("UP主ID不能为空")
         
-        logger.info(f"开始获取UP主 {up_id} 的视频列表")
-        logger.info(f"时间范围: {start_time} 到 {end_time}")
+        logger.info("开始获取UP主 %s 的视频列表", up_id)
+        logger.info("时间范围: %s 到 %s", start_time, end_time)
         
         # 检查Cookie是否设置
         if not self.headers['Cookie'] or self.headers['Cookie'] == "":
@@ -186,73 +270,61 @@ class VideoIndexer:
         
         all_videos = []
         page = 1
+
+        # 本地目录：翻到与已覆盖区间衔接的页后，剩余部分直接从目录读取
+        source = up_source(up_id)
+        coverage = self.catalog.get_coverage(source) if self.catalog else None
+        start_ts = int(start_time.timestamp()) if start_time else 0
+        end_ts = int(end_time.timestamp()) if end_time else None
+        walk_started = int(time.time())
+        oldest_seen = None  # 已翻过的页中最早的发布时间
+        exhausted = False  # 是否翻到了最后一页
+        joined_catalog = False  # 是否已与目录中的覆盖区间衔接
+        seeked = False  # 是否通过二分查找跳过了中间的页（此后翻过的页不再与第1页连续）
+        probed_pages = {}  # 二分查找时已请求过的页，向后翻页时直接复用
+        seen_bvids = set()  # 连续翻过的页中出现的全部视频，用于移除目录中已删除的视频
         
-        # 创建session
-        async with aiohttp.ClientSession(headers=self.headers) as session:
+        # 优先复用注入的常驻会话
+        async with self._listing_session() as session:
             try:
                 # 获取mixin_key
                 mixin_key = await self.get_mixin_key(session)
             except Exception as e:
-                logger.error(f"无法获取WBI密钥，可能是因为Cookie无效: {e}")
+                logger.error("无法获取WBI密钥，可能是因为Cookie无效: %s", e)
                 return None  # 返回None表示错误
                 
             while True:
                 if max_pages and page > max_pages:
                     break
                 
-                # 计算WBI签名参数
-                # 1. 先准备所有基础参数，必须先放入wts
-                wts = int(time.time())
-                params = {
-                    'mid': up_id,
-                    'order': 'pubdate',  # 按发布时间排序
-                    'order_avoided': '1',
-                    'platform': 'web',
-                    'pn': page,
-                    'ps': 30,
-                    'wts': wts  # 必须先放入wts
-                }
-                
-                # 2. 计算签名（此时params已包含wts）
-                sign = self.calculate_sign(params, mixin_key)
-                params['w_rid'] = sign  # 写入签名
-                
-                logger.info(f"请求参数: {params}")
-                
-                # 3. 限制频率并请求
-                await self.limiter.acquire()
-                
                 try:
-                    logger.info(f"正在获取第 {page} 页视频列表...")
-                    logger.info(f"请求URL: https://api.bilibili.com/x/space/wbi/arc/search?{urllib.parse.urlencode(params)}")
-                    
-                    resp = await session.get('https://api.bilibili.com/x/space/wbi/arc/search', params=params)
-                    logger.info(f"API响应状态: {resp.status}")
-                    
-                    data = await resp.json()
-                    logger.debug(f"API响应数据: {data}")
-                    
-                    if data['code'] == -101:  # 账号未登录
-                        logger.error("API请求失败: 账号未登录，请检查Cookie是否有效")
-                        return None  # 返回None表示错误
-                    elif data['code'] == -352:  # 风控校验失败
-                        logger.error("API请求失败: 风控校验失败，请降低请求频率或检查Cookie")
-                        return None  # 返回None表示错误
-                    elif data['code'] == -3:  # API签名错误
-                        logger.error("API请求失败: API签名错误，请检查WBI算法")
-                        return None  # 返回None表示错误
-                    elif data['code'] != 0:
-                        logger.error(f"API请求失败: {data['message']}")
-                        return None  # 返回None表示错误
+                    if page in probed_pages:
+                        data = probed_pages.pop(page)
+                    else:
+                        logger.info("正在获取第 %s 页视频列表...", page)
+                        data = await self._get_up_page(session, up_id, page, mixin_key)
                     
                     videos_info = data['data']['list']['vlist']
                     
                     # 如果没有视频了，退出
                     if not videos_info:
                         logger.info("没有更多视频了")
+                        exhausted = True
                         break
                     
-                    logger.info(f"第 {page} 页获取到 {len(videos_info)} 个视频")
+                    logger.info("第 %s 页获取到 %s 个视频", page, len(videos_info))
+                    page_oldest = min(video['created'] for video in videos_info)
+
+                    if self.catalog:
+                        self.catalog.upsert_videos(source, [{
+                            'bvid': video['bvid'],
+                            'title': video['title'],
+                            'duration': video['length'],
+                            'created': video['created'],
+                            'play': video['play']
+                        } for video in videos_info])
+                        oldest_seen = page_oldest if oldest_seen is None else min(oldest_seen, page_oldest)
+                        seen_bvids.update(video['bvid'] for video in videos_info)
                     
                     # 检查Early Exit条件
                     should_exit = False
@@ -260,11 +332,11 @@ class VideoIndexer:
                         video_timestamp = video['created']
                         video_datetime = datetime.fromtimestamp(video_timestamp)
                         
-                        logger.debug(f"视频: {video['bvid']}, 发布时间: {video_datetime}, 标题: {video['title']}")
+                        logger.debug("视频: %s, 发布时间: %s, 标题: %s", video['bvid'], video_datetime, video['title'])
                         
                         # 如果视频发布时间早于开始时间，则应用Early Exit策略
                         if start_time and video_datetime < start_time:
-                            logger.info(f"检测到视频发布于 {video_datetime} 早于开始时间 {start_time}，执行Early Exit")
+                            logger.info("检测到视频发布于 %s 早于开始时间 %s，执行Early Exit", video_datetime, start_time)
                             should_exit = True
                             break
                         
@@ -272,38 +344,169 @@ class VideoIndexer:
                         if (not start_time or video_datetime >= start_time) and \
                            (not end_time or video_datetime <= end_time):
                             # 只添加基本信息，不获取CID（在提取器阶段再获取）
-                            all_videos.append({
-                                'bvid': video['bvid'],
-                                'title': video['title'],
-                                'duration': video['length'],  # 视频时长字符串，需要转换
-                                'created': video['created'],
-                                'created_str': datetime.fromtimestamp(video['created']).strftime('%Y-%m-%d %H:%M:%S'),
-                                'play': video['play'],
-                                'video_url': f"https://www.bilibili.com/video/{video['bvid']}"
-                            })
+                            # 时长字符串在此解析为秒数，之后不再转换
+                            all_videos.append(VideoRecord(video['bvid'], video['title'], video['length'],
+                                                          video['created'], video['play']))
                     
                     if should_exit:
                         break
+
+                    # 本页已与目录覆盖区间衔接，且覆盖区间延伸到开始时间之前：更早的视频无需再翻页
+                    if coverage and not seeked and coverage.covered_from <= start_ts and \
+                       oldest_seen <= coverage.covered_to:
+                        logger.info("第 %s 页已与本地目录衔接，其余视频从目录读取", page)
+                        joined_catalog = True
+                        break
+
+                    # 第1页全部晚于结束时间：二分查找结束时间所在的页，跳过中间的页
+                    if page == 1 and end_ts is not None and page_oldest > end_ts:
+                        target = await self._seek_up_page(session, up_id, mixin_key, data, end_ts, probed_pages)
+                        if target is None:
+                            logger.info("没有早于结束时间 %s 的视频", end_time)
+                            break
+                        if target > 2:
+                            logger.info("二分查找定位到第 %s 页，跳过第 2-%s 页", target, target - 1)
+                            seeked = True
+                            page = target
+                            await asyncio.sleep(self.page_delay)
+                            continue
                         
-                    logger.info(f"累计 {len(all_videos)} 个符合条件的视频")
+                    logger.info("累计 %s 个符合条件的视频", len(all_videos))
                     page += 1
                     
                     # 增加延时以避免触发风控
-                    await asyncio.sleep(3.0)  # 增加延时
+                    await asyncio.sleep(self.page_delay)  # 增加延时
                     
+                except RequestError as e:
+                    # 已按重试策略重试过，仍失败则整体失败（未登录、签名错误、持续风控等）
+                    logger.error("获取第 %s 页视频列表失败: %s", page, e)
+                    return None  # 返回None表示错误
                 except Exception as e:
-                    logger.error(f"获取第 {page} 页视频列表时出错: {e}")
+                    logger.error("获取第 %s 页视频列表时出错: %s", page, e)
                     import traceback
-                    logger.error(f"详细错误信息: {traceback.format_exc()}")
+                    logger.error("详细错误信息: %s", traceback.format_exc())
                     break
+
+        if self.catalog and oldest_seen is not None and not seeked:
+            # 从第1页连续翻到 oldest_seen，期间的视频都已写入目录
+            covered_from = 0 if exhausted else oldest_seen
+            if coverage and (joined_catalog or oldest_seen <= coverage.covered_to):
+                covered_from = min(covered_from, coverage.covered_from)
+            # 翻过的区间内目录中有、本次却没有出现的视频已被删除；与 oldest_seen 同一秒的视频可能在下一页，不处理
+            self.catalog.replace_source(source, seen_bvids, covered_from, walk_started,
+                                        newer_than=None if exhausted else oldest_seen)
+            if joined_catalog:
+                all_videos = self.catalog.query(source, start_ts, end_ts)
         
-        logger.info(f"总共获取到 {len(all_videos)} 个符合条件的视频")
+        logger.info("总共获取到 %s 个符合条件的视频", len(all_videos))
         return all_videos
 
+    async def get_latest_videos(self, up_id, list_id=None, validators=None, page_size=30):
+        """
+        只请求第1页，用于轮询新投稿（不翻页、不按时间过滤、不写入本地目录）
+
+        :param up_id: UP主ID
+        :param list_id: 合集ID，为空时请求UP主投稿列表
+        :param validators: 条件请求的校验值字典，见 _get_json
+        :param page_size: 第1页的大小
+        :return: (视频列表, 总数)；服务端返回304（未变化）时视频列表为None
+        :raises RequestError: 请求失败
+        """
+        if self.session is None:
+            raise ValueError("轮询新投稿需要传入会话")
+        session = self.session
+        if list_id:
+            data = await self._get_collection_page(session, up_id, list_id, 1, page_size, validators=validators)
+            if data is None:
+                return None, None
+            videos_info = (data.get('data') or {}).get('archives') or []
+            total = ((data.get('data') or {}).get('page') or {}).get('total')
+            return [VideoRecord(video['bvid'], video['title'], video['duration'], video['pubdate'],
+                                video['stat']['view'])
+                    for video in videos_info if video.get('pubdate')], total
+
+        mixin_key = await self.get_mixin_key(session)
+        data = await self._get_up_page(session, up_id, 1, mixin_key, page_size=page_size, validators=validators)
+        if data is None:
+            return None, None
+        videos_info = data['data']['list']['vlist'] or []
+        total = (data['data'].get('page') or {}).get('count')
+        return [VideoRecord(video['bvid'], video['title'], video['length'], video['created'], video.get('play'))
+                for video in videos_info], total
+
+    async def _get_up_page(self, session, up_id, page, mixin_key, page_size=30, validators=None):
+        """请求UP主投稿列表的一页（WBI签名）"""
+        # 计算WBI签名参数
+        # 1. 先准备所有基础参数，必须先放入wts
+        wts = int(time.time())
+        params = {
+            'mid': up_id,
+            'order': 'pubdate',  # 按发布时间排序
+            'order_avoided': '1',
+            'platform': 'web',
+            'pn': page,
+            'ps': page_size,
+            'wts': wts  # 必须先放入wts
+        }
+
+        # 2. 计算签名（此时params已包含wts）
+        sign = self.calculate_sign(params, mixin_key)
+        params['w_rid'] = sign  # 写入签名
+
+        logger.debug("请求参数: %s", params)
+
+        # 3. 限制频率并请求（限流在每次重试前进行）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("请求URL: %s/x/space/wbi/arc/search?%s", self.api_base, urllib.parse.urlencode(params))
+
+        data = await self._get_json(session, 'list_page', f'{self.api_base}/x/space/wbi/arc/search',
+                                    params=params, limited=True, validators=validators)
+        logger.debug("API响应数据: %s", data)
+        return data
+
+    async def _seek_up_page(self, session, up_id, mixin_key, first_page, end_ts, probed_pages):
+        """
+        按发布时间二分查找第一个包含不晚于 end_ts 的视频的页
+
+        :param first_page: 第1页的响应，用其 data.page.count 计算总页数
+        :param end_ts: 结束时间戳
+        :param probed_pages: 探测过的页写入此字典，供之后顺序翻页复用
+        :return: 页码；所有视频都晚于 end_ts 时返回None
+        """
+        page_info = first_page['data'].get('page') or {}
+        count = page_info.get('count')
+        page_size = page_info.get('ps') or 30
+        if not count:
+            # 没有总数时无法二分，从第2页开始顺序翻页
+            return 2
+
+        low, high = 2, -(-count // page_size)
+        found = None
+        while low <= high:
+            mid = (low + high) // 2
+            await asyncio.sleep(self.page_delay)
+            logger.info("二分查找：探测第 %s 页", mid)
+            data = await self._get_up_page(session, up_id, mid, mixin_key)
+            videos_info = data['data']['list']['vlist']
+            if not videos_info:
+                # 总数在翻页期间发生了变化，按超出末页处理
+                high = mid - 1
+                continue
+            probed_pages[mid] = data
+            if min(video['created'] for video in videos_info) <= end_ts:
+                found = mid
+                high = mid - 1
+            else:
+                low = mid + 1
+        return found
+
     async def get_videos_by_collection(self, up_id, collection_id, start_time=None, end_time=None):
         """
         根据UP主ID和合集ID获取视频合集列表
 
+        先请求第1页，从 data.page.total 得到总数后并发请求其余各页（仍受限流器约束），
+        每页到达时即按时间范围过滤，最终按页码顺序拼接结果
+
         :param up_id: UP主ID
         :param collection_id: 合集ID
         :param start_time: 开始时间过滤
@@ -313,163 +516,202 @@ class VideoIndexer:
         if not up_id or not collection_id:
             raise ValueError("UP主ID和合集ID不能为空")
 
-        logger.info(f"开始获取UP主 {up_id} 的合集 {collection_id} 的视频列表")
-        logger.info(f"时间范围: {start_time} 到 {end_time}")
+        logger.info("开始获取UP主 %s 的合集 %s 的视频列表", up_id, collection_id)
+        logger.info("时间范围: %s 到 %s", start_time, end_time)
 
         # 检查Cookie是否设置
         if not self.headers['Cookie'] or self.headers['Cookie'] == "":
             logger.error("Cookie未设置，请在配置中填入有效的Cookie")
             return []
 
-        all_videos = []
-        page = 1
-        consecutive_empty_pages = 0  # 连续空页面计数器
-        MAX_EMPTY_PAGES = 1  # 最多允许连续1页没有符合条件的视频（合集按时间排序）
-
-        # 创建session
-        async with aiohttp.ClientSession(headers=self.headers) as session:
-            while True:
-                # 计算WBI签名参数
-                # 视频合集使用series_id，不需要WBI签名
-                params = {
-                    'mid': up_id,
-                    'series_id': collection_id,
-                    'pn': page,
-                    'ps': 30
-                }
-
-                logger.info(f"请求参数: {params}")
-
-                # 限制频率并请求
-                await self.limiter.acquire()
-
-                try:
-                    logger.info(f"正在获取第 {page} 页合集视频列表...")
-
-                    # 视频合集API（不需要WBI签名）
-                    api_url = 'https://api.bilibili.com/x/series/archives'
-                    logger.info(f"请求URL: {api_url}?{urllib.parse.urlencode(params)}")
-
-                    resp = await session.get(api_url, params=params)
-                    logger.info(f"API响应状态: {resp.status}")
-
-                    # 检查响应状态
-                    if resp.status != 200:
-                        logger.error(f"API请求失败，状态码: {resp.status}")
-                        return None
-
-                    data = await resp.json()
-                    logger.debug(f"API响应数据: {data}")
+        pages = {}  # 页码 -> 该页符合条件的视频
+        page_size = 30
 
-                    if data['code'] == -101:
-                        logger.error("API请求失败: 账号未登录，请检查Cookie是否有效")
-                        return None
-                    elif data['code'] == -352:
-                        logger.error("API请求失败: 风控校验失败，请降低请求频率或检查Cookie")
-                        return None
-                    elif data['code'] != 0:
-                        logger.error(f"API请求失败: {data['message']}")
-                        return None
-
-                    # 合集API的数据结构不同
-                    if 'data' not in data or 'archives' not in data['data']:
-                        logger.info("没有更多视频了")
-                        break
+        # 本地目录：合集总数未变且第1页的视频都已登记时，直接从目录读取
+        source = series_source(collection_id)
+        coverage = self.catalog.get_coverage(source) if self.catalog else None
+        walk_started = int(time.time())
+        total = None
+        exhausted = False
+        seen_bvids = set()  # 本次翻页出现的全部视频，完整翻完时用于移除目录中已移出合集的视频
 
-                    videos_info = data['data']['archives']
-
-                    if not videos_info:
-                        logger.info("没有更多视频了")
-                        break
-
-                    logger.info(f"第 {page} 页获取到 {len(videos_info)} 个视频")
+        # 优先复用注入的常驻会话
+        async with self._listing_session() as session:
+            try:
+                logger.info("正在获取第 1 页合集视频列表...")
+                data = await self._get_collection_page(session, up_id, collection_id, 1, page_size)
+                videos_info = (data.get('data') or {}).get('archives') or []
+                total = ((data.get('data') or {}).get('page') or {}).get('total')
+
+                if self.catalog and videos_info and self._catalog_is_fresh(source, coverage, total, videos_info):
+                    logger.info("合集总数未变化（%s 个），直接从本地目录读取", total)
+                    start_ts = int(start_time.timestamp()) if start_time else None
+                    end_ts = int(end_time.timestamp()) if end_time else None
+                    all_videos = self.catalog.query(source, start_ts, end_ts)
+                    logger.info("总共获取到 %s 个符合条件的视频", len(all_videos))
+                    return all_videos
+
+                pages[1] = self._filter_collection_page(source, 1, videos_info, start_time, end_time, seen_bvids)
+
+                if not videos_info:
+                    logger.info("没有更多视频了")
+                    exhausted = True
+                elif total is not None:
+                    # 总数已知：其余各页并发请求，由限流器控制实际发送速率
+                    page_count = max(1, -(-total // page_size))
+                    logger.info("合集共 %s 个视频，%s 页，并发获取其余页", total, page_count)
+                    exhausted = await self._fetch_collection_pages_concurrently(
+                        session, up_id, collection_id, range(2, page_count + 1), page_size,
+                        source, start_time, end_time, pages, seen_bvids)
+                else:
+                    # 响应中没有总数：退回逐页请求
+                    logger.info("响应中没有合集总数，逐页获取")
+                    exhausted = await self._fetch_collection_pages_sequentially(
+                        session, up_id, collection_id, page_size, source, start_time, end_time, pages, seen_bvids)
+
+            except RequestError as e:
+                logger.error("获取合集视频列表失败: %s", e)
+                return None
+            except Exception as e:
+                logger.error("获取合集视频列表时出错: %s", e)
+                import traceback
+                logger.error("详细错误信息: %s", traceback.format_exc())
 
-                    # 记录这一页添加了多少视频
-                    videos_added_this_page = 0
+        all_videos = [video for page in sorted(pages) for video in pages[page]]
 
-                    # 合集列表按收藏顺序排列，不是按发布时间排列，所以不能使用Early Exit
-                    # 需要遍历所有视频并检查时间范围
-                    for video in videos_info:
-                        # 合集API使用pubdate字段（秒级时间戳）
-                        video_timestamp = video.get('pubdate')
+        # 只有完整翻完合集时才记录覆盖信息，同时移除已不在合集中的视频，使下次的数量比较重新成立
+        if self.catalog and exhausted:
+            self.catalog.replace_source(source, seen_bvids, 0, walk_started, total)
 
-                        if not video_timestamp:
-                            logger.error(f"视频数据中没有时间戳字段: {video.keys()}")
-                            continue
+        logger.info("总共获取到 %s 个符合条件的视频", len(all_videos))
+        return all_videos
 
-                        video_datetime = datetime.fromtimestamp(video_timestamp)
+    async def _get_collection_page(self, session, up_id, collection_id, page, page_size, validators=None):
+        """请求合集的一页（视频合集使用series_id，不需要WBI签名）"""
+        params = {
+            'mid': up_id,
+            'series_id': collection_id,
+            'pn': page,
+            'ps': page_size
+        }
+        api_url = f'{self.api_base}/x/series/archives'
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("请求URL: %s?%s", api_url, urllib.parse.urlencode(params))
 
-                        logger.info(f"视频: {video['bvid']}, 发布时间: {video_datetime}, 标题: {video['title']}")
+        data = await self._get_json(session, 'collection_page', api_url, params=params, limited=True,
+                                    validators=validators)
+        logger.debug("API响应数据: %s", data)
+        return data
 
-                        # 检查是否在时间范围内
-                        in_time_range = True
-                        if start_time and video_datetime < start_time:
-                            logger.info(f"  -> 过滤: 发布时间 {video_datetime} 早于开始时间 {start_time}")
-                            in_time_range = False
-                        if end_time and video_datetime > end_time:
-                            logger.info(f"  -> 过滤: 发布时间 {video_datetime} 晚于结束时间 {end_time}")
-                            in_time_range = False
-
-                        if in_time_range:
-                            # 合集API中的duration是秒数，不是字符串
-                            duration_seconds = video['duration']
-                            # 将秒数转换为分:秒格式
-                            minutes = duration_seconds // 60
-                            seconds = duration_seconds % 60
-                            duration_str = f"{minutes}:{seconds:02d}"
-
-                            all_videos.append({
-                                'bvid': video['bvid'],
-                                'title': video['title'],
-                                'duration': duration_str,
-                                'created': video_timestamp,
-                                'created_str': video_datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                                'play': video['stat']['view'],
-                                'video_url': f"https://www.bilibili.com/video/{video['bvid']}"
-                            })
-                            logger.info(f"  -> 添加到列表")
-                            videos_added_this_page += 1
-
-                    # 检查这一页是否有符合条件的视频
-                    if videos_added_this_page == 0:
-                        consecutive_empty_pages += 1
-                        logger.info(f"本页没有符合条件的视频，连续空页面数: {consecutive_empty_pages}/{MAX_EMPTY_PAGES}")
-                        if consecutive_empty_pages >= MAX_EMPTY_PAGES:
-                            logger.info(f"连续{MAX_EMPTY_PAGES}页没有符合条件的视频，停止获取")
-                            break
-                    else:
-                        consecutive_empty_pages = 0  # 重置计数器
+    async def _fetch_collection_pages_concurrently(self, session, up_id, collection_id, page_numbers, page_size,
+                                                   source, start_time, end_time, pages, seen):
+        """
+        并发请求合集的多页，结果按到达顺序过滤后写入 pages
 
-                    logger.info(f"累计 {len(all_videos)} 个符合条件的视频")
-                    page += 1
+        :return: 是否全部成功；任一页请求失败时取消其余请求并抛出异常
+        """
+        async def fetch(page):
+            data = await self._get_collection_page(session, up_id, collection_id, page, page_size)
+            return page, (data.get('data') or {}).get('archives') or []
 
-                    # 增加延时以避免触发风控
-                    await asyncio.sleep(3.0)
+        tasks = [asyncio.create_task(fetch(page)) for page in page_numbers]
+        try:
+            for future in asyncio.as_completed(tasks):
+                page, videos_info = await future
+                pages[page] = self._filter_collection_page(source, page, videos_info, start_time, end_time, seen)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return True
+
+    async def _fetch_collection_pages_sequentially(self, session, up_id, collection_id, page_size,
+                                                   source, start_time, end_time, pages, seen):
+        """逐页请求合集直到返回空页，返回是否翻到了最后一页"""
+        page = 2
+        while True:
+            logger.info("正在获取第 %s 页合集视频列表...", page)
+            data = await self._get_collection_page(session, up_id, collection_id, page, page_size)
+            videos_info = (data.get('data') or {}).get('archives') or []
+            if not videos_info:
+                logger.info("没有更多视频了")
+                return True
+            pages[page] = self._filter_collection_page(source, page, videos_info, start_time, end_time, seen)
+            page += 1
+            # 增加延时以避免触发风控
+            await asyncio.sleep(self.page_delay)
+
+    def _filter_collection_page(self, source, page, videos_info, start_time, end_time, seen=None):
+        """
+        按时间范围过滤合集的一页，并写入本地目录
 
-                except Exception as e:
-                    logger.error(f"获取第 {page} 页合集视频列表时出错: {e}")
-                    import traceback
-                    logger.error(f"详细错误信息: {traceback.format_exc()}")
-                    break
+        合集列表按收藏顺序排列，不是按发布时间排列，所以不能使用Early Exit，需要检查每个视频
 
-        logger.info(f"总共获取到 {len(all_videos)} 个符合条件的视频")
-        return all_videos
+        :param seen: 可选的集合，收集本页出现的全部BV号（不论是否在时间范围内）
+        :return: 该页符合条件的视频列表
+        """
+        if not videos_info:
+            return []
+        logger.info("第 %s 页获取到 %s 个视频", page, len(videos_info))
+        if seen is not None:
+            seen.update(video['bvid'] for video in videos_info if video.get('pubdate'))
+
+        if self.catalog:
+            self.catalog.upsert_videos(source, [{
+                'bvid': video['bvid'],
+                'title': video['title'],
+                'duration': video['duration'],
+                'created': video['pubdate'],
+                'play': video['stat']['view']
+            } for video in videos_info if video.get('pubdate')])
+
+        videos = []
+        for video in videos_info:
+            # 合集API使用pubdate字段（秒级时间戳）
+            video_timestamp = video.get('pubdate')
+
+            if not video_timestamp:
+                logger.error("视频数据中没有时间戳字段: %s", video.keys())
+                continue
+
+            video_datetime = datetime.fromtimestamp(video_timestamp)
+
+            logger.debug("视频: %s, 发布时间: %s, 标题: %s", video['bvid'], video_datetime, video['title'])
+
+            # 检查是否在时间范围内
+            if start_time and video_datetime < start_time:
+                logger.debug("  -> 过滤: 发布时间 %s 早于开始时间 %s", video_datetime, start_time)
+                continue
+            if end_time and video_datetime > end_time:
+                logger.debug("  -> 过滤: 发布时间 %s 晚于结束时间 %s", video_datetime, end_time)
+                continue
+
+            # 合集API中的duration已是秒数
+            videos.append(VideoRecord(video['bvid'], video['title'], video['duration'], video_timestamp,
+                                      video['stat']['view']))
+            logger.debug("  -> 添加到列表")
+        return videos
+
+    def _catalog_is_fresh(self, source, coverage, total, first_page):
+        """合集的目录是否仍然新鲜：总数与上次完整翻页时一致，且第1页的视频都已登记"""
+        if coverage is None or total is None or coverage.total != total:
+            return False
+        if self.catalog.count(source) != total:
+            return False
+        bvids = {video['bvid'] for video in first_page}
+        return self.catalog.contains(source, bvids) == bvids
 
     async def get_cid_by_bvid(self, session, bvid):
         """
         通过BVID获取CID
         """
         try:
-            logger.info(f"正在获取视频 {bvid} 的CID...")
+            logger.debug("正在获取视频 %s 的CID...", bvid)
             params = {
                 'bvid': bvid
             }
-            resp = await session.get('https://api.bilibili.com/x/player/pagelist', params=params)
-            data = await resp.json()
-            
-            if data['code'] != 0:
-                logger.error(f"获取CID失败: {data['message']}")
-                return None
+            data = await self._get_json(session, 'pagelist', f'{self.api_base}/x/player/pagelist', params=params)
             
             if 'data' not in data or not data['data']:
                 logger.error("获取CID返回数据格式错误")
@@ -478,10 +720,10 @@ class VideoIndexer:
             # 获取第一个视频的CID
             first_video = data['data'][0]
             cid = first_video['cid']
-            logger.info(f"获取到视频 {bvid} 的CID: {cid}")
+            logger.debug("获取到视频 %s 的CID: %s", bvid, cid)
             return cid
         except Exception as e:
-            logger.error(f"获取CID时出错: {e}")
+            logger.error("获取CID时出错: %s", e)
             return None
 
     def _convert_duration_to_seconds(self, duration_str):
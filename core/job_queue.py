@@ -0,0 +1,272 @@
+"""
+分布式任务队列模块
+列表阶段把 (视频, 采样计划) 写入SQLite任务队列，多个 worker 进程以租约方式领取任务：
+租约在可见性超时内未续期或未完成时，任务自动回到队列。
+队列库中同时保存全局请求预算，所有 worker 共同遵守同一个QPS上限。
+
+默认使用 WAL 日志，只适用于同一台机器上的进程（WAL 依赖本机共享内存）；多台机器通过网络文件系统共享队列文件时，
+所有进程都需以 shared_storage=True 打开，改用回滚日志（DELETE），并要求该文件系统支持文件锁。
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF, JOB_QUEUE_SHARED_STORAGE
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bvid TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    not_before REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (bvid, payload)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, lease_expires);
+CREATE TABLE IF NOT EXISTS rate_budget (
+    name TEXT PRIMARY KEY,
+    next_slot REAL NOT NULL
+);
+"""
+
+# 任务状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_worker_id():
+    """主机名 + 进程号，便于在队列中看出租约属于哪个 worker"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class Job:
+    """一个已领取的任务"""
+
+    __slots__ = ('id', 'bvid', 'payload', 'attempts')
+
+    def __init__(self, job_id, bvid, payload, attempts):
+        self.id = job_id
+        self.bvid = bvid
+        self.payload = payload
+        self.attempts = attempts
+
+
+class JobQueue:
+    """
+    基于SQLite的任务队列（写操作使用 BEGIN IMMEDIATE 保证多进程互斥）
+
+    默认 WAL 模式，只支持同一台机器上的多个进程；多台机器共享时使用 shared_storage=True
+    """
+
+    def __init__(self, path, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_backoff=JOB_RETRY_BACKOFF, shared_storage=JOB_QUEUE_SHARED_STORAGE):
+        """
+        :param path: 队列数据库路径
+        :param lease_seconds: 租约（可见性超时）秒数，超时未完成的任务会被重新领取
+        :param max_attempts: 单个任务最多尝试次数，超过后标记为失败
+        :param retry_backoff: 失败任务重新入队后的最短等待秒数，每多失败一次翻倍
+        :param shared_storage: 队列文件是否由多台机器通过网络文件系统共享；为True时使用回滚日志而不是 WAL
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        # 连接在事件循环线程与预约请求预算的线程之间共享，同一时间只能有一个事务
+        self._lock = threading.Lock()
+        if shared_storage:
+            self.conn.execute('PRAGMA journal_mode=DELETE')
+            self.conn.execute('PRAGMA synchronous=FULL')
+        else:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """为旧版本创建的队列库补充新增的列"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(jobs)')}
+        if 'not_before' not in columns:
+            try:
+                self.conn.execute('ALTER TABLE jobs ADD COLUMN not_before REAL')
+            except sqlite3.OperationalError:
+                # 其他 worker 已经补充过
+                pass
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, func):
+        """在写事务中执行 func(conn)"""
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self.conn)
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            return result
+
+    def enqueue(self, jobs):
+        """
+        批量写入任务，相同 (bvid, payload) 的任务只保留一个
+
+        :param jobs: (bvid, payload字典) 列表
+        :return: 新增的任务数
+        """
+        now = time.time()
+        rows = [(bvid, json.dumps(payload, ensure_ascii=False, sort_keys=True), now, now) for bvid, payload in jobs]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO jobs (bvid, payload, created_at, updated_at) VALUES (?, ?, ?, ?)', rows)
+            return conn.total_changes - before
+
+        return self._write(insert)
+
+    def lease(self, worker_id):
+        """
+        领取一个待处理任务；租约已过期的任务视为待处理（自动重新入队），失败后仍在退避期内的任务暂不领取
+
+        :return: Job，没有可领取的任务时返回None
+        """
+        now = time.time()
+
+        def take(conn):
+            # 租约过期且已用尽尝试次数的任务直接标记失败
+            conn.execute(
+                "UPDATE jobs SET status = ?, last_error = COALESCE(last_error, '租约超时'), updated_at = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, now, LEASED, now, self.max_attempts))
+            row = conn.execute(
+                'SELECT id, bvid, payload, attempts FROM jobs '
+                'WHERE (status = ? AND (not_before IS NULL OR not_before <= ?)) OR (status = ? AND lease_expires < ?) '
+                'ORDER BY id LIMIT 1',
+                (PENDING, now, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            job_id, bvid, payload, attempts = row
+            conn.execute(
+                'UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, '
+                'updated_at = ? WHERE id = ?',
+                (LEASED, worker_id, now + self.lease_seconds, now, job_id))
+            return Job(job_id, bvid, json.loads(payload), attempts + 1)
+
+        return self._write(take)
+
+    def retry_delay(self):
+        """
+        距最早一个退避中的任务可以领取还有多少秒
+
+        :return: 秒数；没有退避中的待处理任务时返回None
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT MIN(not_before) FROM jobs WHERE status = ? AND not_before IS NOT NULL',
+                                    (PENDING,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def renew(self, job, worker_id):
+        """续租，返回租约是否仍属于该 worker"""
+        now = time.time()
+
+        def extend(conn):
+            cursor = conn.execute(
+                'UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?',
+                (now + self.lease_seconds, now, job.id, LEASED, worker_id))
+            return cursor.rowcount == 1
+
+        return self._write(extend)
+
+    def complete(self, job, worker_id, success, error=None):
+        """
+        结束一个任务：成功标记为完成；失败时未用尽尝试次数则退避一段时间后重新入队，否则标记为失败
+
+        :return: 任务的新状态；租约已被其他 worker 接管时返回None
+        """
+        now = time.time()
+        not_before = None
+        if success:
+            status = DONE
+        elif job.attempts < self.max_attempts:
+            # 立即重试多半会遇到同样的限流或临时故障，按尝试次数指数退避
+            status = PENDING
+            not_before = now + self.retry_backoff * 2 ** (job.attempts - 1)
+        else:
+            status = FAILED
+
+        def finish(conn):
+            return conn.execute(
+                'UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL, not_before = ?, '
+                'last_error = ?, updated_at = ? WHERE id = ? AND lease_owner = ?',
+                (status, not_before, error, now, job.id, worker_id)).rowcount == 1
+
+        return status if self._write(finish) else None
+
+    def stats(self):
+        """各状态的任务数"""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        for status, count in rows:
+            counts[status] = count
+        return counts
+
+    def reserve_slot(self, name, interval):
+        """
+        在全局请求预算中预约下一个发送时间
+
+        :param name: 预算名称
+        :param interval: 相邻两次请求的最小间隔（秒）
+        :return: 预约到的发送时间（time.time() 时间轴）
+        """
+        now = time.time()
+
+        def reserve(conn):
+            row = conn.execute('SELECT next_slot FROM rate_budget WHERE name = ?', (name,)).fetchone()
+            slot = max(now, row[0]) if row else now
+            conn.execute('INSERT OR REPLACE INTO rate_budget (name, next_slot) VALUES (?, ?)',
+                         (name, slot + interval))
+            return slot
+
+        return self._write(reserve)
+
+
+class SharedRateLimiter:
+    """
+    所有 worker 共享的请求限制器，接口与 RequestLimiter 一致
+
+    预约在线程池中执行：BEGIN IMMEDIATE 在其他 worker 持有写锁时会等待，不能阻塞事件循环
+    """
+
+    def __init__(self, queue, qps, name='global'):
+        self.queue = queue
+        self.qps = qps
+        self.interval = 1.0 / qps
+        self.name = name
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        slot = await loop.run_in_executor(None, self.queue.reserve_slot, self.name, self.interval)
+        delay = slot - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,115 @@
+"""
+日志工具模块
+- 通过 QueueHandler/QueueListener 把文件与控制台写入移出事件循环线程
+- 可选的结构化（JSON行）日志格式
+- 对逐条目的高频日志进行采样，避免大批量运行时日志占用CPU
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+
+class StructuredFormatter(logging.Formatter):
+    """JSON行格式：每条日志输出为一个JSON对象，附带通过 extra 传入的字段"""
+
+    # LogRecord 的内置属性，其余属性视为 extra 字段
+    _RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level='INFO', log_file='bb_capture.log', structured=False):
+    """
+    配置根日志器：调用线程只负责把记录放入队列，由后台监听线程完成格式化与写入
+
+    :param level: 日志级别名称
+    :param log_file: 日志文件路径，为空时只输出到控制台
+    :param structured: 是否使用JSON行格式
+    :return: QueueListener，进程退出时自动停止
+    """
+    if structured:
+        formatter = StructuredFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class SampledLogger:
+    """
+    高频日志采样器
+
+    同一 key 的日志只输出第1条及之后每 every 条中的1条，或距上次输出超过 interval 秒时输出，
+    并在消息后附带期间被省略的条数。级别未开启时不做任何格式化。
+    """
+
+    def __init__(self, logger, every=100, interval=5.0):
+        self.logger = logger
+        self.every = max(1, every)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._state = {}  # key -> [总次数, 上次输出时的次数, 上次输出时间]
+
+    def log(self, level, key, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = [0, 0, 0.0]
+            state[0] += 1
+            count, last_count, last_time = state
+            if count != 1 and count % self.every and now - last_time < self.interval:
+                return
+            skipped = count - last_count - 1
+            state[1], state[2] = count, now
+        if skipped > 0:
+            self.logger.log(level, msg + ' (已省略 %d 条同类日志，累计 %d 条)', *args, skipped, count)
+        else:
+            self.logger.log(level, msg, *args)
+
+    def info(self, key, msg, *args):
+        self.log(logging.INFO, key, msg, *args)
+
+    def debug(self, key, msg, *args):
+        self.log(logging.DEBUG, key, msg, *args)
+
+    def counts(self):
+        """返回各 key 的累计次数，可用于运行结束时输出汇总"""
+        with self._lock:
+            return {key: state[0] for key, state in self._state.items()}
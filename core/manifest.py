@@ -0,0 +1,177 @@
+"""
+元数据清单模块
+每写出一张缩略图就追加一行清单：视频信息（bvid、标题、发布时间、播放量）、采样时间、
+所在瓦片图序号、物理裁剪框与输出路径，供下游把缩略图与视频元数据关联。
+清单边生成边写入，不在内存中累积：JSONL 与 CSV 追加到输出目录下的 manifest.jsonl / manifest.csv，
+安装了 pyarrow 时还可以输出 Parquet（manifest.parquet/ 目录下每次运行一个文件，按行组分批写入）。
+"""
+import csv
+import json
+import logging
+import os
+import time
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+from config import MANIFEST_FORMATS, MANIFEST_PARQUET_ROW_GROUP
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest'
+
+# 清单列（顺序即 CSV 列顺序）
+FIELDS = ('bvid', 'title', 'created', 'play', 'sample_time', 'sheet_index',
+          'crop_left', 'crop_top', 'crop_right', 'crop_bottom', 'output_path')
+
+SUPPORTED_FORMATS = ('jsonl', 'csv', 'parquet')
+
+
+def manifest_row(video, time_in_seconds, crop, output_path):
+    """
+    生成一行清单
+
+    :param video: VideoRecord 或视频字典
+    :param time_in_seconds: 采样时间（秒）
+    :param crop: 已完成裁剪的 TileCrop（box 为物理像素裁剪框）
+    :param output_path: 缩略图路径
+    """
+    box = crop.box or (None, None, None, None)
+    return {
+        'bvid': video['bvid'],
+        'title': video['title'],
+        'created': video['created'],
+        'play': video.get('play') or 0,
+        'sample_time': round(time_in_seconds, 3),
+        'sheet_index': crop.sheet_index,
+        'crop_left': box[0],
+        'crop_top': box[1],
+        'crop_right': box[2],
+        'crop_bottom': box[3],
+        'output_path': output_path,
+    }
+
+
+class _JsonlSink:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, f'{MANIFEST_NAME}.jsonl')
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, row):
+        self._file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _CsvSink:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, f'{MANIFEST_NAME}.csv')
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        # utf-8-sig 写入BOM，Excel 打开中文标题不乱码；追加时不再重复写BOM
+        self._file = open(self.path, 'a', encoding='utf-8-sig' if is_new else 'utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        if is_new:
+            self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetSink:
+    """Parquet 不支持追加，每次运行写一个文件；行缓存攒满一个行组就写出"""
+
+    def __init__(self, directory, row_group_size):
+        dataset_dir = os.path.join(directory, f'{MANIFEST_NAME}.parquet')
+        os.makedirs(dataset_dir, exist_ok=True)
+        self.path = os.path.join(dataset_dir, time.strftime('part-%Y%m%d-%H%M%S') + f'-{os.getpid()}.parquet')
+        self.row_group_size = max(1, row_group_size)
+        self._schema = pyarrow.schema([
+            ('bvid', pyarrow.string()),
+            ('title', pyarrow.string()),
+            ('created', pyarrow.int64()),
+            ('play', pyarrow.int64()),
+            ('sample_time', pyarrow.float64()),
+            ('sheet_index', pyarrow.int32()),
+            ('crop_left', pyarrow.int32()),
+            ('crop_top', pyarrow.int32()),
+            ('crop_right', pyarrow.int32()),
+            ('crop_bottom', pyarrow.int32()),
+            ('output_path', pyarrow.string()),
+        ])
+        self._writer = parquet.ParquetWriter(self.path, self._schema)
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._writer.write_table(pyarrow.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+
+
+class ManifestWriter:
+    """按行追加的清单写入器，可同时输出多种格式（只在事件循环线程中调用）"""
+
+    def __init__(self, directory, formats=MANIFEST_FORMATS, row_group_size=MANIFEST_PARQUET_ROW_GROUP):
+        """
+        :param directory: 清单所在目录（通常为缩略图输出目录）
+        :param formats: 输出格式，可选 jsonl、csv、parquet；未安装 pyarrow 时跳过 parquet
+        :param row_group_size: Parquet 每个行组的行数，也是内存中最多缓存的行数
+        """
+        self.sinks = []
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+        for fmt in formats:
+            fmt = fmt.lower()
+            if fmt == 'jsonl':
+                self.sinks.append(_JsonlSink(directory))
+            elif fmt == 'csv':
+                self.sinks.append(_CsvSink(directory))
+            elif fmt == 'parquet':
+                if pyarrow is None:
+                    logger.warning("未安装 pyarrow，跳过 Parquet 清单")
+                    continue
+                self.sinks.append(_ParquetSink(directory, row_group_size))
+            else:
+                logger.warning("不支持的清单格式: %s（可选 %s）", fmt, ', '.join(SUPPORTED_FORMATS))
+
+    @property
+    def paths(self):
+        return [sink.path for sink in self.sinks]
+
+    def write(self, row):
+        for sink in self.sinks:
+            sink.write(row)
+        self.rows += 1
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                logger.error("关闭清单 %s 失败: %s", sink.path, e)
+        self.sinks = []
@@ -0,0 +1,161 @@
+"""
+内存预算模块
+对在途的瓦片图原始字节与解码后的图像做字节级准入控制：下载前按估算值预约内存，
+下载和解码后按实际大小调整，处理结束后归还。总预约量达到上限时，新的下载在此排队（先到先得），
+因此峰值内存只取决于预算上限，与并发数无关。
+
+实际大小超过估算值时，增大预约（grow）同样要等待预算，并优先于新的下载放行；
+所有占用额度的预约都在等待增大时（没有谁能再归还额度），放行最早的一个，避免互相等待。
+"""
+import asyncio
+import logging
+from collections import deque
+
+from config import MEMORY_BUDGET_MB, MEMORY_RESERVE_ESTIMATE_MB
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class Reservation:
+    """一次内存预约，大小可随处理进度调整"""
+
+    __slots__ = ('budget', 'size')
+
+    def __init__(self, budget, size):
+        self.budget = budget
+        self.size = size
+
+    def resize(self, size):
+        """缩小为 size 字节并唤醒排队者（增大需使用 grow 等待预算）"""
+        if size > self.size:
+            raise ValueError("增大预约需使用 grow()")
+        self.budget._adjust(size - self.size)
+        self.size = size
+
+    async def grow(self, size):
+        """调整为实际大小；大于当前预约时等待预算，不大于时立即缩小"""
+        if size <= self.size:
+            self.resize(size)
+            return
+        await self.budget._grow(self, size - self.size)
+        self.size = size
+
+    def release(self):
+        if self.size:
+            self.budget._adjust(-self.size)
+            self.size = 0
+
+
+class MemoryBudget:
+    """字节预算准入控制器（只在事件循环线程中调用）"""
+
+    def __init__(self, limit_bytes=MEMORY_BUDGET_MB * MB, estimate_bytes=MEMORY_RESERVE_ESTIMATE_MB * MB, metrics=None):
+        """
+        :param limit_bytes: 预算上限（字节）
+        :param estimate_bytes: 尚不知道实际大小时的初始预约值，之后按观测到的实际大小滑动调整
+        :param metrics: 可选的指标注册表，写入 memory_in_use / memory_peak gauge
+        """
+        self.limit = limit_bytes
+        self.estimate = estimate_bytes
+        self.metrics = metrics
+        self.in_use = 0
+        self.peak = 0
+        self._waiters = deque()
+        self._growers = deque()  # 等待增大的预约，优先于新预约放行
+        self._growing = 0  # 等待增大的预约当前持有的字节数
+
+    async def acquire(self, size=None):
+        """
+        预约 size 字节（默认使用当前估算值），预算不足时排队等待
+
+        单次预约超过上限时按上限计算，保证在预算空闲时总能放行
+        """
+        size = min(self.estimate if size is None else size, self.limit)
+        if self._waiters or self._growers or self.in_use + size > self.limit:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((future, size))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # 已被放行但调用方被取消：归还刚分配的额度
+                    self._adjust(-size)
+                else:
+                    try:
+                        self._waiters.remove((future, size))
+                    except ValueError:
+                        pass
+                    self._wake()
+                raise
+        else:
+            self._adjust(size)
+        return Reservation(self, size)
+
+    async def _grow(self, reservation, delta):
+        """为已有预约增加 delta 字节，预算不足时等待"""
+        if not self._growers and self.in_use + delta <= self.limit:
+            self._account(delta)
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, delta, reservation.size)
+        self._growers.append(entry)
+        self._growing += reservation.size
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._adjust(-delta)
+            else:
+                try:
+                    self._growers.remove(entry)
+                    self._growing -= reservation.size
+                except ValueError:
+                    pass
+                self._wake()
+            raise
+
+    def observe(self, size):
+        """记录一次实际占用，更新估算值（指数滑动平均）"""
+        self.estimate = int(self.estimate * 0.8 + size * 0.2)
+
+    def _adjust(self, delta):
+        self._account(delta)
+        if delta < 0:
+            self._wake()
+
+    def _account(self, delta):
+        self.in_use += delta
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        if self.metrics is not None:
+            self.metrics.set_gauge('memory_in_use', self.in_use)
+            self.metrics.set_gauge('memory_peak', self.peak)
+
+    def _wake(self):
+        while self._growers:
+            future, delta, held = self._growers[0]
+            if future.cancelled():
+                self._growers.popleft()
+                self._growing -= held
+                continue
+            # 其余占用的额度都属于等待增大的预约时，没有谁能再归还额度，放行最早的一个
+            if self.in_use + delta > self.limit and self.in_use > self._growing:
+                return
+            self._growers.popleft()
+            self._growing -= held
+            self._account(delta)
+            future.set_result(None)
+        # 严格按先后顺序放行，避免大预约被小预约持续插队
+        while self._waiters:
+            future, size = self._waiters[0]
+            if future.cancelled():
+                self._waiters.popleft()
+                continue
+            if self.in_use + size > self.limit and self.in_use > 0:
+                break
+            self._waiters.popleft()
+            self._account(size)
+            future.set_result(None)
@@ -0,0 +1,231 @@
+"""
+运行指标模块
+按阶段统计耗时（直方图 + 分位数）、计数器与字节数，支持导出 JSON 快照和 Prometheus 文本格式
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# 分位数统计的采样上限，超过后使用蓄水池采样，保证内存恒定
+HISTOGRAM_RESERVOIR_SIZE = 4096
+# 实时速率的统计窗口（秒）
+RATE_WINDOW = 5.0
+
+
+class Histogram:
+    """耗时直方图：记录总数、总和、极值，并用蓄水池采样估算分位数"""
+
+    def __init__(self, reservoir_size=HISTOGRAM_RESERVOIR_SIZE):
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._samples = []
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if len(self._samples) < self.reservoir_size:
+            self._samples.append(value)
+        else:
+            # 蓄水池采样：以 reservoir_size / count 的概率替换已有样本
+            slot = random.randrange(self.count)
+            if slot < self.reservoir_size:
+                self._samples[slot] = value
+
+    def percentile(self, q):
+        """
+        计算分位数
+
+        :param q: 分位点，取值 0~1
+        :return: 分位数值，无样本时返回 0
+        """
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        pos = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[pos]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min or 0.0,
+            'max': self.max or 0.0,
+            'avg': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    事件循环线程负责写入，UI线程读取实时速率，因此所有读写都在锁内完成。
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._bytes = {}
+        self._gauges = {}
+        self._events = {}
+        self.started_at = time.time()
+
+    def reset(self):
+        """清空所有指标，开始新一轮统计"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._bytes.clear()
+            self._gauges.clear()
+            self._events.clear()
+            self.started_at = time.time()
+
+    def observe(self, stage, seconds):
+        """记录某阶段的一次耗时"""
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        阶段计时上下文，可直接包裹 await 语句
+
+        用法::
+
+            with metrics.timer('tile_download'):
+                data = await resp.read()
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name, value=1):
+        """计数器累加，同时记录事件时间用于实时速率"""
+        now = time.time()
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            events = self._events.get(name)
+            if events is None:
+                events = self._events[name] = deque()
+            events.append((now, value))
+            self._trim(events, now)
+
+    def add_bytes(self, stage, size):
+        """累加某阶段处理的字节数"""
+        with self._lock:
+            self._bytes[stage] = self._bytes.get(stage, 0) + size
+
+    def set_gauge(self, name, value):
+        """设置瞬时值（例如队列深度、阶段占用率），只保留最新值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def gauge(self, name, default=0):
+        with self._lock:
+            return self._gauges.get(name, default)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def rate(self, name, window=RATE_WINDOW):
+        """最近 window 秒内计数器的每秒速率"""
+        now = time.time()
+        with self._lock:
+            events = self._events.get(name)
+            if not events:
+                return 0.0
+            self._trim(events, now, window)
+            total = sum(value for _, value in events)
+        # 运行刚开始时窗口尚未填满，按实际经过时间计算
+        span = min(window, max(now - self.started_at, 1.0))
+        return total / span
+
+    @staticmethod
+    def _trim(events, now, window=RATE_WINDOW):
+        while events and now - events[0][0] > window:
+            events.popleft()
+
+    def snapshot(self):
+        """返回当前所有指标的字典快照"""
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            return {
+                'timestamp': time.time(),
+                'elapsed_seconds': elapsed,
+                'stages': {stage: hist.summary() for stage, hist in self._histograms.items()},
+                'counters': dict(self._counters),
+                'bytes': dict(self._bytes),
+                'gauges': dict(self._gauges),
+            }
+
+    def to_prometheus(self, prefix='bb_capture'):
+        """生成 Prometheus 文本格式（阶段耗时以 summary 类型输出）"""
+        snap = self.snapshot()
+        lines = [
+            f'# HELP {prefix}_stage_seconds Per-stage latency in seconds.',
+            f'# TYPE {prefix}_stage_seconds summary',
+        ]
+        for stage, summary in sorted(snap['stages'].items()):
+            for q, key in zip(self.QUANTILES, ('p50', 'p90', 'p99')):
+                lines.append(f'{prefix}_stage_seconds{{stage="{stage}",quantile="{q}"}} {summary[key]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {summary["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {summary["count"]}')
+
+        lines.append(f'# HELP {prefix}_events_total Event counters.')
+        lines.append(f'# TYPE {prefix}_events_total counter')
+        for name, value in sorted(snap['counters'].items()):
+            lines.append(f'{prefix}_events_total{{name="{name}"}} {value}')
+
+        lines.append(f'# HELP {prefix}_bytes_total Bytes processed per stage.')
+        lines.append(f'# TYPE {prefix}_bytes_total counter')
+        for stage, value in sorted(snap['bytes'].items()):
+            lines.append(f'{prefix}_bytes_total{{stage="{stage}"}} {value}')
+
+        lines.append(f'# HELP {prefix}_gauge Instantaneous values such as queue depth and stage occupancy.')
+        lines.append(f'# TYPE {prefix}_gauge gauge')
+        for name, value in sorted(snap['gauges'].items()):
+            lines.append(f'{prefix}_gauge{{name="{name}"}} {value}')
+
+        lines.append(f'# HELP {prefix}_elapsed_seconds Seconds since the run started.')
+        lines.append(f'# TYPE {prefix}_elapsed_seconds gauge')
+        lines.append(f'{prefix}_elapsed_seconds {snap["elapsed_seconds"]:.3f}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, output_dir, basename='metrics'):
+        """
+        导出 JSON 快照和 Prometheus 文本文件
+
+        :param output_dir: 输出目录
+        :param basename: 文件名前缀
+        :return: (json路径, prom路径)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        json_path = os.path.join(output_dir, f'{basename}.json')
+        prom_path = os.path.join(output_dir, f'{basename}.prom')
+
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        with open(prom_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        return json_path, prom_path
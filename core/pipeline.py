@@ -0,0 +1,287 @@
+"""
+分阶段提取流水线
+元数据 -> 瓦片图下载 -> 图像处理 -> 写盘，阶段之间使用有界队列连接：
+CPU 处理当前缩略图时，后续视频的元数据与瓦片图已在预取，队列满时上游自动等待（背压）。
+各阶段的队列深度与占用率写入指标（gauge），用于判断吞吐量受限于哪个阶段。
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import (PIPELINE_QUEUE_SIZE, PIPELINE_METADATA_WORKERS, PIPELINE_DOWNLOAD_WORKERS,
+                    PIPELINE_PROCESS_WORKERS, PIPELINE_WRITE_WORKERS)
+from core.retry import RequestError
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineItem:
+    """流水线中流转的一个采样点"""
+
+    __slots__ = ('video', 'time_in_seconds', 'output_path', 'crop', 'data', 'reservation')
+
+    def __init__(self, video, time_in_seconds, output_path):
+        self.video = video
+        self.time_in_seconds = time_in_seconds
+        self.output_path = output_path
+        self.crop = None
+        self.data = None
+        self.reservation = None  # 内存预约，从下载开始持有到编码完成
+
+
+class Stage:
+    """流水线的一个阶段：输入队列 + 若干工作协程，统计占用情况"""
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.processed = 0
+
+    def stats(self, elapsed):
+        return {
+            'queue': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'busy': self.busy,
+            'workers': self.workers,
+            'processed': self.processed,
+            # 阶段占用率：工作协程忙碌时间占总可用时间的比例，接近1说明该阶段是瓶颈
+            'utilization': self.busy_seconds / (self.workers * elapsed) if elapsed > 0 else 0.0,
+        }
+
+
+class ExtractionPipeline:
+    """
+    缩略图提取流水线
+
+    用法::
+
+        pipeline = ExtractionPipeline(extractor, metrics)
+        await pipeline.run(jobs, on_video_done)
+    """
+
+    def __init__(self, extractor, metrics, queue_size=PIPELINE_QUEUE_SIZE,
+                 metadata_workers=PIPELINE_METADATA_WORKERS, download_workers=PIPELINE_DOWNLOAD_WORKERS,
+                 process_workers=PIPELINE_PROCESS_WORKERS, write_workers=PIPELINE_WRITE_WORKERS):
+        """
+        :param extractor: ThumbnailExtractor
+        :param metrics: 指标注册表，队列深度与占用率以 pipeline_<阶段>_<字段> 形式写入 gauge
+        :param queue_size: 每个阶段输入队列的容量
+        :param download_workers: 同时下载瓦片图的数量
+        :param process_workers: 图像处理线程数
+        """
+        self.extractor = extractor
+        self.metrics = metrics
+        self.stages = [
+            Stage('metadata', metadata_workers, queue_size),
+            Stage('download', download_workers, queue_size),
+            Stage('process', process_workers, queue_size),
+            Stage('write', write_workers, queue_size),
+        ]
+        self._handlers = [self._metadata, self._download, self._process, self._write]
+        self._executor = None
+        self._pending = {}  # bvid -> [剩余采样点数, 是否全部成功]
+        self._commits = set()  # 已写出临时文件、等待批次提交的写盘结果
+        self._on_video_done = None
+        self._on_thumbnail = None
+        self._started = 0.0
+
+    def stats(self):
+        """各阶段的队列深度、忙碌数与占用率"""
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
+
+    def publish(self):
+        """把各阶段状态写入指标"""
+        for name, stats in self.stats().items():
+            for key in ('queue', 'busy', 'utilization'):
+                self.metrics.set_gauge(f'pipeline_{name}_{key}', stats[key])
+
+    async def run(self, jobs, on_video_done=None, stopped=None, on_thumbnail=None):
+        """
+        处理全部任务
+
+        :param jobs: 可迭代的 (video, [(采样时间, 输出路径), ...])
+        :param on_video_done: 回调 on_video_done(video, success)，某个视频的全部采样点结束（缩略图已提交落盘）时调用
+        :param on_thumbnail: 回调 on_thumbnail(item)，每张缩略图以正式文件名落盘后调用（item 为 PipelineItem）
+        :param stopped: 无参函数，返回True时不再投递新的视频
+        :return: 是否投递了全部任务（被 stopped 中断时为False）
+        :raises Exception: 工作协程因未捕获的异常退出时抛出该异常
+        """
+        self._on_video_done = on_video_done
+        self._on_thumbnail = on_thumbnail
+        self._started = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=self.stages[2].workers, thread_name_prefix='pipeline')
+        loop = asyncio.get_running_loop()
+        workers = [
+            asyncio.create_task(self._worker(index, loop))
+            for index, stage in enumerate(self.stages)
+            for _ in range(stage.workers)
+        ]
+        monitor = asyncio.create_task(self._monitor())
+        feeder = asyncio.create_task(self._feed(jobs, stopped))
+        try:
+            # 工作协程只会因未捕获的异常退出；此时队列不会再排空，直接让本次运行失败而不是永远等待
+            done, _ = await asyncio.wait([feeder, *workers], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not feeder:
+                    raise task.exception() or RuntimeError(f"流水线工作协程意外退出: {task!r}")
+            completed = feeder.result()
+            # 提交写盘线程池中尚未重命名的最后一批文件，并等待各采样点按提交结果完成
+            await self.extractor.writer.flush()
+            if self._commits:
+                await asyncio.wait(self._commits)
+        finally:
+            feeder.cancel()
+            for task in workers:
+                task.cancel()
+            monitor.cancel()
+            await asyncio.gather(feeder, *workers, monitor, return_exceptions=True)
+            self._executor.shutdown(wait=False)
+            self.publish()
+            self._log_summary()
+        return completed
+
+    async def _feed(self, jobs, stopped):
+        """投递全部任务并等待各阶段排空，返回是否投递了全部任务"""
+        completed = True
+        for video, samples in jobs:
+            if stopped is not None and stopped():
+                completed = False
+                break
+            if not samples:
+                self._video_done(video, True)
+                continue
+            self._pending[video['bvid']] = [len(samples), True]
+            for time_in_seconds, output_path in samples:
+                await self.stages[0].queue.put(PipelineItem(video, time_in_seconds, output_path))
+
+        # 按顺序等待各阶段排空：上游 task_done 前已把结果放入下游队列
+        for stage in self.stages:
+            await stage.queue.join()
+        return completed
+
+    async def _worker(self, index, loop):
+        stage = self.stages[index]
+        handler = self._handlers[index]
+        next_queue = self.stages[index + 1].queue if index + 1 < len(self.stages) else None
+        while True:
+            item = await stage.queue.get()
+            stage.busy += 1
+            started = time.perf_counter()
+            try:
+                ok = await handler(item, loop)
+            except RequestError as e:
+                self.extractor.log_request_error(item.video['bvid'], e)
+                ok = False
+            except Exception as e:
+                logger.error("处理 %s 异常: %s", item.video['bvid'], e, exc_info=True)
+                ok = False
+            finally:
+                stage.busy -= 1
+                stage.busy_seconds += time.perf_counter() - started
+                stage.processed += 1
+
+            try:
+                if ok is None:
+                    # 写盘阶段：结果在批次提交后由 _on_commit 处理
+                    pass
+                elif not ok:
+                    self._item_done(item, False)
+                elif next_queue is None:
+                    self._item_done(item, True)
+                else:
+                    # 下游队列满时在此等待，形成背压
+                    await next_queue.put(item)
+            finally:
+                stage.queue.task_done()
+
+    async def _metadata(self, item, loop):
+        item.crop = await self.extractor.locate_thumbnail(item.video['bvid'], item.time_in_seconds)
+        return item.crop is not None
+
+    async def _download(self, item, loop):
+        # 内存预算不足时在此等待，限制在途瓦片图的总量
+        memory = self.extractor.memory
+        item.reservation = await memory.acquire()
+        item.data = await self.extractor.fetch_tile(item.crop.tile_url)
+        # 实际大小超过估算值时在此等待预算，解码前总占用不超过上限
+        await item.reservation.grow(len(item.data) + self.extractor.estimate_decoded_size(item.data))
+        return True
+
+    async def _process(self, item, loop):
+        data, item.data = item.data, None
+        tile_img = await loop.run_in_executor(self._executor, self.extractor.decode_tile, item.crop, data)
+        # 解码完成后立即释放原始字节，只保留解码后图像的预约
+        raw_size = len(data)
+        del data
+        item.reservation.resize(item.reservation.size - raw_size)
+        if tile_img is None:
+            return False
+        item.data = await loop.run_in_executor(
+            self._executor, self.extractor.crop_and_encode, item.crop, tile_img, item.output_path)
+        item.reservation.release()
+        return item.data is not None
+
+    async def _write(self, item, loop):
+        encoded, item.data = item.data, None
+        commit = await self.extractor.write_thumbnail(item.output_path, encoded)
+        if commit is None:
+            return False
+        # 不在此等待提交：批次要攒满或超时才提交，等待会阻塞写盘阶段本身
+        self._commits.add(commit)
+        commit.add_done_callback(lambda future: self._on_commit(item, future))
+        return None
+
+    def _on_commit(self, item, commit):
+        self._commits.discard(commit)
+        try:
+            self._item_done(item, not commit.cancelled() and commit.result())
+        except Exception as e:
+            logger.error("处理 %s 异常: %s", item.video['bvid'], e, exc_info=True)
+
+    def _item_done(self, item, success):
+        if item.reservation is not None:
+            item.reservation.release()
+        self.metrics.inc('thumbnails' if success else 'thumbnail_failures')
+        if success and self._on_thumbnail:
+            try:
+                self._on_thumbnail(item)
+            except Exception as e:
+                logger.error("缩略图回调异常 %s: %s", item.output_path, e, exc_info=True)
+        state = self._pending.get(item.video['bvid'])
+        if state is None:
+            return
+        state[0] -= 1
+        state[1] = state[1] and success
+        if state[0] == 0:
+            del self._pending[item.video['bvid']]
+            self._video_done(item.video, state[1])
+
+    def _video_done(self, video, success):
+        if self._on_video_done:
+            try:
+                self._on_video_done(video, success)
+            except Exception as e:
+                logger.error("视频完成回调异常 %s: %s", video['bvid'], e, exc_info=True)
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(1.0)
+            self.publish()
+            # 写盘阶段空闲时也按时间间隔提交批次，已写出的缩略图不会一直等到下一次写入
+            await self.extractor.writer.flush(due_only=True)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("流水线队列: %s", ', '.join(
+                    f"{name} {s['queue']}/{s['capacity']} 忙碌 {s['busy']}/{s['workers']}"
+                    for name, s in self.stats().items()))
+
+    def _log_summary(self):
+        stats = self.stats()
+        if not any(s['processed'] for s in stats.values()):
+            return
+        logger.info("流水线各阶段占用率: %s", ', '.join(
+            f"{name} {s['utilization']:.0%}" for name, s in stats.items()))
@@ -0,0 +1,193 @@
+"""
+运行预估模块
+只执行列表阶段（有新鲜的本地目录时直接读取目录），再用 SamplingEngine 计算采样计划，
+估算一次提取需要的请求数、不同瓦片图数、下载与写出字节数，以及在 QPS 限制下的耗时。不下载任何瓦片图。
+
+普通运行只有列表请求受 qps 限制（元数据与瓦片图请求只受并发数约束），耗时取决于网络与并发，无法按 qps 估算；
+只有传入共享限制器的运行（监视模式、任务队列 worker）中全部请求才受 qps 限制，此时才给出按 qps 计算的耗时下限。
+
+已归档视频的 videoshot.json（见 core.archive）可提供精确的瓦片图分布与实际大小；
+没有缓存元数据的视频按“每个采样点一张瓦片图”计（上限），结果中分别给出精确与估算的视频数。
+流水线只合并同时在途的相同瓦片图请求，因此瓦片图请求数按每个采样点一次估算（上限），
+不同瓦片图数则表示理想情况下（例如归档模式）的最少下载次数。
+"""
+import json
+import logging
+import os
+
+from config import PLAN_SHEET_BYTES, PLAN_THUMBNAIL_BYTES, PLAN_API_RESPONSE_BYTES
+from core.archive import SIDECAR_NAME
+from core.utils import locate_frame, format_duration
+
+logger = logging.getLogger(__name__)
+
+# 每个视频的元数据请求：pagelist + videoshot
+METADATA_REQUESTS_PER_VIDEO = 2
+# 从输出目录统计缩略图平均大小时最多读取的文件数
+SIZE_SAMPLE_LIMIT = 200
+
+
+class RunPlan:
+    """一次提取的预估结果"""
+
+    def __init__(self, qps, rate_limited=False):
+        """
+        :param qps: 每秒请求数
+        :param rate_limited: 提取请求是否也受 qps 限制（使用共享限制器的运行）
+        """
+        self.qps = qps
+        self.rate_limited = rate_limited
+        self.videos = 0  # 列表中的视频数
+        self.skipped = 0  # 过短而跳过的视频数
+        self.samples = 0  # 采样点（缩略图）数
+        self.listing_requests = 0  # 本次预估中列表阶段已发出的请求数
+        self.metadata_requests = 0
+        self.tile_requests = 0  # 瓦片图请求数（每个采样点一次）
+        self.sheets = 0  # 采样点分布在的不同瓦片图数
+        self.exact_videos = 0  # 使用缓存的 videoshot 元数据精确计算瓦片图的视频数
+        self.sheet_bytes = PLAN_SHEET_BYTES  # 每张瓦片图的平均字节数
+        self.thumbnail_bytes = PLAN_THUMBNAIL_BYTES  # 每张缩略图的平均字节数
+
+    @property
+    def requests(self):
+        """提取阶段的请求数（元数据 + 瓦片图）"""
+        return self.metadata_requests + self.tile_requests
+
+    @property
+    def download_bytes(self):
+        return self.tile_requests * self.sheet_bytes + self.metadata_requests * PLAN_API_RESPONSE_BYTES
+
+    @property
+    def output_bytes(self):
+        return self.samples * self.thumbnail_bytes
+
+    @property
+    def limited_duration_seconds(self):
+        """所有提取请求都受 qps 限制时的耗时（下限，不含网络延迟与图像处理）"""
+        return self.requests / self.qps if self.qps else 0.0
+
+    @property
+    def duration_seconds(self):
+        """本次运行的耗时下限；提取请求不受 qps 限制时无法估算，返回None"""
+        return self.limited_duration_seconds if self.rate_limited else None
+
+    def to_dict(self):
+        return {
+            'videos': self.videos,
+            'skipped_videos': self.skipped,
+            'samples': self.samples,
+            'listing_requests': self.listing_requests,
+            'metadata_requests': self.metadata_requests,
+            'tile_requests': self.tile_requests,
+            'sheets': self.sheets,
+            'exact_videos': self.exact_videos,
+            'requests': self.requests,
+            'download_bytes': self.download_bytes,
+            'output_bytes': self.output_bytes,
+            'qps': self.qps,
+            'rate_limited': self.rate_limited,
+            'duration_seconds': round(self.duration_seconds, 1) if self.rate_limited else None,
+            'limited_duration_seconds': round(self.limited_duration_seconds, 1),
+        }
+
+    def summary_lines(self):
+        estimated = self.videos - self.skipped - self.exact_videos
+        limited = format_duration(self.limited_duration_seconds)
+        if self.rate_limited:
+            duration = f"预计耗时: {limited}（全部请求受 {self.qps} QPS 限制时的下限）"
+        else:
+            duration = (f"预计耗时: 提取请求不受 QPS 限制，取决于网络与并发数；"
+                        f"全部请求受 {self.qps} QPS 限制时（监视 / worker 模式）不少于 {limited}")
+        return [
+            f"视频: {self.videos}（过短跳过 {self.skipped}）",
+            f"采样点: {self.samples}",
+            f"列表请求（已完成）: {self.listing_requests}",
+            f"提取请求: {self.requests}（元数据 {self.metadata_requests}，瓦片图 {self.tile_requests}）",
+            f"不同瓦片图: {self.sheets}（{self.exact_videos} 个视频按缓存元数据精确计算，{estimated} 个视频按上限估算）",
+            f"预计下载: {_format_bytes(self.download_bytes)}，写出: {_format_bytes(self.output_bytes)}",
+            duration,
+        ]
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def load_videoshot(archive_dir, bvid):
+    """读取已归档视频的 videoshot.json，不存在或无法解析时返回None"""
+    try:
+        with open(os.path.join(archive_dir, bvid, SIDECAR_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def count_sheets(meta, sample_times):
+    """按 videoshot 元数据计算这些采样点分布在几张不同的瓦片图上"""
+    sheet_count = len(meta['sheets'])
+    return len({locate_frame(meta['index'], t, meta['img_w'], meta['img_h'], meta['img_x_cnt'],
+                             meta['img_y_cnt'], sheet_count)[0] for t in sample_times})
+
+
+def average_file_size(paths):
+    sizes = []
+    for path in paths[:SIZE_SAMPLE_LIMIT]:
+        try:
+            sizes.append(os.path.getsize(path))
+        except OSError:
+            continue
+    return sum(sizes) / len(sizes) if sizes else None
+
+
+def build_plan(video_list, sampler, qps, archive_dir=None, output_dir=None, rate_limited=False):
+    """
+    根据视频列表估算提取成本
+
+    :param video_list: VideoRecord 列表
+    :param sampler: SamplingEngine
+    :param qps: 每秒请求数
+    :param archive_dir: 归档目录，其中的 videoshot.json 用于精确计算瓦片图数与平均大小
+    :param output_dir: 输出目录，已有缩略图用于估算平均大小
+    :param rate_limited: 提取请求是否也受 qps 限制（运行使用共享限制器时）
+    :return: RunPlan
+    """
+    plan = RunPlan(qps, rate_limited)
+    plan.videos = len(video_list)
+    sheet_files = []
+    for video in video_list:
+        sample_times = sampler.calculate_sample_points(video['duration'])
+        if not sample_times:
+            plan.skipped += 1
+            continue
+        plan.samples += len(sample_times)
+        plan.tile_requests += len(sample_times)
+        plan.metadata_requests += METADATA_REQUESTS_PER_VIDEO
+        meta = load_videoshot(archive_dir, video['bvid']) if archive_dir else None
+        if meta and meta.get('sheets') and meta.get('index'):
+            plan.sheets += count_sheets(meta, sample_times)
+            plan.exact_videos += 1
+            sheet_files.extend(os.path.join(archive_dir, video['bvid'], sheet['file']) for sheet in meta['sheets'])
+        else:
+            plan.sheets += len(sample_times)
+
+    # 有实际文件时用实际平均大小代替默认估算值
+    average = average_file_size(sheet_files)
+    if average:
+        plan.sheet_bytes = average
+    if output_dir:
+        average = average_file_size(_list_thumbnails(output_dir))
+        if average:
+            plan.thumbnail_bytes = average
+    return plan
+
+
+def _list_thumbnails(output_dir):
+    try:
+        return [entry.path for entry in os.scandir(output_dir)
+                if entry.is_file() and entry.name.lower().endswith(('.webp', '.jpg', '.jpeg'))]
+    except OSError:
+        return []
@@ -0,0 +1,169 @@
+"""
+运行分析模块
+对一次提取运行做 cProfile 采样，可选 tracemalloc 内存分配统计与 asyncio 慢回调检测，
+结果写到输出目录下的 profiles/ 目录，便于附在性能问题报告中：
+
+    <输出目录>/profiles/run-YYYYmmdd-HHMMSS.prof        # cProfile 原始数据，可用 snakeviz / pstats 查看
+    <输出目录>/profiles/run-YYYYmmdd-HHMMSS.stats.txt   # 按累计耗时排序的函数列表
+    <输出目录>/profiles/run-YYYYmmdd-HHMMSS.alloc.txt   # 内存分配最多的代码行及运行期间的增长（启用 tracemalloc 时）
+    <输出目录>/profiles/run-YYYYmmdd-HHMMSS.slow.txt    # 阻塞事件循环的慢回调（启用慢回调检测时）
+
+cProfile 只统计调用 start() 的线程，即事件循环线程（列表、下载调度、写盘批次提交等）；
+解码/编码线程池中的耗时体现在 .stats.txt 中等待线程池的时间上，按阶段的耗时见性能指标。
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+
+from config import (PROFILE_TRACEMALLOC, PROFILE_SLOW_CALLBACKS, PROFILE_SLOW_CALLBACK_MS, PROFILE_TOP_N,
+                    PROFILE_DIR_NAME)
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc 记录的调用栈深度，大于1时按调用栈汇总的报告更有用，但开销更大
+TRACEMALLOC_FRAMES = 1
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """收集 asyncio 调试模式下输出的“Executing ... took N seconds”警告"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        if 'took' in record.getMessage():
+            self.records.append(f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.getMessage()}")
+
+
+class RunProfiler:
+    """单次运行的分析器，在事件循环线程中 start()，运行结束后 stop() 写出报告"""
+
+    def __init__(self, output_dir, trace_memory=PROFILE_TRACEMALLOC, slow_callbacks=PROFILE_SLOW_CALLBACKS,
+                 slow_callback_ms=PROFILE_SLOW_CALLBACK_MS, top_n=PROFILE_TOP_N):
+        """
+        :param output_dir: 缩略图输出目录，报告写到其下的 profiles/ 目录
+        :param trace_memory: 是否启用 tracemalloc（会明显拖慢运行并增加内存占用）
+        :param slow_callbacks: 是否启用 asyncio 调试模式以记录慢回调（调试模式会为每个回调记录调用栈，
+                               此时 .prof 中的耗时会明显偏向 traceback/linecache）
+        :param slow_callback_ms: 单个回调/任务步骤超过该毫秒数即视为阻塞事件循环
+        :param top_n: 报告中列出的条目数
+        """
+        self.profile_dir = os.path.join(output_dir, PROFILE_DIR_NAME)
+        self.trace_memory = trace_memory
+        self.slow_callbacks = slow_callbacks
+        self.slow_callback_ms = slow_callback_ms
+        self.top_n = top_n
+        self.prefix = None
+        self._profile = None
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._loop = None
+        self._loop_state = None
+        self._slow_handler = None
+
+    def start(self, loop=None):
+        """
+        开始分析
+
+        :param loop: 需要检测慢回调的事件循环，默认为当前运行中的事件循环
+        """
+        self.prefix = os.path.join(self.profile_dir, time.strftime('run-%Y%m%d-%H%M%S'))
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.slow_callbacks:
+            self._start_slow_callbacks(loop)
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def stop(self):
+        """停止分析并写出报告，返回报告文件路径列表（写出失败时只记录日志）"""
+        if self._profile is None:
+            return []
+        self._profile.disable()
+        paths = []
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            # 先取内存快照，避免把生成 .stats.txt 时的分配计入报告
+            if self.trace_memory:
+                paths.append(self._write_allocations())
+            paths.extend(self._write_profile())
+            if self.slow_callbacks:
+                paths.append(self._write_slow_callbacks())
+        except OSError as e:
+            logger.error("写出分析报告失败: %s", e)
+        finally:
+            self._profile = None
+            self._snapshot = None
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+            self._stop_slow_callbacks()
+        for path in paths:
+            logger.info("分析报告: %s", path)
+        return paths
+
+    def _start_slow_callbacks(self, loop):
+        import asyncio
+
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_state = (self._loop.get_debug(), self._loop.slow_callback_duration)
+        self._loop.slow_callback_duration = self.slow_callback_ms / 1000
+        self._loop.set_debug(True)
+        self._slow_handler = _SlowCallbackHandler()
+        logging.getLogger('asyncio').addHandler(self._slow_handler)
+
+    def _stop_slow_callbacks(self):
+        if self._slow_handler is not None:
+            logging.getLogger('asyncio').removeHandler(self._slow_handler)
+        if self._loop is not None:
+            debug, duration = self._loop_state
+            self._loop.set_debug(debug)
+            self._loop.slow_callback_duration = duration
+            self._loop = None
+
+    def _write_profile(self):
+        prof_path = self.prefix + '.prof'
+        self._profile.dump_stats(prof_path)
+
+        stats_path = self.prefix + '.stats.txt'
+        buffer = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=buffer).strip_dirs()
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top_n)
+        with open(stats_path, 'w', encoding='utf-8') as f:
+            f.write(buffer.getvalue())
+        return [prof_path, stats_path]
+
+    def _write_allocations(self):
+        path = self.prefix + '.alloc.txt'
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"当前已分配: {current / 1024 / 1024:.1f} MB，峰值: {peak / 1024 / 1024:.1f} MB", '',
+                 f"== 当前占用最多的 {self.top_n} 处 =="]
+        lines.extend(str(stat) for stat in snapshot.statistics('lineno')[:self.top_n])
+        if self._snapshot is not None:
+            lines.extend(['', f"== 运行期间增长最多的 {self.top_n} 处 =="])
+            lines.extend(str(stat) for stat in snapshot.compare_to(self._snapshot, 'lineno')[:self.top_n])
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def _write_slow_callbacks(self):
+        path = self.prefix + '.slow.txt'
+        records = self._slow_handler.records if self._slow_handler is not None else []
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"阈值: {self.slow_callback_ms} ms，共 {len(records)} 次\n")
+            f.write('\n'.join(records) + ('\n' if records else ''))
+        return path
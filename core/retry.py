@@ -0,0 +1,244 @@
+"""
+重试与错误分类模块
+所有 core/ 中的HTTP请求统一经过 RetryEngine：
+- 把HTTP状态码、B站业务码、网络异常划分为可重试 / 不可重试两类
+- 可重试错误按指数退避 + 全抖动（full jitter）重试
+- 每个接口一个熔断器，连续失败后在冷却期内直接失败，不再消耗请求配额
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+import zlib
+
+import aiohttp
+
+from config import (RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+                    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+from core.decoding import CorruptBodyError
+from core.metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+# B站业务码说明
+API_CODE_MESSAGES = {
+    -3: "API签名错误，请检查WBI算法",
+    -101: "账号未登录，请检查Cookie是否有效",
+    -352: "风控校验失败，请降低请求频率或检查Cookie",
+    -400: "请求参数错误",
+    -403: "访问权限不足",
+    -404: "视频不存在",
+    -412: "请求被拦截，请降低请求频率",
+    -509: "请求过于频繁",
+    -799: "请求过于频繁，请稍后再试",
+}
+
+# 触发限流/风控的业务码与状态码：可以重试，但需要更长的等待
+RATE_LIMIT_CODES = {-352, -412, -509, -799}
+RATE_LIMIT_STATUSES = {412, 429}
+# 服务端临时故障，可以重试
+RETRYABLE_STATUSES = {408, 500, 502, 503, 504}
+# 限流类错误的最小退避时间（秒）
+RATE_LIMIT_MIN_DELAY = 5.0
+
+
+class RequestError(Exception):
+    """请求失败的基类，retryable 表示是否值得重试"""
+
+    retryable = False
+
+    def __init__(self, message, status=None, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+class RetryableError(RequestError):
+    """临时性错误：超时、连接断开、5xx 等"""
+
+    retryable = True
+
+
+class RateLimitedError(RetryableError):
+    """限流或风控，重试前至少等待 RATE_LIMIT_MIN_DELAY 秒"""
+
+
+class PermanentError(RequestError):
+    """永久性错误：404、参数错误、未登录等，重试也不会成功"""
+
+
+class CircuitOpenError(PermanentError):
+    """接口熔断中，请求未发出"""
+
+
+def classify_status(status, url=""):
+    """根据HTTP状态码生成对应的错误"""
+    if status in RATE_LIMIT_STATUSES:
+        return RateLimitedError(f"HTTP {status}（请求过于频繁）: {url}", status=status)
+    if status in RETRYABLE_STATUSES or status >= 500:
+        return RetryableError(f"HTTP {status}: {url}", status=status)
+    return PermanentError(f"HTTP {status}: {url}", status=status)
+
+
+def classify_api_code(code, message=""):
+    """根据B站业务码（data['code']）生成对应的错误"""
+    text = API_CODE_MESSAGES.get(code) or message or "未知错误"
+    description = f"API错误 {code}: {text}"
+    if code in RATE_LIMIT_CODES:
+        return RateLimitedError(description, code=code)
+    return PermanentError(description, code=code)
+
+
+def check_api_code(data):
+    """检查响应中的业务码，非0时抛出分类后的错误"""
+    if not isinstance(data, dict):
+        raise RetryableError("响应数据格式错误")
+    code = data.get('code')
+    if code != 0:
+        raise classify_api_code(code, data.get('message', ''))
+    return data
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动：第 n 次重试等待 uniform(0, min(max_delay, base_delay * 2^n))"""
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, error=None):
+        """
+        计算第 attempt 次失败后的等待时间
+
+        :param attempt: 已失败次数（从0开始）
+        :param error: 本次的错误，限流类错误有最小等待时间
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if isinstance(error, RateLimitedError):
+            delay = max(delay, RATE_LIMIT_MIN_DELAY)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed：正常放行；连续失败 failure_threshold 次后进入 open。
+    open：直接拒绝，reset_timeout 秒后进入 half-open。
+    half-open：只放行一个探测请求，成功则恢复 closed，失败则重新 open；
+    探测请求被取消或以未分类的异常结束时（end_probe）保持 half-open，允许下一个请求继续探测。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def end_probe(self):
+        """一次放行的请求已结束（无论结果如何），释放探测名额"""
+        self._probing = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        """记录一次失败，返回熔断器是否因此打开"""
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            was_open = self.state == self.OPEN
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            return not was_open
+        return False
+
+
+class RetryEngine:
+    """统一的重试执行器，按接口（endpoint）维护熔断器"""
+
+    # 视为临时故障的底层异常
+    TRANSIENT_EXCEPTIONS = (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError, zlib.error,
+                            CorruptBodyError)
+
+    def __init__(self, policy=None, metrics=None, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.policy = policy or RetryPolicy()
+        self.metrics = metrics or MetricsRegistry()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+
+    def breaker(self, endpoint):
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    async def call(self, endpoint, func):
+        """
+        执行 func() 并按策略重试
+
+        :param endpoint: 接口名，用于熔断与指标
+        :param func: 无参协程函数，失败时抛出 RequestError 或底层网络异常
+        :return: func 的返回值
+        :raises RequestError: 不可重试的错误，或重试次数用尽后的最后一个错误
+        """
+        breaker = self.breaker(endpoint)
+        for attempt in range(self.policy.max_attempts):
+            if not breaker.allow():
+                self.metrics.inc('circuit_rejected')
+                raise CircuitOpenError(f"接口 {endpoint} 熔断中，暂停请求")
+
+            try:
+                result = await func()
+            except RequestError as e:
+                error = e
+            except self.TRANSIENT_EXCEPTIONS as e:
+                error = RetryableError(f"{type(e).__name__}: {e}")
+            else:
+                breaker.record_success()
+                return result
+            finally:
+                # 被取消（例如用户停止）或抛出未分类异常时也要释放探测名额，否则熔断器永远停在 half-open
+                breaker.end_probe()
+
+            # 永久性错误说明接口本身是通的（例如单个视频404），不计入熔断
+            if not error.retryable:
+                breaker.record_success()
+                raise error
+
+            if breaker.record_failure():
+                self.metrics.inc('circuit_opened')
+                logger.warning("接口 %s 连续失败 %s 次，熔断 %s 秒", endpoint, breaker.failures, breaker.reset_timeout)
+
+            if attempt + 1 >= self.policy.max_attempts:
+                raise error
+
+            delay = self.policy.delay(attempt, error)
+            self.metrics.inc('retries')
+            logger.debug("接口 %s 第 %s 次请求失败（%s），%.2f 秒后重试", endpoint, attempt + 1, error, delay)
+            await asyncio.sleep(delay)
@@ -0,0 +1,123 @@
+"""
+后台运行时模块
+在应用生命周期内保持一个后台线程、一个事件循环和一个连接池会话：
+每次提取只是向该事件循环提交一个任务，连接、DNS缓存与TLS会话在多次运行之间复用，
+WBI密钥与 pagelist / videoshot 元数据也会在一段时间内跨运行共享。
+安装了 uvloop 时优先使用它作为事件循环实现。
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from config import EVENT_LOOP_UVLOOP, METADATA_CACHE_TTL, WBI_KEY_TTL
+from core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def new_event_loop(use_uvloop=EVENT_LOOP_UVLOOP):
+    """创建事件循环，可用时使用 uvloop"""
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+class MetadataCache:
+    """跨运行共享的元数据缓存（只在后台事件循环线程中使用）"""
+
+    def __init__(self, ttl=METADATA_CACHE_TTL, wbi_ttl=WBI_KEY_TTL, metrics=None):
+        """
+        :param ttl: pagelist / videoshot 等接口结果的共享秒数
+        :param wbi_ttl: WBI密钥的缓存秒数
+        :param metrics: 可选的指标注册表，记录 api_shared
+        """
+        self.api = SingleFlight(ttl=ttl, metrics=metrics, name='api')
+        self.wbi_ttl = wbi_ttl
+        self._wbi_key = None
+        self._wbi_expires = 0.0
+
+    def get_wbi_key(self):
+        if self._wbi_key is not None and self._wbi_expires > time.monotonic():
+            return self._wbi_key
+        return None
+
+    def set_wbi_key(self, key):
+        self._wbi_key = key
+        self._wbi_expires = time.monotonic() + self.wbi_ttl
+
+
+class BackgroundLoop:
+    """在后台线程中常驻的事件循环与HTTP会话"""
+
+    def __init__(self, session_factory, use_uvloop=EVENT_LOOP_UVLOOP, metrics=None, name='capture-loop'):
+        """
+        :param session_factory: 根据Cookie创建 aiohttp 会话的函数，例如 core.capture.create_session
+        :param use_uvloop: 安装了 uvloop 时是否使用
+        :param metrics: 传给元数据缓存的指标注册表
+        :param name: 线程名
+        """
+        self.session_factory = session_factory
+        self.loop = new_event_loop(use_uvloop)
+        self.metadata = MetadataCache(metrics=metrics)
+        self._session = None
+        self._session_cookie = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        logger.info("后台事件循环: %s", type(self.loop).__module__)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            try:
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            finally:
+                self.loop.close()
+
+    def submit(self, coro):
+        """把协程提交到后台事件循环（可在任意线程调用），返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def get_session(self, cookie=""):
+        """
+        获取常驻会话（需在后台事件循环中调用）；Cookie 变化或会话已关闭时重新创建
+
+        会话的默认请求头中包含Cookie，因此不同Cookie不共用同一个会话
+        """
+        if self._session is None or self._session.closed or self._session_cookie != cookie:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = self.session_factory(cookie)
+            self._session_cookie = cookie
+            logger.debug("已创建新的HTTP会话")
+        return self._session
+
+    async def _shutdown(self):
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def close(self, timeout=5.0):
+        """取消未完成的任务、关闭会话并停止事件循环（可在任意线程调用，进程退出前调用）"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self.submit(self._shutdown()).result(timeout)
+        except Exception as e:
+            logger.warning("关闭后台事件循环时出错: %s", e)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
@@ -7,18 +7,19 @@ logger = logging.getLogger(__name__)
 class SamplingEngine:
     """采样引擎，根据视频时长计算采样点"""
     
-    def calculate_sample_points(self, duration_str):
+    def calculate_sample_points(self, duration):
         """
-        根据视频时长字符串计算采样点
+        根据视频时长计算采样点
         
-        :param duration_str: 视频时长字符串，如 '3:45' 或 '1:23:45'
+        :param duration: 视频时长，整数秒（VideoRecord.duration）；也兼容 '3:45' 或 '1:23:45' 形式的字符串
         :return: 采样时间点列表（秒）
         """
-        duration = self._convert_duration_to_seconds(duration_str)
+        if isinstance(duration, str):
+            duration = self._convert_duration_to_seconds(duration)
         
         # 如果视频时长小于最小值，返回空列表
         if duration < MIN_VIDEO_DURATION:
-            logger.info(f"视频时长 {duration}s 小于最小值 {MIN_VIDEO_DURATION}s，跳过采样")
+            logger.debug("视频时长 %ss 小于最小值 %ss，跳过采样", duration, MIN_VIDEO_DURATION)
             return []
         
         # 计算采样点数量
@@ -29,13 +30,13 @@ class SamplingEngine:
         else:  # 长期视频 (>= 1小时)
             n = max(4, int(duration / 1800))  # 每30分钟增加一个采样点
         
-        logger.info(f"视频时长: {duration}s, 采样点数量: {n}")
+        logger.debug("视频时长: %ss, 采样点数量: %s", duration, n)
         
         # 计算采样时间点，避开片头片尾
         # 公式: ti = T / (N+1) * i
         sample_times = [duration / (n + 1) * i for i in range(1, n + 1)]
         
-        logger.info(f"采样时间点: {sample_times}")
+        logger.debug("采样时间点: %s", sample_times)
         return sample_times
 
     def _convert_duration_to_seconds(self, duration_str):
@@ -53,8 +54,8 @@ class SamplingEngine:
                 hours, minutes, seconds = parts
                 return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
             else:
-                logger.warning(f"无法解析时长格式: {duration_str}")
+                logger.warning("无法解析时长格式: %s", duration_str)
                 return 0
         except Exception as e:
-            logger.error(f"转换时长时出错: {e}")
+            logger.error("转换时长时出错: %s", e)
             return 0
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+请求合并（singleflight）模块
+相同 key 的并发调用只执行一次，其余调用等待并共享同一个结果（或同一个异常）。
+可选地在完成后把结果保留 ttl 秒，紧随其后的相同请求也直接复用，不再消耗请求配额。
+
+共享的调用在独立任务中执行，单个等待者被取消不影响其他等待者；最后一个等待者也被取消时（例如用户停止提取），
+共享任务随之取消，不会在常驻事件循环中继续请求与重试等待。
+"""
+import asyncio
+import time
+
+
+class SingleFlight:
+    """按 key 合并进行中的协程调用（只在事件循环线程中使用）"""
+
+    def __init__(self, ttl=0.0, metrics=None, name='singleflight'):
+        """
+        :param ttl: 成功结果在完成后继续共享的秒数，0表示只合并并发调用
+        :param metrics: 可选的指标注册表，记录 <name>_shared（被合并的调用数）
+        :param name: 指标名前缀
+        """
+        self.ttl = ttl
+        self.metrics = metrics
+        self.name = name
+        self._inflight = {}  # key -> Task
+        self._waiters = {}  # Task -> 正在等待的调用方数量
+        self._results = {}  # key -> (过期时间, 结果)
+
+    async def do(self, key, func):
+        """
+        执行 func()，相同 key 的调用合并为一次
+
+        :param key: 可哈希的请求标识
+        :param func: 无参协程函数
+        """
+        if self.ttl:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._shared()
+                    return cached[1]
+                del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            # 由独立任务执行，首个调用方被取消时不影响其他等待者
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self._shared()
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # 没有调用方还需要这个结果
+                if not task.done():
+                    task.cancel()
+
+    def forget(self, key):
+        """丢弃 key 的缓存结果"""
+        self._results.pop(key, None)
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        # 读取异常，避免所有等待者都已取消时出现 "exception was never retrieved"
+        error = task.exception()
+        if self.ttl and error is None:
+            now = time.monotonic()
+            self._purge(now)
+            self._results[key] = (now + self.ttl, task.result())
+
+    def _purge(self, now):
+        expired = [key for key, (expires, _) in self._results.items() if expires <= now]
+        for key in expired:
+            del self._results[key]
+
+    def _shared(self):
+        if self.metrics is not None:
+            self.metrics.inc(f'{self.name}_shared')
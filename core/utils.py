@@ -1,3 +1,4 @@
+import bisect
 import hashlib
 import time
 import urllib.parse
@@ -25,7 +26,7 @@ async def get_wbi_sign(session):
         
         return img_key + sub_key
     except Exception as e:
-        logger.error(f"获取WBI签名密钥失败: {e}")
+        logger.error("获取WBI签名密钥失败: %s", e)
         # 这里应该返回一个默认值或者抛出异常，实际应用中需要更健壮的处理
         return "254359c43777d8f2b0e9e3f7d4a5b6c7"
 
@@ -67,8 +68,72 @@ def convert_duration_to_seconds(duration_str):
             hours, minutes, seconds = parts
             return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
         else:
-            logger.warning(f"无法解析时长格式: {duration_str}")
+            logger.warning("无法解析时长格式: %s", duration_str)
             return 0
     except Exception as e:
-        logger.error(f"转换时长时出错: {e}")
-        return 0
\ No newline at end of file
+        logger.error("转换时长时出错: %s", e)
+        return 0
+
+
+def format_duration(seconds):
+    """
+    将秒数格式化为时长字符串
+    :param seconds: 秒数
+    :return: 'MM:SS' 格式的字符串（分钟数可超过60），如 '125:07'
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+def thumbnail_filename(video, sample_idx, image_format):
+    """
+    生成缩略图文件名，格式为 "发布时间_BV(索引).格式"，例如 "2021-10-06_BV1xx4xx(1).webp"
+
+    :param video: VideoRecord，或包含 created_str 与 bvid 的字典（任务队列中的视频）
+    :param sample_idx: 采样点序号（从0开始）
+    :param image_format: 图片格式
+    """
+    publish_date = video['created_str'].split(' ')[0]  # 只取日期部分
+    return f"{publish_date}_{video['bvid']}({sample_idx + 1}).{image_format}"
+
+
+def locate_frame(index_list, time_in_seconds, img_w, img_h, img_x_cnt, img_y_cnt, sheet_count):
+    """
+    按时间计算缩略图所在的瓦片图及其逻辑坐标
+
+    :param index_list: videoshot 的 index 列表（每一格对应的时间点，升序）
+    :param sheet_count: 瓦片图数量
+    :return: (瓦片图序号, 逻辑x, 逻辑y)
+    """
+    target_idx = max(0, bisect.bisect_right(index_list, time_in_seconds) - 1)
+    pics_per_sheet = img_x_cnt * img_y_cnt
+    sheet_index = min(target_idx // pics_per_sheet, sheet_count - 1)
+    inner_index = target_idx % pics_per_sheet
+    return sheet_index, (inner_index % img_x_cnt) * img_w, (inner_index // img_x_cnt) * img_h
+
+
+def physical_box(logic_x, logic_y, img_w, img_h, img_x_cnt, img_y_cnt, real_w, real_h):
+    """
+    按瓦片图实际像素校准逻辑坐标，返回物理裁剪框 (left, top, right, bottom)
+
+    部分高清 WebP 瓦片图的物理像素是 API 声明的 2 倍或更多，通过总宽度除以列数重新计算每一格的物理尺寸
+    """
+    scale_w = real_w / (img_w * img_x_cnt)
+    scale_h = real_h / (img_h * img_y_cnt)
+    phys_x = int(logic_x * scale_w)
+    phys_y = int(logic_y * scale_h)
+    return phys_x, phys_y, phys_x + int(img_w * scale_w), phys_y + int(img_h * scale_h)
+
+
+def parse_channel_url(url):
+    """
+    解析UP主空间或合集链接
+
+    :param url: 例如 https://space.bilibili.com/123 或 https://space.bilibili.com/123/lists/456
+    :return: (UP主ID, 合集ID或None)；无法解析UP主ID时返回None
+    """
+    up_id_match = re.search(r'space\.bilibili\.com/?(\d+)', url)
+    if not up_id_match:
+        return None
+    list_id_match = re.search(r'/lists/?(\d+)', url)
+    return up_id_match.group(1), list_id_match.group(1) if list_id_match else None
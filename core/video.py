@@ -0,0 +1,71 @@
+"""
+视频记录模块
+列表阶段为每个视频只保存一条紧凑记录：bvid、标题、时长（整数秒）、发布时间戳与播放量。
+发布时间字符串、视频链接等派生字段在访问时才计算，上万个视频的频道列表不再为每个视频保存多份派生字符串，
+时长也不再在“秒数 -> 'MM:SS' -> 秒数”之间反复转换。
+"""
+from datetime import datetime
+
+from core.utils import convert_duration_to_seconds, format_duration
+
+
+class VideoRecord:
+    """列表中的一个视频，兼容按键读取（record['bvid']、record.get('title')），可直接替代原来的视频字典"""
+
+    __slots__ = ('bvid', 'title', 'duration', 'created', 'play')
+
+    def __init__(self, bvid, title, duration, created, play=0):
+        """
+        :param bvid: BV号
+        :param title: 标题
+        :param duration: 时长（整数秒）；也接受 '3:45' / '1:23:45' 形式的字符串，构造时只解析一次
+        :param created: 发布时间戳（秒）
+        :param play: 播放量
+        """
+        if isinstance(duration, str):
+            duration = convert_duration_to_seconds(duration)
+        self.bvid = bvid
+        self.title = title
+        self.duration = int(duration)
+        self.created = int(created)
+        self.play = int(play or 0)
+
+    @property
+    def created_str(self):
+        return datetime.fromtimestamp(self.created).strftime('%Y-%m-%d %H:%M:%S')
+
+    @property
+    def date(self):
+        """发布日期 YYYY-MM-DD"""
+        return datetime.fromtimestamp(self.created).strftime('%Y-%m-%d')
+
+    @property
+    def video_url(self):
+        return f"https://www.bilibili.com/video/{self.bvid}"
+
+    @property
+    def duration_str(self):
+        return format_duration(self.duration)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        """转换为可序列化的字典（例如写入任务队列），包含 created_str 以兼容按文件名使用它的代码"""
+        return {
+            'bvid': self.bvid,
+            'title': self.title,
+            'duration': self.duration,
+            'created': self.created,
+            'created_str': self.created_str,
+            'play': self.play,
+        }
+
+    def __repr__(self):
+        return f"VideoRecord({self.bvid!r}, {self.title!r}, duration={self.duration}, created={self.created})"
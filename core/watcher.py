@@ -0,0 +1,389 @@
+"""
+频道监视模块
+常驻运行，定期检查每个UP主/合集的第1页，只为新投稿提取缩略图：
+
+- 发布时间水位：每个UP主记录已处理的最新发布时间，第1页中晚于水位的视频即为新投稿；
+  第1页全是新视频时才继续向后翻页，直到回到水位
+- 合集可以加入发布时间较早的视频，因此合集改为记录已知的BV号，不在其中的视频即为新加入；
+  视频总数的增加没有全部体现在第1页时完整翻页
+- 条件请求：服务端返回 ETag / Last-Modified 时，下次轮询带上 If-None-Match / If-Modified-Since，304 即视为没有变化
+- 轮询间隔退避：没有新投稿时间隔按倍数增长到上限，发现新投稿后恢复为最小间隔，不活跃的频道几乎不产生请求
+- 共享请求预算：所有频道的轮询、翻页、元数据与瓦片图请求共用一个限流器
+- 刚发布的视频可能还没有生成瓦片图，提取失败的视频在之后的轮询中重试
+
+状态（水位、校验值、间隔、待重试视频）保存在 JSON 文件中，重启后继续。
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from config import (API_BASE_URL, MAX_QPS, OUTPUT_DIR, IMAGE_FORMAT, WATCH_STATE_PATH, WATCH_MIN_INTERVAL,
+                    WATCH_MAX_INTERVAL, WATCH_BACKOFF, WATCH_PAGE_SIZE, WATCH_MAX_RETRIES)
+from core.capture import CaptureRunner
+from core.catalog import up_source, series_source
+from core.indexer import VideoIndexer, RequestLimiter
+from core.metrics import MetricsRegistry
+from core.retry import RequestError, RetryableError
+from core.runtime import MetadataCache
+from core.utils import parse_channel_url
+from core.video import VideoRecord
+
+logger = logging.getLogger(__name__)
+
+# 轮询间隔的随机抖动比例，避免多个频道总在同一时刻轮询
+INTERVAL_JITTER = 0.1
+
+
+class ChannelState:
+    """一个被监视频道的轮询状态"""
+
+    def __init__(self, up_id, list_id=None, interval=WATCH_MIN_INTERVAL):
+        self.up_id = up_id
+        self.list_id = list_id
+        self.watermark = None  # 已处理的最新发布时间戳，None 表示尚未建立
+        self.seen = []  # 发布时间等于水位的BV号（同一秒发布的多个视频）
+        self.known = None  # 合集中已处理的BV号集合，None 表示尚未完整翻页建立（UP主频道不使用）
+        self.validators = {}  # 条件请求的校验值（etag / last_modified）
+        self.total = None  # 上次轮询时的视频总数
+        self.interval = interval
+        self.next_poll = 0.0  # 下次轮询的时间（time.time() 时间轴）
+        self.pending = {}  # BV号 -> {'video': 视频字典, 'attempts': 已尝试次数}，提取失败待重试
+
+    @property
+    def key(self):
+        return series_source(self.list_id) if self.list_id else up_source(self.up_id)
+
+    def is_new(self, video):
+        if self.watermark is None or video['bvid'] in self.pending:
+            return False
+        if self.known is not None:
+            return video['bvid'] not in self.known
+        return video['created'] > self.watermark or (video['created'] == self.watermark
+                                                     and video['bvid'] not in self.seen)
+
+    def advance(self, videos):
+        """把水位推进到这些视频中最新的发布时间，合集同时登记这些BV号"""
+        if self.known is not None:
+            self.known.update(video['bvid'] for video in videos)
+        for video in videos:
+            if self.watermark is None or video['created'] > self.watermark:
+                self.watermark = video['created']
+                self.seen = [video['bvid']]
+            elif video['created'] == self.watermark and video['bvid'] not in self.seen:
+                self.seen.append(video['bvid'])
+
+    def to_dict(self):
+        return {
+            'up_id': self.up_id,
+            'list_id': self.list_id,
+            'watermark': self.watermark,
+            'seen': self.seen,
+            'known': sorted(self.known) if self.known is not None else None,
+            'validators': self.validators,
+            'total': self.total,
+            'interval': self.interval,
+            'next_poll': self.next_poll,
+            'pending': self.pending,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data['up_id'], data.get('list_id'))
+        state.watermark = data.get('watermark')
+        state.seen = data.get('seen') or []
+        known = data.get('known')
+        state.known = set(known) if known is not None else None
+        state.validators = data.get('validators') or {}
+        state.total = data.get('total')
+        state.interval = data.get('interval') or WATCH_MIN_INTERVAL
+        state.next_poll = data.get('next_poll') or 0.0
+        state.pending = data.get('pending') or {}
+        return state
+
+
+class ChannelWatcher:
+    """
+    频道监视器
+
+    用法::
+
+        async with create_session(cookie) as session:
+            watcher = ChannelWatcher(session, ['https://space.bilibili.com/123'], cookie=cookie)
+            await watcher.run()
+    """
+
+    def __init__(self, session, channels, cookie="", qps=MAX_QPS, output_dir=OUTPUT_DIR, image_format=IMAGE_FORMAT,
+                 state_path=WATCH_STATE_PATH, min_interval=WATCH_MIN_INTERVAL, max_interval=WATCH_MAX_INTERVAL,
+                 backoff=WATCH_BACKOFF, page_size=WATCH_PAGE_SIZE, max_retries=WATCH_MAX_RETRIES,
+                 metrics=None, stop_flag=None, on_log=None, api_base=API_BASE_URL, page_delay=3.0,
+                 runner_options=None):
+        """
+        :param session: aiohttp会话
+        :param channels: UP主空间或合集链接列表
+        :param qps: 所有频道共享的每秒请求数（轮询、翻页、元数据与瓦片图合计）
+        :param state_path: 状态文件路径
+        :param min_interval: 最小轮询间隔（秒），发现新投稿后恢复为该值
+        :param max_interval: 最大轮询间隔（秒）
+        :param backoff: 没有新投稿时轮询间隔的增长倍数
+        :param page_size: 轮询时第1页的大小
+        :param max_retries: 新投稿提取失败时最多尝试的次数
+        :param stop_flag: threading.Event，置位后尽快停止
+        :param on_log: 日志回调，接收一条消息字符串
+        :param runner_options: 传给 CaptureRunner 的其他参数（例如 archive、manifest_formats）
+        """
+        self.session = session
+        self.cookie = cookie
+        self.output_dir = output_dir
+        self.image_format = image_format
+        self.state_path = state_path
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = max(1.0, backoff)
+        self.page_size = page_size
+        self.max_retries = max(1, max_retries)
+        self.metrics = metrics or MetricsRegistry()
+        self.stop_flag = stop_flag
+        self.on_log = on_log
+        self.api_base = api_base
+        self.runner_options = runner_options or {}
+
+        self.limiter = RequestLimiter(qps)
+        # WBI密钥在轮询之间复用
+        self.indexer = VideoIndexer(session=session, cookie=cookie, metrics=self.metrics, api_base=api_base,
+                                    page_delay=page_delay, metadata=MetadataCache(metrics=self.metrics),
+                                    limiter=self.limiter)
+        self.states = self._load_states(channels)
+
+    def log(self, message):
+        if self.on_log:
+            self.on_log(message)
+        else:
+            logger.info(message)
+
+    def stopped(self):
+        return self.stop_flag is not None and self.stop_flag.is_set()
+
+    def _load_states(self, channels):
+        saved = {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("读取监视状态 %s 失败，重新开始: %s", self.state_path, e)
+
+        states = {}
+        for url in channels:
+            parsed = parse_channel_url(url)
+            if parsed is None:
+                logger.warning("无法解析频道链接，已跳过: %s", url)
+                continue
+            state = ChannelState(*parsed, interval=self.min_interval)
+            if state.key in saved:
+                state = ChannelState.from_dict(saved[state.key])
+            states[state.key] = state
+        return states
+
+    def save_states(self):
+        """原子写入状态文件，失败时只记录日志（内存中的状态仍然有效，下次轮询后再写）"""
+        temp_path = self.state_path + '.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({key: state.to_dict() for key, state in self.states.items()}, f, ensure_ascii=False,
+                          indent=2)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            logger.error("保存监视状态 %s 失败: %s", self.state_path, e)
+
+    async def run(self, once=False):
+        """
+        按各频道的轮询时间依次轮询，直到收到停止信号
+
+        :param once: 为True时每个频道只轮询一次（忽略轮询时间），之后返回
+        :return: 本次运行提取的新视频数
+        """
+        if not self.states:
+            self.log("没有可监视的频道")
+            return 0
+        self.log(f"开始监视 {len(self.states)} 个频道，状态文件: {self.state_path}")
+        extracted = 0
+        if once:
+            for state in list(self.states.values()):
+                if self.stopped():
+                    break
+                extracted += await self.poll(state)
+            return extracted
+
+        while not self.stopped():
+            state = min(self.states.values(), key=lambda s: s.next_poll)
+            delay = state.next_poll - time.time()
+            if delay > 0:
+                await self._sleep(delay)
+                continue
+            extracted += await self.poll(state)
+        return extracted
+
+    async def _sleep(self, delay):
+        """可被停止信号打断的等待"""
+        deadline = time.monotonic() + delay
+        while not self.stopped():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(1.0, remaining))
+
+    async def poll(self, state):
+        """
+        轮询一个频道，提取新投稿并安排下次轮询，返回提取成功的新视频数
+
+        本次得到的校验值与视频总数只在水位推进（或确认没有新投稿）后才写回状态：
+        提取被中断或失败时保留旧值，下次轮询不会因 304 或总数未变而漏掉这些视频
+        """
+        validators = dict(state.validators)
+        try:
+            new_videos, total = await self._find_new_videos(state, validators)
+            retries = [VideoRecord(**entry['video']) for entry in state.pending.values()]
+            committed = True
+            extracted = 0
+            if new_videos or retries:
+                if new_videos:
+                    self.log(f"{state.key} 发现 {len(new_videos)} 个新投稿")
+                committed, extracted = await self._extract(state, new_videos, retries)
+        except Exception as e:
+            # 单个频道的任何失败都不能终止整个监视进程，按没有新投稿退避后重试
+            logger.error("轮询 %s 失败: %s", state.key, e, exc_info=not isinstance(e, RequestError))
+            self._schedule(state, active=False)
+            self.save_states()
+            return 0
+
+        if committed:
+            state.validators = validators
+            if total is not None:
+                state.total = total
+        self._schedule(state, active=bool(new_videos))
+        self.save_states()
+        return extracted
+
+    async def _find_new_videos(self, state, validators):
+        """
+        :param validators: 条件请求校验值的副本，收到新的校验值时就地更新
+        :return: (新投稿列表, 视频总数)
+        :raises RequestError: 第1页或补充翻页失败
+        """
+        videos, total = await self.indexer.get_latest_videos(state.up_id, state.list_id, validators,
+                                                             page_size=self.page_size)
+        if videos is None:
+            logger.debug("%s 未变化（304）", state.key)
+            return [], None
+        if state.list_id and state.known is None:
+            return await self._list_collection(state, total), total
+        if state.watermark is None:
+            # 首次监视：只建立水位，不回溯已有视频
+            state.advance(videos)
+            if state.watermark is not None:
+                self.log(f"{state.key} 水位: {datetime.fromtimestamp(state.watermark):%Y-%m-%d %H:%M:%S}")
+            return [], total
+
+        new_videos = [video for video in videos if state.is_new(video)]
+        if state.list_id:
+            # 合集不按发布时间排序：总数增加的部分没有全部出现在第1页时，完整翻页
+            grown = total - state.total if total is not None and state.total is not None else 0
+            need_listing = grown > len(new_videos)
+        else:
+            # 投稿列表按发布时间倒序：第1页全是新视频时，后面的页可能还有
+            need_listing = len(videos) >= self.page_size and len(new_videos) == len(videos)
+        if need_listing:
+            if state.list_id:
+                return await self._list_collection(state, total), total
+            listed = await self.indexer.get_videos_by_up_id(state.up_id,
+                                                            start_time=datetime.fromtimestamp(state.watermark))
+            if listed is None:
+                # 只处理第1页会把水位推进到最新视频，中间的视频再也不会被发现，整次轮询按失败处理
+                raise RetryableError(f"{state.key} 补充翻页失败")
+            new_videos = [video for video in listed if state.is_new(video)]
+        return new_videos, total
+
+    async def _list_collection(self, state, total):
+        """
+        完整翻页合集（不按发布时间过滤），用列出的BV号重建已知集合
+
+        首次监视时全部登记为已知；从旧版本状态文件（只有水位）恢复时，晚于水位的视频仍按新投稿处理。
+        新投稿不加入已知集合，提取成功后才由 advance 登记，中断时下次轮询重新发现。
+
+        :param total: 第1页返回的视频总数
+        :return: 新投稿列表
+        :raises RetryableError: 翻页失败
+        """
+        listed = await self.indexer.get_videos_by_collection(state.up_id, state.list_id)
+        if listed is None or (total and not listed):
+            # 空列表会让已知集合清空，之后整个合集都被当作新投稿
+            raise RetryableError(f"{state.key} 补充翻页失败")
+        if state.watermark is None:
+            # 首次监视：只建立已知集合与水位，不回溯已有视频
+            state.known = set()
+            state.advance(listed)
+            self.log(f"{state.key} 已登记 {len(state.known)} 个视频")
+            return []
+        new_videos = [video for video in listed if state.is_new(video)]
+        new_bvids = {video['bvid'] for video in new_videos}
+        # 已移出合集的BV号随之丢弃
+        state.known = {video['bvid'] for video in listed} - new_bvids
+        return new_videos
+
+    async def _extract(self, state, new_videos, retries):
+        """
+        提取新投稿与待重试的视频，并推进水位
+
+        :return: (是否推进了水位, 提取成功的视频数)；被停止时水位不变
+        """
+        runner = CaptureRunner(
+            session=self.session,
+            up_id=state.up_id,
+            list_id=state.list_id,
+            cookie=self.cookie,
+            output_dir=self.output_dir,
+            image_format=self.image_format,
+            metrics=self.metrics,
+            stop_flag=self.stop_flag,
+            on_log=self.on_log,
+            api_base=self.api_base,
+            catalog_path=None,
+            limiter=self.limiter,
+            **self.runner_options,
+        )
+        completed = await runner.run(videos=new_videos + retries)
+        if not completed:
+            # 被停止：不推进水位，下次启动时重新发现
+            return False, 0
+
+        failed = {video['bvid'] for video in runner.failed_videos}
+        for video in new_videos + retries:
+            if video['bvid'] not in failed:
+                state.pending.pop(video['bvid'], None)
+                continue
+            entry = state.pending.setdefault(video['bvid'], {
+                'video': {key: video[key] for key in ('bvid', 'title', 'duration', 'created', 'play')},
+                'attempts': 0,
+            })
+            entry['attempts'] += 1
+            if entry['attempts'] >= self.max_retries:
+                logger.warning("%s 已尝试 %s 次仍失败，不再重试", video['bvid'], entry['attempts'])
+                del state.pending[video['bvid']]
+        state.advance(new_videos)
+        return True, runner.success_count
+
+    def _schedule(self, state, active):
+        """安排下次轮询：有新投稿时恢复最小间隔，否则按倍数退避"""
+        if active:
+            state.interval = self.min_interval
+        else:
+            state.interval = min(self.max_interval, state.interval * self.backoff)
+        # 有待重试的视频时不退避到太久
+        interval = min(state.interval, self.min_interval * self.backoff) if state.pending else state.interval
+        state.next_poll = time.time() + interval * random.uniform(1 - INTERVAL_JITTER, 1 + INTERVAL_JITTER)
+        logger.debug("%s 下次轮询: %.0f 秒后", state.key, interval)
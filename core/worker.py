@@ -0,0 +1,149 @@
+"""
+任务队列 worker
+从 JobQueue 领取视频任务并用 ThumbnailExtractor 提取缩略图。
+可在同一台或多台机器上启动多个 worker 进程，所有请求共同遵守队列库中的全局QPS预算。
+"""
+import asyncio
+import logging
+import os
+
+from config import API_BASE_URL
+from core.extractor import ThumbnailExtractor
+from core.job_queue import SharedRateLimiter, default_worker_id
+from core.metrics import MetricsRegistry
+from core.retry import RetryEngine
+from core.utils import thumbnail_filename
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """任务队列消费者"""
+
+    def __init__(self, queue, session, cookie="", qps=4, concurrency=1, worker_id=None, metrics=None,
+                 api_base=API_BASE_URL, stop_flag=None, drain=True, poll_interval=5.0):
+        """
+        :param queue: JobQueue
+        :param session: aiohttp会话
+        :param qps: 全局请求预算（所有 worker 合计的每秒请求数）
+        :param concurrency: 本进程同时处理的任务数
+        :param worker_id: worker 标识，默认使用 主机名:进程号
+        :param stop_flag: threading.Event，置位后不再领取新任务
+        :param drain: 为True时队列为空即退出，否则每隔 poll_interval 秒重新检查
+        """
+        self.queue = queue
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = max(1, concurrency)
+        self.metrics = metrics or MetricsRegistry()
+        self.stop_flag = stop_flag
+        self.drain = drain
+        self.poll_interval = poll_interval
+        self.extractor = ThumbnailExtractor(session=session, cookie=cookie, metrics=self.metrics, api_base=api_base,
+                                            retry=RetryEngine(metrics=self.metrics),
+                                            limiter=SharedRateLimiter(queue, qps))
+        self.done_count = 0
+        self.fail_count = 0
+
+    def stopped(self):
+        return self.stop_flag is not None and self.stop_flag.is_set()
+
+    async def run(self):
+        """运行直到队列为空（drain）或收到停止信号，返回 (完成数, 失败数)"""
+        logger.info("worker %s 启动，并发 %s", self.worker_id, self.concurrency)
+        await asyncio.gather(*(self._loop() for _ in range(self.concurrency)))
+        logger.info("worker %s 退出：完成 %s 个任务，失败 %s 个", self.worker_id, self.done_count, self.fail_count)
+        return self.done_count, self.fail_count
+
+    async def _queue_call(self, func, *args):
+        """
+        在线程池中执行任务队列操作
+
+        写操作使用 BEGIN IMMEDIATE，其他 worker 持有写锁时最多等待30秒，不能阻塞事件循环上的提取与续租
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _loop(self):
+        while not self.stopped():
+            job = await self._queue_call(self.queue.lease, self.worker_id)
+            if job is None:
+                # 还有失败后退避中的任务时，drain 模式也要等它们到期后重试
+                delay = await self._queue_call(self.queue.retry_delay)
+                if delay is None and self.drain:
+                    return
+                await asyncio.sleep(self.poll_interval if delay is None else min(delay, self.poll_interval))
+                continue
+
+            task = asyncio.create_task(self.process_job(job))
+            heartbeat = asyncio.create_task(self._heartbeat(job, task))
+            try:
+                success, error = await task
+            except asyncio.CancelledError:
+                if heartbeat.done() and not heartbeat.cancelled() and heartbeat.result():
+                    # 租约已被其他 worker 接管：放弃本次处理，也不再提交结果
+                    logger.warning("任务 %s（%s）的租约已失效，已停止处理", job.id, job.bvid)
+                    continue
+                # 不归还租约，超时后任务自动重新入队
+                raise
+            except Exception as e:
+                logger.error("任务 %s（%s）出错: %s", job.id, job.bvid, e)
+                success, error = False, str(e)
+            finally:
+                heartbeat.cancel()
+
+            status = await self._queue_call(self.queue.complete, job, self.worker_id, success, error)
+            if success:
+                self.done_count += 1
+            else:
+                self.fail_count += 1
+                logger.warning("任务 %s（%s）第 %s 次失败，状态: %s", job.id, job.bvid, job.attempts, status)
+
+    async def _heartbeat(self, job, task):
+        """
+        在租约过期前定期续租，防止长任务被其他 worker 重复领取
+
+        续租失败说明租约已过期并可能被其他 worker 领取，取消本地处理避免两个 worker 同时处理同一任务
+        :return: 是否因租约失效而取消了任务
+        """
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            if not await self._queue_call(self.queue.renew, job, self.worker_id):
+                task.cancel()
+                return True
+
+    async def process_job(self, job):
+        """
+        提取任务中的全部采样点；已存在的输出文件会跳过，因此重新入队的任务可以安全重跑
+
+        :return: (是否全部成功, 错误描述)
+        """
+        payload = job.payload
+        video = payload['video']
+        output_dir = payload['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+
+        failed = []
+        commits = []
+        for sample_idx, sample_time in enumerate(payload['sample_times']):
+            output_filename = thumbnail_filename(video, sample_idx, payload['image_format'])
+            output_path = os.path.join(output_dir, output_filename)
+            if os.path.exists(output_path):
+                continue
+            commit = await self.extractor.extract_thumbnail_at_time(
+                bvid=video['bvid'],
+                time_in_seconds=sample_time,
+                output_path=output_path
+            )
+            if commit is None:
+                failed.append(output_filename)
+            else:
+                commits.append((output_filename, commit))
+        # 任务标记完成前提交批次，并确认每个文件都已以正式文件名落盘
+        await self.extractor.writer.flush()
+        for output_filename, commit in commits:
+            if not await commit:
+                failed.append(output_filename)
+
+        if failed:
+            return False, f"提取失败: {', '.join(failed)}"
+        return True, None
@@ -0,0 +1,190 @@
+"""
+原子写盘模块
+缩略图在内存中编码并校验后交给写盘线程池：先写入同目录下的临时文件，
+攒够一批（或超过时间间隔）后统一 fsync，再重命名为正式文件名并同步目录。
+磁盘延迟不会阻塞事件循环，进程崩溃时也只会留下 .part 临时文件，不会出现看似完整的半截图片。
+
+write() 返回的 Future 在所属批次提交后才得到结果（是否成功重命名），调用方据此判断文件是否真正落盘，
+而不是只看临时文件是否写出。
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from config import (PIPELINE_WRITE_WORKERS, WRITER_FSYNC, WRITER_FSYNC_BATCH, WRITER_FSYNC_INTERVAL,
+                    WRITER_STALE_TEMP_AGE)
+
+logger = logging.getLogger(__name__)
+
+TEMP_SUFFIX = '.part'
+
+
+def remove_stale_temp_files(directory, max_age=WRITER_STALE_TEMP_AGE):
+    """
+    删除异常退出的进程遗留的临时文件，返回删除的数量
+
+    临时文件名中带有写入进程的 pid（见 AtomicWriter.write_sync）：只删除写入进程已不存在的文件，
+    以及超过 max_age 秒未修改的文件（pid 可能被复用），不会删除其他正在运行的进程（或本进程）尚未提交的文件
+    """
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    now = time.time()
+    for name in names:
+        if not name.endswith(TEMP_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if not _writer_exited(name) and now - os.path.getmtime(path) < max_age:
+                continue
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info("已清理 %s 个未完成的临时文件", removed)
+    return removed
+
+
+def _writer_exited(name):
+    """根据临时文件名中的 pid 判断写入进程是否已退出，无法判断时返回False"""
+    parts = name[:-len(TEMP_SUFFIX)].rsplit('.', 2)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return False
+    pid = int(parts[1])
+    # Windows 上 os.kill 会直接结束目标进程，只能按修改时间判断
+    if pid == os.getpid() or os.name != 'posix':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # 没有权限发送信号说明进程存在
+        return False
+    return False
+
+
+class AtomicWriter:
+    """临时文件 + 重命名的批量写盘器"""
+
+    def __init__(self, workers=PIPELINE_WRITE_WORKERS, fsync=WRITER_FSYNC, batch_size=WRITER_FSYNC_BATCH,
+                 interval=WRITER_FSYNC_INTERVAL, metrics=None):
+        """
+        :param workers: 写盘线程数
+        :param fsync: 是否在重命名前 fsync，关闭后只保证原子性不保证掉电持久
+        :param batch_size: 每批提交的文件数
+        :param interval: 距上次提交超过该秒数时，即使未攒满也提交
+        :param metrics: 可选的指标注册表，记录 fsync 批次耗时
+        """
+        self.fsync = fsync
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='writer')
+        self._lock = threading.Lock()
+        self._pending = []  # [(临时路径, 正式路径, 提交结果 Future)]
+        self._last_commit = time.monotonic()
+
+    async def write(self, path, data):
+        """
+        在写盘线程中写入临时文件并登记到当前批次
+
+        :return: asyncio.Future，批次提交后结果为是否成功重命名为正式文件名（需要 flush() 或后续写入触发提交）
+        :raises OSError: 临时文件写入失败
+        """
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(self._executor, self.write_sync, path, data)
+        return asyncio.wrap_future(future, loop=loop)
+
+    async def flush(self, due_only=False):
+        """
+        提交当前批次，返回后所有已写入的文件都已提交（成功时以正式文件名存在）
+
+        :param due_only: 只在距上次提交超过 interval 时提交，用于定期调用，避免空闲时批次一直不提交
+        :return: 本次提交失败的正式路径列表
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.flush_sync, due_only)
+
+    def write_sync(self, path, data):
+        """写入临时文件并登记到当前批次，返回 concurrent.futures.Future（提交后结果为是否成功）"""
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}{TEMP_SUFFIX}"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+
+        future = Future()
+        batch = None
+        with self._lock:
+            self._pending.append((temp_path, path, future))
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_commit >= self.interval:
+                batch, self._pending = self._pending, []
+                self._last_commit = time.monotonic()
+        if batch:
+            self._commit(batch)
+        return future
+
+    def flush_sync(self, due_only=False):
+        with self._lock:
+            if due_only and time.monotonic() - self._last_commit < self.interval:
+                return []
+            batch, self._pending = self._pending, []
+            self._last_commit = time.monotonic()
+        return self._commit(batch) if batch else []
+
+    def close(self):
+        """提交剩余文件并关闭线程池"""
+        self.flush_sync()
+        self._executor.shutdown(wait=True)
+
+    def _commit(self, batch):
+        """fsync 并重命名一批文件，返回失败的正式路径列表；每个文件的结果写入其 Future"""
+        started = time.perf_counter()
+        directories = set()
+        results = []
+        for temp_path, path, future in batch:
+            try:
+                if self.fsync:
+                    fd = os.open(temp_path, os.O_RDWR)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                os.replace(temp_path, path)
+                directories.add(os.path.dirname(os.path.abspath(path)))
+                results.append(True)
+            except OSError as e:
+                logger.error("提交 %s 失败: %s", path, e)
+                _remove_quietly(temp_path)
+                results.append(False)
+
+        if self.fsync and os.name == 'posix':
+            # 同步目录项，保证重命名本身也已落盘
+            for directory in directories:
+                try:
+                    fd = os.open(directory, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+
+        if self.metrics is not None:
+            self.metrics.observe('fsync_batch', time.perf_counter() - started)
+        # 目录同步完成后再公布结果，等待方拿到 True 时重命名已经落盘
+        for (_, _, future), success in zip(batch, results):
+            future.set_result(success)
+        return [path for (_, path, _), success in zip(batch, results) if not success]
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -2,44 +2,239 @@
 """
 Bilibili视频缩略图提取器
 主入口文件
+
+不带参数时启动图形界面；分布式模式使用子命令：
+    python main.py enqueue --up-id 123 [--list-id 456] [--start 2024-01-01] [--end 2024-12-31]
+    python main.py worker [--concurrency 4]
+    python main.py status
+    python main.py plan --up-id 123 [--list-id 456] [--start 2024-01-01] [--end 2024-12-31]   # 预估请求数与耗时
+    python main.py gallery [--output-dir ./output/]   # 为已有缩略图重建预览画廊
+    python main.py watch [--url https://space.bilibili.com/123 ...] [--once]   # 常驻监视新投稿
 """
-import sys
+import argparse
+import asyncio
+import json
 import logging
+import os
+from datetime import datetime
 
 # 导入配置和UI
-from config import LOG_LEVEL
-from ui import BilibiliCaptureUI
+from config import (LOG_LEVEL, LOG_FILE, LOG_STRUCTURED, JOB_QUEUE_PATH, JOB_QUEUE_SHARED_STORAGE, MAX_QPS,
+                    OUTPUT_DIR, IMAGE_FORMAT, WATCH_CHANNELS, WATCH_STATE_PATH, load_user_config)
+from core.logging_utils import setup_logging as setup_queue_logging
 
 
 def setup_logging():
-    """配置日志"""
-    log_level = getattr(logging, LOG_LEVEL.upper(), logging.INFO)
+    """配置日志（文件与控制台写入由后台线程完成）"""
+    setup_queue_logging(level=LOG_LEVEL, log_file=LOG_FILE, structured=LOG_STRUCTURED)
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Bilibili视频缩略图提取器')
+    subparsers = parser.add_subparsers(dest='command')
+
+    enqueue = subparsers.add_parser('enqueue', help='获取视频列表并写入任务队列')
+    enqueue.add_argument('--up-id', required=True, help='UP主ID')
+    enqueue.add_argument('--list-id', default=None, help='合集ID，为空时获取全部投稿')
+    enqueue.add_argument('--start', type=parse_date, default=None, help='开始日期 YYYY-MM-DD')
+    enqueue.add_argument('--end', type=parse_date, default=None, help='结束日期 YYYY-MM-DD（含当天）')
+    enqueue.add_argument('--output-dir', default=None, help='缩略图输出目录')
+    enqueue.add_argument('--image-format', default=None, help='输出图片格式')
+
+    worker = subparsers.add_parser('worker', help='从任务队列领取任务并提取缩略图')
+    worker.add_argument('--concurrency', type=int, default=1, help='本进程同时处理的任务数')
+    worker.add_argument('--watch', action='store_true', help='队列为空时继续等待新任务，而不是退出')
+
+    subparsers.add_parser('status', help='查看任务队列状态')
+
+    plan = subparsers.add_parser('plan', help='只获取视频列表，预估请求数、瓦片图数、字节数与耗时，不下载瓦片图')
+    plan.add_argument('--up-id', required=True, help='UP主ID')
+    plan.add_argument('--list-id', default=None, help='合集ID，为空时获取全部投稿')
+    plan.add_argument('--start', type=parse_date, default=None, help='开始日期 YYYY-MM-DD')
+    plan.add_argument('--end', type=parse_date, default=None, help='结束日期 YYYY-MM-DD（含当天）')
+    plan.add_argument('--output-dir', default=None, help='缩略图输出目录（其中的归档元数据与已有缩略图用于提高估算精度）')
+    plan.add_argument('--json', action='store_true', help='以JSON输出')
+
+    for sub in (enqueue, worker, plan):
+        sub.add_argument('--qps', type=int, default=None, help='每秒请求数（worker 为所有 worker 合计的全局预算）')
+        sub.add_argument('--cookie', default=None, help='Cookie，默认读取 user_config.json')
+    for sub in subparsers.choices.values():
+        sub.add_argument('--queue', default=JOB_QUEUE_PATH, help='任务队列数据库路径')
+        sub.add_argument('--shared-storage', action='store_true', default=JOB_QUEUE_SHARED_STORAGE,
+                         help='队列文件由多台机器通过网络存储共享（所有进程都需指定）')
+
+    gallery = subparsers.add_parser('gallery', help='扫描输出目录并更新预览画廊')
+    gallery.add_argument('--output-dir', default=None, help='缩略图输出目录')
+
+    watch = subparsers.add_parser('watch', help='常驻轮询频道，只为新投稿提取缩略图')
+    watch.add_argument('--url', action='append', default=None,
+                       help='UP主空间或合集链接，可重复；默认使用配置中的 WATCH_CHANNELS，再默认使用界面中的链接')
+    watch.add_argument('--output-dir', default=None, help='缩略图输出目录')
+    watch.add_argument('--qps', type=int, default=None, help='所有频道共享的每秒请求数')
+    watch.add_argument('--cookie', default=None, help='Cookie，默认读取 user_config.json')
+    watch.add_argument('--state', default=WATCH_STATE_PATH, help='监视状态文件路径')
+    watch.add_argument('--once', action='store_true', help='每个频道只轮询一次后退出（可由 cron 等定时调用）')
+    return parser.parse_args(argv)
+
+
+async def run_enqueue(args, user_config):
+    from core.capture import CaptureRunner, create_session
+    from core.job_queue import JobQueue
+
+    cookie = args.cookie if args.cookie is not None else user_config.get('cookie', '')
+    end_time = args.end.replace(hour=23, minute=59, second=59) if args.end else None
+    queue = JobQueue(args.queue, shared_storage=args.shared_storage)
+    try:
+        async with create_session(cookie) as session:
+            runner = CaptureRunner(
+                session=session,
+                up_id=args.up_id,
+                list_id=args.list_id,
+                start_time=args.start,
+                end_time=end_time,
+                cookie=cookie,
+                qps=args.qps or user_config.get('max_qps', MAX_QPS),
+                output_dir=args.output_dir or user_config.get('output_dir', OUTPUT_DIR),
+                image_format=args.image_format or user_config.get('image_format', IMAGE_FORMAT),
+                on_log=print,
+            )
+            added = await runner.enqueue(queue)
+        print(f"队列状态: {queue.stats()}")
+        return added is not None
+    finally:
+        queue.close()
 
-    logging.basicConfig(
-        level=log_level,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bb_capture.log', encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
 
+async def run_worker(args, user_config):
+    from core.capture import create_session
+    from core.job_queue import JobQueue
+    from core.worker import Worker
 
-def main():
+    cookie = args.cookie if args.cookie is not None else user_config.get('cookie', '')
+    queue = JobQueue(args.queue, shared_storage=args.shared_storage)
+    try:
+        async with create_session(cookie) as session:
+            worker = Worker(
+                queue=queue,
+                session=session,
+                cookie=cookie,
+                qps=args.qps or user_config.get('max_qps', MAX_QPS),
+                concurrency=args.concurrency,
+                drain=not args.watch,
+            )
+            done, failed = await worker.run()
+        print(f"完成 {done} 个任务，失败 {failed} 个；队列状态: {queue.stats()}")
+        return True
+    finally:
+        queue.close()
+
+
+async def run_plan(args, user_config):
+    from core.capture import CaptureRunner, create_session
+
+    cookie = args.cookie if args.cookie is not None else user_config.get('cookie', '')
+    end_time = args.end.replace(hour=23, minute=59, second=59) if args.end else None
+    async with create_session(cookie) as session:
+        runner = CaptureRunner(
+            session=session,
+            up_id=args.up_id,
+            list_id=args.list_id,
+            start_time=args.start,
+            end_time=end_time,
+            cookie=cookie,
+            qps=args.qps or user_config.get('max_qps', MAX_QPS),
+            output_dir=args.output_dir or user_config.get('output_dir', OUTPUT_DIR),
+            on_log=None if args.json else print,
+        )
+        plan = await runner.plan()
+    if plan is None:
+        return False
+    if args.json:
+        print(json.dumps(plan.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print('\n'.join(plan.summary_lines()))
+    return True
+
+
+def run_gallery(args, user_config):
+    from core.gallery import GalleryBuilder
+
+    builder = GalleryBuilder(args.output_dir or user_config.get('output_dir', OUTPUT_DIR))
+    added = builder.scan()
+    builder.flush()
+    print(f"新增 {added} 张缩略图，画廊: {os.path.join(builder.gallery_dir, 'index.html')}")
+
+
+async def run_watch(args, user_config):
+    from core.capture import create_session
+    from core.watcher import ChannelWatcher
+
+    channels = args.url or list(WATCH_CHANNELS) or [url for url in [user_config.get('url')] if url]
+    cookie = args.cookie if args.cookie is not None else user_config.get('cookie', '')
+    async with create_session(cookie) as session:
+        watcher = ChannelWatcher(
+            session=session,
+            channels=channels,
+            cookie=cookie,
+            qps=args.qps or user_config.get('max_qps', MAX_QPS),
+            output_dir=args.output_dir or user_config.get('output_dir', OUTPUT_DIR),
+            image_format=user_config.get('image_format', IMAGE_FORMAT),
+            state_path=args.state,
+            on_log=print,
+        )
+        extracted = await watcher.run(once=args.once)
+    print(f"共提取 {extracted} 个新视频")
+
+
+def run_gui():
+    import tkinter as tk
+    from ui import BilibiliCaptureUI
+
+    root = tk.Tk()
+    app = BilibiliCaptureUI(root)
+    root.mainloop()
+
+
+def main(argv=None):
     """主函数"""
+    args = parse_args(argv)
+
     # 配置日志
     setup_logging()
     logger = logging.getLogger(__name__)
 
     try:
-        import tkinter as tk
-        root = tk.Tk()
-        app = BilibiliCaptureUI(root)
-        root.mainloop()
+        if args.command == 'enqueue':
+            return 0 if asyncio.run(run_enqueue(args, load_user_config())) else 1
+        if args.command == 'worker':
+            return 0 if asyncio.run(run_worker(args, load_user_config())) else 1
+        if args.command == 'plan':
+            return 0 if asyncio.run(run_plan(args, load_user_config())) else 1
+        if args.command == 'status':
+            from core.job_queue import JobQueue
+            queue = JobQueue(args.queue, shared_storage=args.shared_storage)
+            print(queue.stats())
+            queue.close()
+            return 0
+        if args.command == 'gallery':
+            run_gallery(args, load_user_config())
+            return 0
+        if args.command == 'watch':
+            try:
+                asyncio.run(run_watch(args, load_user_config()))
+            except KeyboardInterrupt:
+                print("已停止监视")
+            return 0
+        run_gui()
+        return 0
     except Exception as e:
-        logger.error(f"程序启动失败: {e}")
+        logger.error("程序启动失败: %s", e)
         raise
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,164 @@
+"""
+内存预算：准入、先到先得、预约增大的等待与互等的打破、取消时的清理
+"""
+import asyncio
+
+import pytest
+
+from core.memory import MemoryBudget
+
+
+async def settle():
+    """让已就绪的协程运行到下一个等待点"""
+    await asyncio.sleep(0.01)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_acquire_within_limit_and_release():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100, estimate_bytes=40)
+        first = await budget.acquire()
+        second = await budget.acquire(60)
+        assert budget.in_use == 100
+        first.release()
+        second.release()
+        assert budget.in_use == 0
+        assert budget.peak == 100
+    run(scenario())
+
+
+def test_oversized_request_is_capped_at_limit():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        reservation = await budget.acquire(500)
+        assert reservation.size == 100
+        reservation.release()
+    run(scenario())
+
+
+def test_waiters_are_admitted_in_order():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        held = await budget.acquire(90)
+        admitted = []
+
+        async def waiter(name, size):
+            reservation = await budget.acquire(size)
+            admitted.append(name)
+            return reservation
+
+        large = asyncio.create_task(waiter('large', 80))
+        await settle()
+        small = asyncio.create_task(waiter('small', 5))
+        await settle()
+        # 小预约能放下，但不能插队到先来的大预约前面
+        assert admitted == []
+        held.release()
+        await settle()
+        assert admitted == ['large', 'small']
+        assert budget.in_use == 85
+        (await large).release()
+        (await small).release()
+    run(scenario())
+
+
+def test_resize_only_shrinks():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        reservation = await budget.acquire(50)
+        reservation.resize(20)
+        assert budget.in_use == 20
+        with pytest.raises(ValueError):
+            reservation.resize(30)
+    run(scenario())
+
+
+def test_grow_waits_for_budget_and_beats_new_acquires():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        other = await budget.acquire(50)
+        reservation = await budget.acquire(40)
+
+        grow = asyncio.create_task(reservation.grow(80))
+        await settle()
+        assert not grow.done()
+        assert budget.in_use == 90
+
+        # 等待增大时，新的预约即使放得下也要排在后面
+        newcomer = asyncio.create_task(budget.acquire(5))
+        await settle()
+        assert not newcomer.done()
+
+        other.release()
+        await settle()
+        assert grow.done() and newcomer.done()
+        assert reservation.size == 80
+        assert budget.in_use == 85
+        assert budget.in_use <= budget.limit
+    run(scenario())
+
+
+def test_grow_to_smaller_size_shrinks_immediately():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        reservation = await budget.acquire(60)
+        await reservation.grow(10)
+        assert reservation.size == 10
+        assert budget.in_use == 10
+    run(scenario())
+
+
+def test_growers_holding_all_memory_do_not_deadlock():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        first = await budget.acquire(50)
+        second = await budget.acquire(50)
+        # 两个预约都需要增大，且都只能等对方归还：放行最早的一个
+        first_grow = asyncio.create_task(first.grow(90))
+        await settle()
+        second_grow = asyncio.create_task(second.grow(90))
+        await settle()
+        assert first_grow.done()
+        assert not second_grow.done()
+
+        first.release()
+        await settle()
+        assert second_grow.done()
+        assert budget.in_use == 90
+    run(scenario())
+
+
+def test_cancelled_waiter_does_not_block_or_leak():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        held = await budget.acquire(100)
+        blocked = asyncio.create_task(budget.acquire(100))
+        behind = asyncio.create_task(budget.acquire(10))
+        await settle()
+        blocked.cancel()
+        await settle()
+        held.release()
+        await settle()
+        assert behind.done()
+        assert budget.in_use == 10
+    run(scenario())
+
+
+def test_cancelled_grow_keeps_original_reservation():
+    async def scenario():
+        budget = MemoryBudget(limit_bytes=100)
+        other = await budget.acquire(60)
+        reservation = await budget.acquire(30)
+        grow = asyncio.create_task(reservation.grow(70))
+        await settle()
+        grow.cancel()
+        await settle()
+        assert reservation.size == 30
+        assert budget.in_use == 90
+        # 取消后不再视为等待增大的预约，新的预约正常放行
+        assert (await budget.acquire(10)).size == 10
+        other.release()
+    run(scenario())
@@ -0,0 +1,92 @@
+"""
+运行预估：采样点与请求数统计、按归档元数据精确计算瓦片图、按实际文件估算大小、耗时
+"""
+import json
+
+import pytest
+
+from config import PLAN_API_RESPONSE_BYTES, PLAN_SHEET_BYTES, PLAN_THUMBNAIL_BYTES
+from core.archive import SIDECAR_NAME
+from core.planner import build_plan, count_sheets, load_videoshot
+from core.sampler import SamplingEngine
+from core.video import VideoRecord
+
+VIDEOS = [
+    VideoRecord('BVshort', 'a', duration=5, created=0),  # 过短，跳过
+    VideoRecord('BVmid', 'b', duration=600, created=0),  # 4 个采样点
+    VideoRecord('BVlong', 'c', duration=7200, created=0),  # 4 个采样点
+]
+
+# 每 3 秒一格、10x10 网格、两张瓦片图；600 秒视频的采样点 120/240/360/480 秒分布在两张瓦片图上
+VIDEOSHOT = {
+    'img_w': 160, 'img_h': 90, 'img_x_cnt': 10, 'img_y_cnt': 10,
+    'index': list(range(0, 600, 3)),
+    'sheets': [{'file': 'sheet-000.jpg'}, {'file': 'sheet-001.jpg'}],
+}
+
+
+def write_archive(archive_dir, bvid, sheet_sizes):
+    directory = archive_dir / bvid
+    directory.mkdir(parents=True)
+    for sheet, size in zip(VIDEOSHOT['sheets'], sheet_sizes):
+        (directory / sheet['file']).write_bytes(b'\0' * size)
+    (directory / SIDECAR_NAME).write_text(json.dumps(VIDEOSHOT), encoding='utf-8')
+
+
+def test_estimates_without_cached_metadata():
+    plan = build_plan(VIDEOS, SamplingEngine(), qps=4)
+    assert plan.videos == 3
+    assert plan.skipped == 1
+    assert plan.samples == 8
+    assert plan.metadata_requests == 4
+    assert plan.tile_requests == 8
+    # 没有元数据时按每个采样点一张瓦片图计（上限）
+    assert plan.sheets == 8
+    assert plan.exact_videos == 0
+    assert plan.requests == 12
+    assert plan.download_bytes == 8 * PLAN_SHEET_BYTES + 4 * PLAN_API_RESPONSE_BYTES
+    assert plan.output_bytes == 8 * PLAN_THUMBNAIL_BYTES
+
+
+def test_duration_only_for_rate_limited_runs():
+    plan = build_plan(VIDEOS, SamplingEngine(), qps=4)
+    assert plan.limited_duration_seconds == pytest.approx(3.0)
+    assert plan.duration_seconds is None
+    assert plan.to_dict()['duration_seconds'] is None
+
+    limited = build_plan(VIDEOS, SamplingEngine(), qps=4, rate_limited=True)
+    assert limited.duration_seconds == pytest.approx(3.0)
+    assert limited.to_dict()['duration_seconds'] == 3.0
+
+
+def test_archived_videoshot_gives_exact_sheets_and_sizes(tmp_path):
+    archive_dir = tmp_path / 'archive'
+    write_archive(archive_dir, 'BVmid', [1000, 3000])
+    output_dir = tmp_path / 'output'
+    output_dir.mkdir()
+    (output_dir / '2024-01-01_BVmid(1).webp').write_bytes(b'\0' * 100)
+    (output_dir / '2024-01-01_BVmid(2).webp').write_bytes(b'\0' * 300)
+    (output_dir / 'notes.txt').write_bytes(b'\0' * 5000)
+
+    plan = build_plan(VIDEOS, SamplingEngine(), qps=4, archive_dir=str(archive_dir), output_dir=str(output_dir))
+    assert plan.exact_videos == 1
+    # BVmid 精确计算为 2 张，BVlong 仍按 4 个采样点估算
+    assert plan.sheets == 2 + 4
+    # 请求数仍按每个采样点一次估算
+    assert plan.tile_requests == 8
+    assert plan.sheet_bytes == 2000
+    assert plan.thumbnail_bytes == 200
+
+
+def test_count_sheets():
+    assert count_sheets(VIDEOSHOT, [120, 240, 360, 480]) == 2
+    assert count_sheets(VIDEOSHOT, [0, 10, 20]) == 1
+    # 超出 index 范围的时间落在最后一张
+    assert count_sheets(VIDEOSHOT, [10000]) == 1
+
+
+def test_load_videoshot_missing_or_invalid(tmp_path):
+    assert load_videoshot(str(tmp_path), 'BVnone') is None
+    (tmp_path / 'BVbad').mkdir()
+    (tmp_path / 'BVbad' / SIDECAR_NAME).write_text('{', encoding='utf-8')
+    assert load_videoshot(str(tmp_path), 'BVbad') is None
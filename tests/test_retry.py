@@ -0,0 +1,156 @@
+"""
+重试与熔断：错误分类、退避重试、熔断器状态转换
+"""
+import asyncio
+
+import aiohttp
+import pytest
+
+from core.decoding import CorruptBodyError
+from core.retry import (RATE_LIMIT_MIN_DELAY, CircuitBreaker, CircuitOpenError, PermanentError, RateLimitedError,
+                        RetryableError, RetryEngine, RetryPolicy, check_api_code, classify_api_code,
+                        classify_status)
+
+
+def make_engine(max_attempts=3, failure_threshold=5, reset_timeout=60.0):
+    # 不等待退避，测试只关心重试次数与状态
+    policy = RetryPolicy(max_attempts=max_attempts, base_delay=0, max_delay=0)
+    return RetryEngine(policy, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+
+def failing(errors, result='ok'):
+    """依次抛出 errors 中的异常，之后返回 result，并记录调用次数"""
+    calls = []
+
+    async def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return func, calls
+
+
+@pytest.mark.parametrize('status, expected', [
+    (429, RateLimitedError),
+    (412, RateLimitedError),
+    (503, RetryableError),
+    (520, RetryableError),
+    (404, PermanentError),
+    (400, PermanentError),
+])
+def test_classify_status(status, expected):
+    error = classify_status(status)
+    assert type(error) is expected
+    assert error.status == status
+
+
+def test_classify_api_code():
+    assert isinstance(classify_api_code(-352), RateLimitedError)
+    assert type(classify_api_code(-404)) is PermanentError
+    assert not classify_api_code(-101).retryable
+
+
+def test_check_api_code():
+    data = {'code': 0, 'data': {}}
+    assert check_api_code(data) is data
+    with pytest.raises(RetryableError):
+        check_api_code('<html>')
+    with pytest.raises(RateLimitedError):
+        check_api_code({'code': -412})
+
+
+def test_rate_limited_delay_has_floor():
+    policy = RetryPolicy(base_delay=0, max_delay=0)
+    assert policy.delay(0, RateLimitedError('x')) >= RATE_LIMIT_MIN_DELAY
+    assert policy.delay(0, RetryableError('x')) == 0
+
+
+@pytest.mark.parametrize('error', [
+    RetryableError('HTTP 503', status=503),
+    aiohttp.ClientConnectionError('reset'),
+    asyncio.TimeoutError(),
+    CorruptBodyError('truncated brotli stream'),
+])
+def test_transient_errors_are_retried(error):
+    engine = make_engine()
+    func, calls = failing([error])
+    assert asyncio.run(engine.call('api', func)) == 'ok'
+    assert len(calls) == 2
+    assert engine.metrics.counter('retries') == 1
+
+
+def test_permanent_error_is_not_retried_and_keeps_breaker_closed():
+    engine = make_engine(failure_threshold=1)
+    func, calls = failing([PermanentError('HTTP 404', status=404)])
+    with pytest.raises(PermanentError):
+        asyncio.run(engine.call('api', func))
+    assert len(calls) == 1
+    assert engine.breaker('api').state == CircuitBreaker.CLOSED
+
+
+def test_last_error_raised_when_attempts_exhausted():
+    engine = make_engine(max_attempts=2)
+    func, calls = failing([RetryableError('first'), RetryableError('second')])
+    with pytest.raises(RetryableError, match='second'):
+        asyncio.run(engine.call('api', func))
+    assert len(calls) == 2
+
+
+def test_breaker_opens_and_rejects_without_calling():
+    engine = make_engine(max_attempts=1, failure_threshold=2)
+    for _ in range(2):
+        func, _ = failing([RetryableError('down')])
+        with pytest.raises(RetryableError):
+            asyncio.run(engine.call('api', func))
+    assert engine.breaker('api').state == CircuitBreaker.OPEN
+
+    func, calls = failing([])
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(engine.call('api', func))
+    assert calls == []
+    # 其他接口不受影响
+    assert asyncio.run(engine.call('other', func)) == 'ok'
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.allow()
+    assert breaker.record_failure() is True
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_probe_releases_half_open_slot():
+    engine = make_engine(failure_threshold=1, reset_timeout=0)
+    breaker = engine.breaker('api')
+    breaker.record_failure()
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    async def run():
+        task = asyncio.create_task(engine.call('api', hang))
+        await asyncio.sleep(0.01)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 被取消的探测不能让熔断器永远停在 half-open
+        func, calls = failing([])
+        assert await engine.call('api', func) == 'ok'
+        assert len(calls) == 1
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,63 @@
+"""
+视频调度：各调度顺序的取出次序，优先级相同时保持加入顺序
+"""
+import pytest
+
+from core.sampler import SamplingEngine
+from core.scheduler import PriorityScheduler
+from core.video import VideoRecord
+
+VIDEOS = [
+    VideoRecord('BV1', 'a', duration=600, created=1000, play=50),
+    VideoRecord('BV2', 'b', duration=5, created=3000, play=10),
+    VideoRecord('BV3', 'c', duration=7200, created=2000, play=90),
+    VideoRecord('BV4', 'd', duration=600, created=500, play=90),
+]
+
+
+def order_of(order, videos=VIDEOS):
+    scheduler = PriorityScheduler(order, SamplingEngine())
+    scheduler.extend(videos)
+    return [video['bvid'] for video in scheduler]
+
+
+@pytest.mark.parametrize('order, expected', [
+    ('api', ['BV1', 'BV2', 'BV3', 'BV4']),
+    ('created', ['BV2', 'BV3', 'BV1', 'BV4']),
+    # 播放量相同（BV3、BV4）时保持加入顺序
+    ('play', ['BV3', 'BV4', 'BV1', 'BV2']),
+    ('duration', ['BV2', 'BV1', 'BV4', 'BV3']),
+    # 过短的视频没有请求，最先完成；600秒 4 个采样点，7200秒 4 个采样点，成本相同时按加入顺序
+    ('cost', ['BV2', 'BV1', 'BV3', 'BV4']),
+])
+def test_orders(order, expected):
+    assert order_of(order) == expected
+
+
+def test_estimate_cost():
+    scheduler = PriorityScheduler('cost', SamplingEngine())
+    assert scheduler.estimate_cost(VIDEOS[1]) == 0
+    assert scheduler.estimate_cost(VIDEOS[0]) == 2 + 4
+    assert scheduler.estimate_cost({'duration': 5 * 3600}) == 2 + 10
+
+
+def test_push_after_extend_keeps_priority():
+    scheduler = PriorityScheduler('created')
+    scheduler.extend(VIDEOS[:2])
+    scheduler.push(VideoRecord('BV9', 'new', duration=60, created=9999))
+    assert len(scheduler) == 3
+    assert scheduler.pop()['bvid'] == 'BV9'
+    assert [video['bvid'] for video in scheduler] == ['BV2', 'BV1']
+    assert len(scheduler) == 0
+    with pytest.raises(IndexError):
+        scheduler.pop()
+
+
+def test_unknown_order_falls_back_to_api():
+    scheduler = PriorityScheduler('random')
+    assert scheduler.order == 'api'
+
+
+def test_cost_order_requires_sampler():
+    with pytest.raises(ValueError):
+        PriorityScheduler('cost')
@@ -0,0 +1,195 @@
+"""
+频道监视：发布时间水位、合集的已知BV号、待重试视频的处理
+"""
+import asyncio
+
+import pytest
+
+import core.watcher
+from core.retry import RetryableError
+from core.video import VideoRecord
+from core.watcher import ChannelState, ChannelWatcher
+
+
+def video(bvid, created):
+    return VideoRecord(bvid, bvid, duration=600, created=created)
+
+
+class FakeIndexer:
+    """按预设结果返回第1页与完整列表，并记录完整翻页的参数；page 为None表示304，listed 为None表示翻页失败"""
+
+    def __init__(self, page=(), total=None, listed=()):
+        self.page = page
+        self.total = total
+        self.listed = listed
+        self.listings = []
+
+    async def get_latest_videos(self, up_id, list_id, validators, page_size):
+        return self.page, self.total
+
+    async def get_videos_by_up_id(self, up_id, start_time=None):
+        self.listings.append(start_time)
+        return self.listed
+
+    async def get_videos_by_collection(self, up_id, list_id, start_time=None):
+        self.listings.append(start_time)
+        return self.listed
+
+
+class FakeRunner:
+    """代替 CaptureRunner：不发出请求，failed 中的BV号按提取失败处理"""
+
+    failed = set()
+
+    def __init__(self, **kwargs):
+        self.failed_videos = []
+        self.success_count = 0
+
+    async def run(self, videos):
+        self.failed_videos = [v for v in videos if v['bvid'] in self.failed]
+        self.success_count = len(videos) - len(self.failed_videos)
+        return True
+
+
+@pytest.fixture
+def make_watcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.watcher, 'CaptureRunner', FakeRunner)
+    monkeypatch.setattr(FakeRunner, 'failed', set())
+
+    def make(url='https://space.bilibili.com/1', **kwargs):
+        watcher = ChannelWatcher(None, [url], state_path=str(tmp_path / 'state.json'), page_size=3,
+                                 output_dir=str(tmp_path), **kwargs)
+        state = next(iter(watcher.states.values()))
+        return watcher, state
+    return make
+
+
+def find(watcher, state):
+    return asyncio.run(watcher._find_new_videos(state, {}))
+
+
+def test_watermark_and_same_second_uploads():
+    state = ChannelState(1)
+    assert not state.is_new(video('BV1', 100))  # 水位尚未建立
+    state.advance([video('BV1', 100), video('BV0', 50)])
+    assert state.watermark == 100
+    assert not state.is_new(video('BV1', 100))
+    assert state.is_new(video('BV2', 100))  # 同一秒发布的另一个视频
+    assert state.is_new(video('BV3', 101))
+    assert not state.is_new(video('BV4', 99))
+    state.advance([video('BV2', 100)])
+    assert state.seen == ['BV1', 'BV2']
+
+
+def test_pending_videos_are_not_new():
+    state = ChannelState(1)
+    state.advance([video('BV1', 100)])
+    state.pending['BV2'] = {'video': {}, 'attempts': 1}
+    assert not state.is_new(video('BV2', 200))
+
+
+def test_state_round_trip():
+    state = ChannelState(1, 2)
+    state.advance([video('BV1', 100)])
+    state.known = {'BV1', 'BV0'}
+    state.pending['BV3'] = {'video': {'bvid': 'BV3'}, 'attempts': 2}
+    restored = ChannelState.from_dict(state.to_dict())
+    assert restored.key == state.key
+    assert restored.watermark == 100
+    assert restored.known == {'BV0', 'BV1'}
+    assert restored.pending == state.pending
+    # 旧版本状态文件没有已知集合
+    assert ChannelState.from_dict({'up_id': 1}).known is None
+
+
+def test_first_poll_only_sets_watermark(make_watcher):
+    watcher, state = make_watcher()
+    watcher.indexer = FakeIndexer(page=[video('BV2', 200), video('BV1', 100)], total=2)
+    assert find(watcher, state) == ([], 2)
+    assert state.watermark == 200
+
+
+def test_new_uploads_on_first_page(make_watcher):
+    watcher, state = make_watcher()
+    state.advance([video('BV1', 100)])
+    watcher.indexer = FakeIndexer(page=[video('BV2', 200), video('BV1', 100)], total=2)
+    new_videos, _ = find(watcher, state)
+    assert [v['bvid'] for v in new_videos] == ['BV2']
+    assert watcher.indexer.listings == []
+
+
+def test_full_first_page_lists_back_to_watermark(make_watcher):
+    watcher, state = make_watcher()
+    state.advance([video('BV1', 100)])
+    page = [video('BV5', 500), video('BV4', 400), video('BV3', 300)]
+    watcher.indexer = FakeIndexer(page=page, listed=page + [video('BV2', 200), video('BV1', 100)])
+    new_videos, _ = find(watcher, state)
+    assert [v['bvid'] for v in new_videos] == ['BV5', 'BV4', 'BV3', 'BV2']
+    assert watcher.indexer.listings[0].timestamp() == 100
+
+
+def test_failed_listing_raises(make_watcher):
+    watcher, state = make_watcher()
+    state.advance([video('BV1', 100)])
+    page = [video('BV5', 500), video('BV4', 400), video('BV3', 300)]
+    watcher.indexer = FakeIndexer(page=page, listed=None)
+    with pytest.raises(RetryableError):
+        find(watcher, state)
+
+
+def test_collection_detects_older_video_by_bvid(make_watcher):
+    watcher, state = make_watcher('https://space.bilibili.com/1/lists/2')
+    existing = [video('BV2', 200), video('BV1', 100)]
+    # 首次监视：完整翻页建立已知集合，不回溯
+    watcher.indexer = FakeIndexer(page=existing, total=2, listed=existing)
+    assert find(watcher, state) == ([], 2)
+    assert state.known == {'BV1', 'BV2'}
+    assert watcher.indexer.listings == [None]
+    state.total = 2
+
+    # 加入一个发布时间早于水位的视频，排在合集末尾、不在第1页
+    older = video('BV0', 50)
+    watcher.indexer = FakeIndexer(page=existing, total=3, listed=existing + [older])
+    new_videos, total = find(watcher, state)
+    assert [v['bvid'] for v in new_videos] == ['BV0']
+    assert total == 3
+    # 完整翻页不按发布时间过滤
+    assert watcher.indexer.listings == [None]
+    # 提取成功后才加入已知集合
+    assert 'BV0' not in state.known
+    state.advance(new_videos)
+    assert 'BV0' in state.known
+
+
+def test_collection_empty_listing_is_a_failure(make_watcher):
+    watcher, state = make_watcher('https://space.bilibili.com/1/lists/2')
+    watcher.indexer = FakeIndexer(page=[video('BV1', 100)], total=1, listed=[])
+    with pytest.raises(RetryableError):
+        find(watcher, state)
+    assert state.known is None
+
+
+def test_failed_extraction_is_retried_then_dropped(make_watcher):
+    watcher, state = make_watcher(max_retries=2)
+    state.advance([video('BV1', 100)])
+    FakeRunner.failed = {'BV2'}
+    watcher.indexer = FakeIndexer(page=[video('BV3', 300), video('BV2', 200), video('BV1', 100)], total=3)
+
+    assert asyncio.run(watcher.poll(state)) == 1
+    # 水位越过失败的视频，失败的视频进入待重试
+    assert state.watermark == 300
+    assert state.pending['BV2']['attempts'] == 1
+
+    # 第二次仍失败，达到最多尝试次数后不再重试
+    watcher.indexer = FakeIndexer(page=None)
+    assert asyncio.run(watcher.poll(state)) == 0
+    assert state.pending == {}
+
+
+def test_unchanged_channel_backs_off(make_watcher):
+    watcher, state = make_watcher(min_interval=10, max_interval=25, backoff=2)
+    state.advance([video('BV1', 100)])
+    watcher.indexer = FakeIndexer(page=None)
+    for expected in (20, 25, 25):
+        asyncio.run(watcher.poll(state))
+        assert state.interval == expected
@@ -0,0 +1,113 @@
+"""
+原子写盘：批次提交前只有临时文件、提交结果、失败时的清理
+"""
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core.writer import TEMP_SUFFIX, AtomicWriter, remove_stale_temp_files
+
+
+def temp_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith(TEMP_SUFFIX)]
+
+
+@pytest.fixture
+def writer():
+    writer = AtomicWriter(workers=1, batch_size=10, interval=3600)
+    yield writer
+    writer.close()
+
+
+def test_file_appears_only_after_commit(writer, tmp_path):
+    path = str(tmp_path / 'a.webp')
+
+    async def scenario():
+        commit = await writer.write(path, b'data')
+        # 批次未提交：正式文件名不存在，只有临时文件
+        assert not commit.done()
+        assert not os.path.exists(path)
+        assert len(temp_files(tmp_path)) == 1
+
+        assert await writer.flush() == []
+        assert await commit is True
+
+    asyncio.run(scenario())
+    with open(path, 'rb') as f:
+        assert f.read() == b'data'
+    assert temp_files(tmp_path) == []
+
+
+def test_full_batch_commits_without_flush(tmp_path):
+    writer = AtomicWriter(workers=1, batch_size=2, interval=3600)
+    paths = [str(tmp_path / f'{i}.webp') for i in range(2)]
+
+    async def scenario():
+        commits = [await writer.write(path, b'x') for path in paths]
+        assert await asyncio.gather(*commits) == [True, True]
+
+    try:
+        asyncio.run(scenario())
+        assert all(os.path.exists(path) for path in paths)
+    finally:
+        writer.close()
+
+
+def test_due_only_flush_respects_interval(writer, tmp_path):
+    async def scenario():
+        commit = await writer.write(str(tmp_path / 'a.webp'), b'x')
+        assert await writer.flush(due_only=True) == []
+        assert not commit.done()
+        await writer.flush()
+        assert commit.done()
+
+    asyncio.run(scenario())
+
+
+def test_failed_rename_reports_path_and_removes_temp(writer, tmp_path):
+    # 目标是已存在的目录，重命名必然失败
+    blocked = tmp_path / 'blocked.webp'
+    blocked.mkdir()
+    ok = str(tmp_path / 'ok.webp')
+
+    async def scenario():
+        bad_commit = await writer.write(str(blocked), b'x')
+        ok_commit = await writer.write(ok, b'y')
+        failed = await writer.flush()
+        return failed, await bad_commit, await ok_commit
+
+    failed, bad_result, ok_result = asyncio.run(scenario())
+    assert failed == [str(blocked)]
+    assert bad_result is False
+    # 同一批次中的其他文件不受影响
+    assert ok_result is True and os.path.exists(ok)
+    assert temp_files(tmp_path) == []
+
+
+def test_write_error_is_raised(writer, tmp_path):
+    async def scenario():
+        await writer.write(str(tmp_path / 'missing' / 'a.webp'), b'x')
+
+    with pytest.raises(OSError):
+        asyncio.run(scenario())
+
+
+def test_remove_stale_temp_files_keeps_live_writers(tmp_path):
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True, check=True)
+    dead_pid = int(exited.stdout)
+    stale = tmp_path / f'a.webp.{dead_pid}.1{TEMP_SUFFIX}'
+    live = tmp_path / f'b.webp.{os.getpid()}.1{TEMP_SUFFIX}'
+    stale.write_bytes(b'x')
+    live.write_bytes(b'x')
+
+    if os.name == 'posix':
+        assert remove_stale_temp_files(str(tmp_path)) == 1
+        assert not stale.exists()
+    assert live.exists()
+    # 超过最长保留时间后即使写入进程仍在也删除（pid 可能已被复用）
+    assert remove_stale_temp_files(str(tmp_path), max_age=-1) >= 1
+    assert not live.exists()
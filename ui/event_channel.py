@@ -0,0 +1,83 @@
+"""
+UI事件通道
+工作线程只负责投递日志与进度事件，由Tk主线程按固定帧率批量取出并合并后刷新界面，
+避免每条日志都调度一次 root.after
+"""
+import threading
+from collections import deque
+
+
+class UIEventChannel:
+    """线程安全的UI事件通道：日志与结果逐条排队，进度事件按字段合并（只保留最新值）"""
+
+    def __init__(self, root, on_logs, on_progress, interval_ms=100, max_lines_per_frame=500, on_results=None):
+        """
+        :param root: Tk根窗口
+        :param on_logs: 回调，接收本帧的日志列表
+        :param on_progress: 回调，接收合并后的进度关键字参数
+        :param interval_ms: 刷新间隔（毫秒）
+        :param max_lines_per_frame: 每帧最多显示的日志条数，超出部分合并为一条省略提示
+        :param on_results: 可选回调，接收本帧新写出的缩略图路径列表
+        """
+        self.root = root
+        self.on_logs = on_logs
+        self.on_progress = on_progress
+        self.on_results = on_results
+        self.interval_ms = interval_ms
+        self.max_lines_per_frame = max_lines_per_frame
+        self._lock = threading.Lock()
+        self._logs = deque()
+        self._progress = {}
+        self._results = []
+        self._running = False
+
+    def post_log(self, message):
+        """投递一条日志（可在任意线程调用）"""
+        with self._lock:
+            self._logs.append(message)
+
+    def post_progress(self, **kwargs):
+        """投递进度更新（可在任意线程调用），同一字段只保留最新值"""
+        with self._lock:
+            self._progress.update(kwargs)
+
+    def post_results(self, paths):
+        """投递新写出的缩略图路径（可在任意线程调用）"""
+        with self._lock:
+            self._results.extend(paths)
+
+    def start(self):
+        """开始按固定帧率刷新，需在Tk主线程调用"""
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        """停止刷新，并立即把剩余事件刷新到界面"""
+        self._running = False
+        self.flush()
+
+    def flush(self):
+        """取出并分发当前积压的全部事件，需在Tk主线程调用"""
+        with self._lock:
+            logs = list(self._logs)
+            self._logs.clear()
+            progress = self._progress
+            self._progress = {}
+            results, self._results = self._results, []
+
+        if len(logs) > self.max_lines_per_frame:
+            dropped = len(logs) - self.max_lines_per_frame
+            logs = [f"... 已省略 {dropped} 条日志 ...\n"] + logs[-self.max_lines_per_frame:]
+        if logs:
+            self.on_logs(logs)
+        if progress:
+            self.on_progress(**progress)
+        if results and self.on_results:
+            self.on_results(results)
+
+    def _tick(self):
+        if not self._running:
+            return
+        self.flush()
+        self.root.after(self.interval_ms, self._tick)
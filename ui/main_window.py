@@ -8,13 +8,18 @@ import asyncio
 import os
 import re
 from datetime import datetime
-import aiohttp
 
 # 导入项目模块
-from core.indexer import VideoIndexer
-from core.sampler import SamplingEngine
-from core.extractor import ThumbnailExtractor
+from core.capture import CaptureRunner, create_session
+from core.metrics import MetricsRegistry
+from core.profiling import RunProfiler
+from core.runtime import BackgroundLoop
+from core.scheduler import SCHEDULE_ORDERS
+from config import (UI_REFRESH_INTERVAL_MS, LOG_VIEW_MAX_LINES, ARCHIVE_MODE, PROFILE_ENABLED, PROFILE_TRACEMALLOC,
+                    PROFILE_SLOW_CALLBACKS, SCHEDULE_ORDER)
 from style import StyleManager
+from ui.event_channel import UIEventChannel
+from ui.thumbnail_grid import ThumbnailGrid
 from config.config_manager import load_user_config, save_user_config
 
 
@@ -30,6 +35,17 @@ class BilibiliCaptureUI:
 
         # 添加停止标志
         self.stop_flag = threading.Event()
+        # 当前运行的事件循环与主任务，用于停止时立即取消
+        self.capture_loop = None
+        self.capture_task = None
+
+        # 运行指标（按阶段耗时、请求数、字节数）
+        self.metrics = MetricsRegistry()
+        self.running = False
+
+        # 常驻的后台事件循环与HTTP会话：多次运行复用连接、DNS缓存、TLS会话和元数据缓存
+        self.runtime = BackgroundLoop(create_session, metrics=self.metrics).start()
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
 
         # 初始化样式管理器
         self.style_manager = StyleManager(root)
@@ -51,11 +67,23 @@ class BilibiliCaptureUI:
             'max_qps': tk.IntVar(value=user_config['max_qps']),
             'concurrent_limit': tk.IntVar(value=user_config['concurrent_limit']),
             'output_dir': tk.StringVar(value=user_config['output_dir']),
-            'image_format': tk.StringVar(value=user_config['image_format'])
+            'image_format': tk.StringVar(value=user_config['image_format']),
+            'archive_mode': tk.BooleanVar(value=user_config.get('archive_mode', ARCHIVE_MODE)),
+            # 下拉框中显示说明文字，保存配置时转换回调度顺序的键
+            'schedule_order': tk.StringVar(value=SCHEDULE_ORDERS.get(user_config.get('schedule_order', SCHEDULE_ORDER),
+                                                                     SCHEDULE_ORDERS['api'])),
+            'profile_enabled': tk.BooleanVar(value=user_config.get('profile_enabled', PROFILE_ENABLED)),
+            'profile_tracemalloc': tk.BooleanVar(value=user_config.get('profile_tracemalloc', PROFILE_TRACEMALLOC)),
+            'profile_slow_callbacks': tk.BooleanVar(value=user_config.get('profile_slow_callbacks', PROFILE_SLOW_CALLBACKS))
         }
 
         self.setup_ui()
 
+        # 工作线程通过事件通道投递日志与进度，由主线程按固定帧率批量刷新
+        self.events = UIEventChannel(root, on_logs=self._update_log_text, on_progress=self.update_progress,
+                                     interval_ms=UI_REFRESH_INTERVAL_MS, on_results=self.results_grid.add)
+        self.events.start()
+
         # 绑定窗口大小变化事件
         self.root.bind('<Configure>', self._on_window_configure)
 
@@ -72,14 +100,17 @@ class BilibiliCaptureUI:
     def _get_target_height(self):
         """根据当前展开状态计算目标窗口高度"""
         base_height = 320
-        advanced_height = 170
+        advanced_height = 260
         log_height = 270
+        results_height = 300
 
         total_height = base_height
         if self.advanced_visible:
             total_height += advanced_height
         if self.log_visible:
             total_height += log_height
+        if self.results_visible:
+            total_height += results_height
 
         return total_height
 
@@ -201,6 +232,9 @@ class BilibiliCaptureUI:
         self.stats_label = ttk.Label(self.progress_frame, text="成功: 0 / 失败: 0")
         self.stats_label.pack(side=tk.LEFT, padx=(10, 0))
 
+        self.rate_label = ttk.Label(self.progress_frame, text="缩略图/秒: 0.0 | 请求/秒: 0.0")
+        self.rate_label.pack(side=tk.LEFT, padx=(10, 0))
+
         # 右侧：按钮
         btn_frame = ttk.Frame(bottom_frame)
         btn_frame.pack(side=tk.RIGHT)
@@ -211,6 +245,9 @@ class BilibiliCaptureUI:
         self.log_button = ttk.Button(btn_frame, text="运行日志 ▼", command=self.toggle_log)
         self.log_button.pack(side=tk.LEFT, padx=2)
 
+        self.results_button = ttk.Button(btn_frame, text="预览结果 ▼", command=self.toggle_results)
+        self.results_button.pack(side=tk.LEFT, padx=2)
+
         bottom_frame.columnconfigure(0, weight=1)
 
         # 高级设置区域（默认隐藏）
@@ -233,6 +270,23 @@ class BilibiliCaptureUI:
         format_combo = ttk.Combobox(self.advanced_frame, textvariable=self.config['image_format'], values=["webp"], width=10, state="readonly")
         format_combo.grid(row=3, column=1, sticky=tk.W, pady=2)
 
+        ttk.Label(self.advanced_frame, text="性能指标:").grid(row=4, column=0, sticky=tk.W, pady=2)
+        ttk.Button(self.advanced_frame, text="导出指标", command=self.export_metrics).grid(row=4, column=1, sticky=tk.W, pady=2)
+
+        ttk.Label(self.advanced_frame, text="归档模式:").grid(row=5, column=0, sticky=tk.W, pady=2)
+        ttk.Checkbutton(self.advanced_frame, text="原样保存瓦片图，不裁剪缩略图", variable=self.config['archive_mode']).grid(row=5, column=1, sticky=tk.W, pady=2)
+
+        ttk.Label(self.advanced_frame, text="处理顺序:").grid(row=6, column=0, sticky=tk.W, pady=2)
+        ttk.Combobox(self.advanced_frame, textvariable=self.config['schedule_order'], values=list(SCHEDULE_ORDERS.values()),
+                     width=20, state="readonly").grid(row=6, column=1, sticky=tk.W, pady=2)
+
+        ttk.Label(self.advanced_frame, text="性能分析:").grid(row=7, column=0, sticky=tk.W, pady=2)
+        profile_frame = ttk.Frame(self.advanced_frame)
+        profile_frame.grid(row=7, column=1, sticky=tk.W, pady=2)
+        ttk.Checkbutton(profile_frame, text="cProfile", variable=self.config['profile_enabled']).pack(side=tk.LEFT)
+        ttk.Checkbutton(profile_frame, text="内存分配", variable=self.config['profile_tracemalloc']).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Checkbutton(profile_frame, text="慢回调", variable=self.config['profile_slow_callbacks']).pack(side=tk.LEFT, padx=(10, 0))
+
         self.advanced_frame.columnconfigure(1, weight=1)
 
         # 日志显示区域（默认隐藏）
@@ -244,6 +298,15 @@ class BilibiliCaptureUI:
         self.log_frame.columnconfigure(0, weight=1)
         self.log_frame.rowconfigure(0, weight=1)
 
+        # 结果预览区域（默认隐藏），只绘制可见行的缩略图
+        self.results_frame = ttk.LabelFrame(main_frame, text="预览结果", padding="5")
+        # 初始不显示
+
+        self.results_grid = ThumbnailGrid(self.results_frame)
+        self.results_grid.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.results_frame.columnconfigure(0, weight=1)
+        self.results_frame.rowconfigure(0, weight=1)
+
         # 控制按钮区域
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=2, column=0, columnspan=2, pady=10)
@@ -263,6 +326,7 @@ class BilibiliCaptureUI:
         # 初始化
         self.advanced_visible = False
         self.log_visible = False
+        self.results_visible = False
         self.total_videos = 0
         self.success_count = 0
         self.fail_count = 0
@@ -299,6 +363,23 @@ class BilibiliCaptureUI:
         # 调整窗口大小
         self.root.after(150, self._resize_window)
 
+    def toggle_results(self):
+        """切换结果预览的显示/隐藏"""
+        if self.results_visible:
+            self.results_frame.grid_forget()
+            self.results_button.config(text="预览结果 ▼")
+            self.results_visible = False
+        else:
+            self.results_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
+            self.results_button.config(text="预览结果 ▲")
+            self.results_visible = True
+            # 空闲时打开预览，列出输出目录中已有的缩略图
+            if not self.running and not len(self.results_grid):
+                self.results_grid.load_directory(self.config['output_dir'].get())
+
+        # 调整窗口大小
+        self.root.after(150, self._resize_window)
+
     def show_progress(self):
         """显示进度条"""
         self.progress_frame.pack(side=tk.LEFT, padx=(0, 10))
@@ -334,6 +415,31 @@ class BilibiliCaptureUI:
         self.stats_label.config(text="成功: 0 / 失败: 0")
         self.progress_bar['value'] = 0
         self.progress_bar['maximum'] = 100
+        self.rate_label.config(text="缩略图/秒: 0.0 | 请求/秒: 0.0")
+
+    def _refresh_rates(self):
+        """每秒刷新一次实时吞吐量，运行结束后停止"""
+        thumbs = self.metrics.rate('thumbnails')
+        requests = self.metrics.rate('requests')
+        # 流水线各阶段的排队数，持续堆积的阶段即为瓶颈的下游
+        queues = '/'.join(str(int(self.metrics.gauge(f'pipeline_{stage}_queue')))
+                          for stage in ('metadata', 'download', 'process', 'write'))
+        self.rate_label.config(text=f"缩略图/秒: {thumbs:.1f} | 请求/秒: {requests:.1f} | 队列: {queues}")
+        if self.running:
+            self.root.after(1000, self._refresh_rates)
+
+    def export_metrics(self):
+        """导出当前指标快照到输出目录"""
+        try:
+            json_path, prom_path = self.metrics.export(self.config['output_dir'].get())
+            self.log_message(f"性能指标已导出: {json_path}, {prom_path}")
+        except Exception as e:
+            self.log_message(f"导出性能指标失败: {str(e)}")
+
+    def _schedule_order(self):
+        """把下拉框中的说明文字转换为调度顺序的键"""
+        label = self.config['schedule_order'].get()
+        return next((key for key, text in SCHEDULE_ORDERS.items() if text == label), SCHEDULE_ORDER)
 
     def browse_output_dir(self):
         """选择输出目录"""
@@ -397,7 +503,12 @@ class BilibiliCaptureUI:
             'max_qps': self.config['max_qps'].get(),
             'concurrent_limit': self.config['concurrent_limit'].get(),
             'output_dir': self.config['output_dir'].get(),
-            'image_format': self.config['image_format'].get()
+            'image_format': self.config['image_format'].get(),
+            'archive_mode': self.config['archive_mode'].get(),
+            'schedule_order': self._schedule_order(),
+            'profile_enabled': self.config['profile_enabled'].get(),
+            'profile_tracemalloc': self.config['profile_tracemalloc'].get(),
+            'profile_slow_callbacks': self.config['profile_slow_callbacks'].get()
         }
         save_user_config(current_config)
 
@@ -408,199 +519,122 @@ class BilibiliCaptureUI:
         # 显示并重置进度条
         self.reset_progress()
         self.show_progress()
+        self.results_grid.clear()
 
         # 清除停止标志
         self.stop_flag.clear()
 
-        # 启动提取任务
-        def run_async():
-            asyncio.run(self._run_capture_async())
+        # 重置指标并开始刷新实时速率
+        self.metrics.reset()
+        self.running = True
+        self._refresh_rates()
 
-        self.capture_thread = threading.Thread(target=run_async)
-        self.capture_thread.daemon = True
-        self.capture_thread.start()
+        # 提交到常驻事件循环，任务完全结束后才允许再次开始
+        future = self.runtime.submit(self._run_capture_async())
+        future.add_done_callback(lambda _: self.root.after(0, self._on_capture_finished))
 
     def stop_capture(self):
         """停止提取"""
         # 设置停止标志
         self.stop_flag.set()
         self.log_message("停止请求已发送...")
-        # 禁用停止按钮，启用开始按钮将在任务完成后进行
+        # 禁用停止按钮，启用开始按钮将在任务清理完成后进行
         self.stop_button.config(state=tk.DISABLED)
+
+        # 取消主任务：正在进行的HTTP请求、翻页等待都会立即中断
+        loop, task = self.capture_loop, self.capture_task
+        if loop is not None and task is not None:
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # 事件循环已关闭，任务已经结束
+                pass
+
+    def on_close(self):
+        """关闭窗口：取消正在进行的任务，关闭会话与后台事件循环"""
+        self.stop_flag.set()
+        self.events.stop()
+        self.runtime.close()
+        self.root.destroy()
+
+    def _on_capture_finished(self):
+        """提取线程完全退出后恢复界面状态"""
+        self.capture_loop = None
+        self.capture_task = None
         self.start_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.DISABLED)
+        self.hide_progress()
 
     async def _run_capture_async(self):
         """异步执行提取任务"""
+        self.capture_loop = asyncio.get_running_loop()
+        self.capture_task = asyncio.current_task()
+        # 可选的性能分析：cProfile 覆盖整个运行（含列表阶段），报告写到输出目录下的 profiles/
+        profiler = None
+        if self.config['profile_enabled'].get():
+            profiler = RunProfiler(self.config['output_dir'].get(),
+                                   trace_memory=self.config['profile_tracemalloc'].get(),
+                                   slow_callbacks=self.config['profile_slow_callbacks'].get()).start()
         try:
-            # 创建输出目录
-            os.makedirs(self.config['output_dir'].get(), exist_ok=True)
-
             # 构建时间字符串
             start_time_str = f"{self.config['start_year'].get()}-{self.config['start_month'].get().zfill(2)}-{self.config['start_day'].get().zfill(2)} 00:00:00"
             end_time_str = f"{self.config['end_year'].get()}-{self.config['end_month'].get().zfill(2)}-{self.config['end_day'].get().zfill(2)} 23:59:59"
 
-            # 创建全局会话
-            connector = aiohttp.TCPConnector(
-                limit=10,
-                ttl_dns_cache=300,
-                use_dns_cache=True,
-                force_close=False
+            # 构建时间对象
+            start_dt = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
+            end_dt = datetime.strptime(end_time_str, "%Y-%m-%d %H:%M:%S")
+
+            # 复用常驻会话（Cookie 变化时自动重建）
+            session = await self.runtime.get_session(self.config['cookie'].get())
+            # 初始化组件
+            self.log_message(f"初始化提取组件...")
+            runner = CaptureRunner(
+                session=session,
+                up_id=self.url_info['up_id'],
+                list_id=self.url_info.get('list_id'),
+                start_time=start_dt,
+                end_time=end_dt,
+                cookie=self.config['cookie'].get(),
+                qps=self.config['max_qps'].get(),
+                concurrency=self.config['concurrent_limit'].get(),
+                output_dir=self.config['output_dir'].get(),
+                image_format=self.config['image_format'].get(),
+                archive=self.config['archive_mode'].get(),
+                order=self._schedule_order(),
+                metrics=self.metrics,
+                stop_flag=self.stop_flag,
+                on_log=self.log_message,
+                on_progress=self.events.post_progress,
+                on_result=lambda video, paths: self.events.post_results(paths),
+                metadata=self.runtime.metadata
             )
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': 'https://space.bilibili.com/',
-                'Cookie': self.config['cookie'].get(),
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-                'Sec-Fetch-Dest': 'empty',
-                'Sec-Fetch-Mode': 'cors',
-                'Sec-Fetch-Site': 'same-site'
-            }
-
-            async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
-                # 初始化组件
-                self.log_message(f"初始化提取组件...")
-                indexer = VideoIndexer(session=session, cookie=self.config['cookie'].get(), qps=self.config['max_qps'].get())
-                sampler = SamplingEngine()
-                extractor = ThumbnailExtractor(session=session, cookie=self.config['cookie'].get())
-
-                # 执行提取流程
-                up_id = self.url_info['up_id']
-                list_id = self.url_info.get('list_id')
-
-                if list_id:
-                    self.log_message(f"开始获取UP主 {up_id} 的合集 {list_id} 的视频列表...")
-                else:
-                    self.log_message(f"开始获取UP主 {up_id} 的投稿视频列表...")
-
-                # 构建时间对象
-                start_dt = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
-                end_dt = datetime.strptime(end_time_str, "%Y-%m-%d %H:%M:%S")
-
-                # 检查停止标志
-                if self.stop_flag.is_set():
-                    self.log_message("任务已取消，停止获取视频列表")
-                    return
-
-                # 获取视频列表（带重试机制）
-                video_list = None
-                for attempt in range(2):
-                    # 根据是否有合集ID使用不同的API
-                    if list_id:
-                        video_list = await indexer.get_videos_by_collection(
-                            up_id=up_id,
-                            collection_id=list_id,
-                            start_time=start_dt,
-                            end_time=end_dt
-                        )
-                    else:
-                        video_list = await indexer.get_videos_by_up_id(
-                            up_id=up_id,
-                            start_time=start_dt,
-                            end_time=end_dt
-                        )
-
-                    if video_list is not None:
-                        break
-
-                    if attempt == 0:
-                        self.log_message("获取视频列表失败，正在重试...")
-                        await asyncio.sleep(2)
-                    else:
-                        self.log_message("获取视频列表失败，请检查Cookie或提交反馈")
-                        return
-
-                self.log_message(f"获取到 {len(video_list)} 个视频")
-
-                # 更新视频总数
-                self.root.after(0, lambda: self.update_progress(total=len(video_list)))
-
-                # 遍历视频列表
-                for idx, video in enumerate(video_list):
-                    if self.stop_flag.is_set():
-                        self.log_message("任务已取消，停止处理视频")
-                        return
-
-                    self.log_message(f"处理视频: {video['bvid']} - {video['title']}")
-
-                    # 计算采样点
-                    sample_times = sampler.calculate_sample_points(video['duration'])
-                    self.log_message(f"计算出 {len(sample_times)} 个采样点: {sample_times}")
-
-                    # 提取缩略图
-                    video_success = True
-                    for sample_idx, sample_time in enumerate(sample_times):
-                        if self.stop_flag.is_set():
-                            self.log_message("任务已取消")
-                            return
-
-                        try:
-                            # 生成文件名：格式为 "发布时间_BV(索引).格式"
-                            # 例如: "2021-10-06_BV1xx4xx(1).webp"
-                            publish_date = video['created_str'].split(' ')[0]  # 只取日期部分
-                            bvid = video['bvid']  # 保留完整的BV编号，如 BV1vT2RBFENE
-                            output_filename = f"{publish_date}_{bvid}({sample_idx + 1}).{self.config['image_format'].get()}"
-                            output_path = os.path.join(self.config['output_dir'].get(), output_filename)
-
-                            success = False
-                            for attempt in range(2):
-                                success = await extractor.extract_thumbnail_at_time(
-                                    bvid=video['bvid'],
-                                    time_in_seconds=sample_time,
-                                    output_path=output_path
-                                )
-
-                                if success:
-                                    break
-
-                                if attempt == 0:
-                                    self.log_message(f"提取缩略图失败，正在重试: {output_filename}")
-                                    await asyncio.sleep(1)
-                                else:
-                                    self.log_message(f"提取缩略图失败，请检查Cookie或提交反馈: {output_filename}")
-
-                            if success:
-                                self.log_message(f"成功提取缩略图: {output_filename}")
-                            else:
-                                self.log_message(f"提取缩略图失败: {output_filename}")
-                                video_success = False
-                        except Exception as e:
-                            self.log_message(f"处理采样点时出错: {str(e)}")
-                            video_success = False
-
-                    # 更新进度和统计
-                    if video_success:
-                        self.root.after(0, lambda s=self.success_count + 1: self.update_progress(success=s))
-                    else:
-                        self.root.after(0, lambda f=self.fail_count + 1: self.update_progress(fail=f))
-
-                    # 更新当前进度
-                    self.root.after(0, lambda c=idx + 1: self.update_progress(current=c))
-
-                self.log_message("提取任务完成！")
+            await runner.run()
 
+        except asyncio.CancelledError:
+            self.log_message("任务已停止")
         except Exception as e:
             self.log_message(f"提取过程中出错: {str(e)}")
         finally:
-            # 恢复按钮状态
-            self.root.after(0, lambda: self.start_button.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.stop_button.config(state=tk.DISABLED))
-            # 隐藏进度条
-            self.root.after(0, self.hide_progress)
+            # 导出本次运行的指标快照
+            self.running = False
+            self.export_metrics()
+            if profiler is not None:
+                # cProfile 只能在启用它的线程中停止，因此直接在事件循环线程中写出报告
+                paths = profiler.stop()
+                if paths:
+                    self.log_message(f"性能分析报告已写出: {os.path.dirname(paths[0])}")
 
     def log_message(self, message):
-        """输出日志消息"""
+        """输出日志消息（可在任意线程调用）"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_message = f"[{timestamp}] {message}\n"
-
-        # 在主线程中更新UI
-        self.root.after(0, lambda: self._update_log_text(formatted_message))
+        self.events.post_log(f"[{timestamp}] {message}\n")
 
-    def _update_log_text(self, message):
-        """更新日志文本"""
+    def _update_log_text(self, messages):
+        """批量追加日志，并删除超出上限的最早行"""
         self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, message)
+        self.log_text.insert(tk.END, ''.join(messages))
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > LOG_VIEW_MAX_LINES:
+            self.log_text.delete('1.0', f'{line_count - LOG_VIEW_MAX_LINES + 1}.0')
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
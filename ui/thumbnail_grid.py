@@ -0,0 +1,278 @@
+"""
+缩略图网格组件
+在 Canvas 上只绘制可见行的单元格，滚动时回收不可见的画布元素；
+图片在后台线程中解码并缩放，Tk 主线程只负责把结果转换为 PhotoImage，
+转换结果保存在有上限的 LRU 缓存中。无论列表有多少张缩略图，内存占用只与可见区域和缓存上限有关。
+"""
+import logging
+import os
+import threading
+import time
+import tkinter as tk
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk
+
+from PIL import Image, ImageTk
+
+from config import GRID_CELL_WIDTH, GRID_CACHE_SIZE, GRID_DECODE_WORKERS, UI_REFRESH_INTERVAL_MS
+
+logger = logging.getLogger(__name__)
+
+# 单元格内边距与文件名标签高度（像素）
+CELL_PADDING = 4
+LABEL_HEIGHT = 16
+# 文件尚未落盘（写盘批次未提交）时的重试间隔（秒）与最多重试次数，超过后按无法显示处理
+RETRY_INTERVAL = 1.0
+MAX_RETRIES = 30
+# 无法显示的单元格文件名颜色
+BROKEN_COLOR = '#cc6666'
+IMAGE_EXTENSIONS = ('.webp', '.jpg', '.jpeg', '.png')
+
+
+def decode_thumbnail(path, size):
+    """
+    在后台线程中解码并缩放图片
+
+    :return: PIL图像；文件尚不存在时返回None（可能仍在写盘批次中，稍后重试）
+    :raises OSError: 文件存在但无法解码（写盘是原子的，重试也不会变好）
+    """
+    try:
+        with Image.open(path) as img:
+            img.draft('RGB', size)
+            img = img.convert('RGB')
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise OSError(str(e)) from e
+    img.thumbnail(size)
+    return img
+
+
+class ThumbnailGrid(ttk.Frame):
+    """虚拟化缩略图网格：Canvas + 滚动条，只为可见行创建画布元素"""
+
+    def __init__(self, parent, cell_width=GRID_CELL_WIDTH, cache_size=GRID_CACHE_SIZE,
+                 decode_workers=GRID_DECODE_WORKERS, height=240):
+        """
+        :param parent: 父组件
+        :param cell_width: 单元格中图片的宽度（像素），高度按16:9计算
+        :param cache_size: PhotoImage LRU 缓存的最大张数
+        :param decode_workers: 解码线程数
+        :param height: 画布初始高度
+        """
+        super().__init__(parent)
+        self.image_size = (cell_width, cell_width * 9 // 16)
+        self.cell_width = cell_width + CELL_PADDING * 2
+        self.cell_height = self.image_size[1] + LABEL_HEIGHT + CELL_PADDING * 2
+        self.cache_size = max(1, cache_size)
+
+        self.canvas = tk.Canvas(self, height=height, highlightthickness=0, background='#1e1e1e',
+                                yscrollincrement=self.cell_height // 4)
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scroll)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self._paths = []
+        self._columns = 1
+        self._cells = {}  # 索引 -> (路径, 图片元素, 文字元素)
+        self._cache = OrderedDict()  # 路径 -> PhotoImage
+        self._futures = {}  # 路径 -> 解码任务
+        self._retry = {}  # 路径 -> (允许再次尝试的时间, 已重试次数)
+        self._broken = set()  # 无法解码或多次重试仍不存在的路径，不再尝试
+        self._lock = threading.Lock()
+        self._decoded = deque()  # 后台线程解码完成的 (路径, PIL图像 / None 文件不存在 / False 无法解码)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix='grid-decode')
+        self._polling = False
+
+        self.canvas.bind('<Configure>', self._on_configure)
+        self.canvas.bind('<MouseWheel>', self._on_mousewheel)
+        self.canvas.bind('<Button-4>', lambda event: self._scroll_units(-1))
+        self.canvas.bind('<Button-5>', lambda event: self._scroll_units(1))
+        self.bind('<Destroy>', self._on_destroy)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def add(self, paths):
+        """追加缩略图路径（需在Tk主线程调用）"""
+        if not paths:
+            return
+        self._paths.extend(paths)
+        self._update_scrollregion()
+        self.redraw()
+
+    def clear(self):
+        """清空网格，保留已缓存的图片"""
+        self._paths = []
+        for _, image_item, text_item in self._cells.values():
+            self.canvas.delete(image_item, text_item)
+        self._cells.clear()
+        self._cancel_pending(set())
+        self._retry.clear()
+        self._broken.clear()
+        self.canvas.yview_moveto(0)
+        self._update_scrollregion()
+
+    def load_directory(self, directory):
+        """列出目录中已有的缩略图（按文件名倒序，即发布时间从新到旧）"""
+        try:
+            names = [entry.name for entry in os.scandir(directory)
+                     if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)]
+        except OSError as e:
+            logger.warning("读取目录 %s 失败: %s", directory, e)
+            return 0
+        names.sort(reverse=True)
+        self.clear()
+        self.add([os.path.join(directory, name) for name in names])
+        return len(names)
+
+    def redraw(self):
+        """按当前滚动位置重建可见单元格：创建新进入视野的，删除离开视野的"""
+        first, last = self._visible_range()
+        for index in [i for i in self._cells if i < first or i >= last]:
+            _, image_item, text_item = self._cells.pop(index)
+            self.canvas.delete(image_item, text_item)
+
+        visible = set()
+        now = time.monotonic()
+        for index in range(first, last):
+            path = self._paths[index]
+            visible.add(path)
+            image = self._cached(path)
+            cell = self._cells.get(index)
+            if cell is None or cell[0] != path:
+                if cell is not None:
+                    self.canvas.delete(cell[1], cell[2])
+                row, column = divmod(index, self._columns)
+                x = column * self.cell_width + CELL_PADDING
+                y = row * self.cell_height + CELL_PADDING
+                image_item = self.canvas.create_image(x, y, anchor=tk.NW, image=image or '')
+                text_item = self.canvas.create_text(x, y + self.image_size[1] + 2, anchor=tk.NW,
+                                                    text=os.path.basename(path),
+                                                    fill=BROKEN_COLOR if path in self._broken else '#bbbbbb',
+                                                    font=('TkDefaultFont', 8), width=self.image_size[0])
+                self._cells[index] = (path, image_item, text_item)
+            elif image is not None:
+                self.canvas.itemconfigure(cell[1], image=image)
+            elif path in self._broken:
+                self.canvas.itemconfigure(cell[2], fill=BROKEN_COLOR)
+            if (image is None and path not in self._futures and path not in self._broken
+                    and self._retry.get(path, (0, 0))[0] <= now):
+                self._futures[path] = self._executor.submit(self._decode, path)
+        # 已滚出视野、尚未开始的解码直接取消；重试次数保留，滚回视野时继续累计
+        self._cancel_pending(visible)
+        self._ensure_polling()
+
+    def _cached(self, path):
+        image = self._cache.get(path)
+        if image is not None:
+            self._cache.move_to_end(path)
+        return image
+
+    def _decode(self, path):
+        try:
+            img = decode_thumbnail(path, self.image_size)
+        except OSError as e:
+            logger.debug("解码缩略图失败 %s: %s", path, e)
+            img = False
+        with self._lock:
+            self._decoded.append((path, img))
+
+    def _cancel_pending(self, keep):
+        for path in [p for p in self._futures if p not in keep]:
+            if self._futures[path].cancel():
+                del self._futures[path]
+
+    def _ensure_polling(self):
+        if not self._polling and (self._futures or self._retry_due() is not None):
+            self._polling = True
+            self.after(UI_REFRESH_INTERVAL_MS, self._poll)
+
+    def _poll(self):
+        """取出后台解码结果并转换为 PhotoImage（PhotoImage 只能在Tk主线程创建）"""
+        self._polling = False
+        with self._lock:
+            decoded = list(self._decoded)
+            self._decoded.clear()
+
+        now = time.monotonic()
+        changed = False
+        for path, img in decoded:
+            self._futures.pop(path, None)
+            if img is None:
+                # 可能仍在写盘批次中，稍后重试
+                attempts = self._retry.get(path, (0, 0))[1] + 1
+                if attempts < MAX_RETRIES:
+                    self._retry[path] = (now + RETRY_INTERVAL, attempts)
+                    continue
+                img = False
+            if img is False:
+                self._retry.pop(path, None)
+                self._broken.add(path)
+                changed = True
+                continue
+            self._retry.pop(path, None)
+            self._cache[path] = ImageTk.PhotoImage(img)
+            self._cache.move_to_end(path)
+            changed = True
+        # 可见单元格引用的图片不能被淘汰（PhotoImage 被回收后画布上会变成空白）
+        limit = max(self.cache_size, len(self._cells))
+        while len(self._cache) > limit:
+            self._cache.popitem(last=False)
+
+        due = self._retry_due()
+        if changed or (due is not None and due <= now):
+            self.redraw()
+        self._ensure_polling()
+
+    def _retry_due(self):
+        """可见单元格中最早的重试时间，没有待重试的可见单元格时返回None"""
+        visible = {cell[0] for cell in self._cells.values()}
+        return min((due for path, (due, _) in self._retry.items() if path in visible), default=None)
+
+    def _visible_range(self):
+        if not self._paths:
+            return 0, 0
+        top = self.canvas.canvasy(0)
+        bottom = top + max(1, self.canvas.winfo_height())
+        first_row = max(0, int(top // self.cell_height))
+        last_row = int(bottom // self.cell_height) + 1
+        return first_row * self._columns, min(len(self._paths), (last_row + 1) * self._columns)
+
+    def _update_scrollregion(self):
+        rows = (len(self._paths) + self._columns - 1) // self._columns
+        width = self._columns * self.cell_width
+        self.canvas.configure(scrollregion=(0, 0, width, rows * self.cell_height))
+
+    def _on_configure(self, event):
+        columns = max(1, event.width // self.cell_width)
+        if columns != self._columns:
+            # 列数变化时所有单元格的位置都会改变
+            self._columns = columns
+            for _, image_item, text_item in self._cells.values():
+                self.canvas.delete(image_item, text_item)
+            self._cells.clear()
+            self._update_scrollregion()
+        self.redraw()
+
+    def _on_scroll(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def _scroll_units(self, units):
+        self.canvas.yview_scroll(units, 'units')
+        self.redraw()
+
+    def _on_mousewheel(self, event):
+        # Windows 每格 delta 为 120，macOS 为较小的整数
+        units = -int(event.delta / 120) if abs(event.delta) >= 120 else -event.delta
+        self._scroll_units(units)
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._cache.clear()